@@ -1,25 +1,94 @@
 from channels.generic.websocket import AsyncWebsocketConsumer
 import json
+from urllib.parse import parse_qs
+
+from vision.services.progress_groups import ProgressSubscriptions, parse_subscription
+from vision.services.subscriber_mailbox import SubscriberMailbox
 
 
 class FrameProgressConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        await self.channel_layer.group_add("frame_progress", self.channel_name)
+        # Only events carrying a frame image coalesce to the newest; metrics-only updates (all of the
+        # video processor's), final, unchanged and error messages go on the reliable queue
+        self.mailbox = SubscriberMailbox(self._deliver, on_overflow=lambda: self.close(code=1013),
+                                         name=f"camera FrameProgressConsumer {self.channel_name}")
+        self.mailbox.start()
+        # Subscribe with ?job=..&camera=.. (or firehose=1 for every job), or later via receive()
+        self.subscriptions = ProgressSubscriptions(self.channel_layer, self.channel_name)
+        latest = await self.subscriptions.subscribe(
+            *parse_subscription(parse_qs(self.scope.get("query_string", b"").decode())))
         await self.accept()
+        await self._replay_latest(latest)
         print("WebSocket connected for video progress")
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard("frame_progress", self.channel_name)
+        if getattr(self, 'subscriptions', None) is not None:
+            await self.subscriptions.clear()
+        if getattr(self, 'mailbox', None) is not None:
+            await self.mailbox.stop()
         print("WebSocket disconnected for video progress")
 
-    async def receive(self, text_data):
-        # Handle any messages from client if needed
-        pass
+    async def receive(self, text_data=None, bytes_data=None):
+        """Subscription messages: {"action": "subscribe"|"unsubscribe", "job_id"|"camera_id"|"firehose": ...}"""
+        try:
+            data = json.loads(text_data)
+            action = data.get("action")
+            latest = []
+            if action == "subscribe":
+                latest = await self.subscriptions.subscribe(*parse_subscription(data))
+            elif action == "unsubscribe":
+                await self.subscriptions.unsubscribe(*parse_subscription(data))
+            else:
+                return
+            self.mailbox.put_message(self.subscriptions.describe(), critical=True)
+            await self._replay_latest(latest)
+        except Exception as e:
+            print("WebSocket receive error:", e)
+
+    async def _replay_latest(self, events):
+        """Latest event of each job just subscribed to, through the same handlers as live events"""
+        for event in events:
+            if event.get("type") in ("progress_message", "unchanged_message", "error_message"):
+                await getattr(self, event["type"])(event)
 
     async def progress_message(self, event):
         """Handle video processing progress updates"""
+        if self.subscriptions.duplicate(event):
+            return
+        if event.get("is_final"):
+            self.mailbox.put_message(event, critical=True)
+        elif event.get("frame_key") or event.get("frame_image"):
+            self.mailbox.put_frame(event, slot=event.get("job_id"))
+        else:
+            self.mailbox.put_message(event)
+
+    async def unchanged_message(self, event):
+        """Handle updates for frames the motion gate found unchanged"""
+        if not self.subscriptions.duplicate(event):
+            self.mailbox.put_message(event)
+
+    async def error_message(self, event):
+        """Handle error messages"""
+        if not self.subscriptions.duplicate(event):
+            self.mailbox.put_message(event, critical=True)
+
+    async def _deliver(self, event):
+        """Mailbox sender: write one event to the socket"""
+        handler = {
+            "progress_message": self.send_progress,
+            "unchanged_message": self.send_unchanged,
+            "error_message": self.send_error,
+        }.get(event.get("type"))
+        if handler is not None:
+            await handler(event)
+        else:
+            await self.send(text_data=json.dumps(event))
+
+    async def send_progress(self, event):
         await self.send(text_data=json.dumps({
             "type": "progress",
+            "job_id": event.get("job_id"),
+            "camera_id": event.get("camera_id"),
             "frame": event.get("frame"),
             "object_count": event.get("object_count"),
             "belt_speed": event.get("belt_speed"),
@@ -27,16 +96,30 @@ class FrameProgressConsumer(AsyncWebsocketConsumer):
             "is_final": event.get("is_final", False)
         }))
 
-    async def error_message(self, event):
-        """Handle error messages"""
+    async def send_unchanged(self, event):
+        await self.send(text_data=json.dumps({
+            "type": "unchanged",
+            "job_id": event.get("job_id"),
+            "frame": event.get("frame"),
+            "progress": event.get("progress", 0)
+        }))
+
+    async def send_error(self, event):
         await self.send(text_data=json.dumps({
             "type": "error",
+            "job_id": event.get("job_id"),
             "error": event.get("error")
         }))
 
 class RealtimeConsumer(AsyncWebsocketConsumer):
     async def connect(self):
         try:
+            # Frames are delivered latest-wins, other messages through a small queue; a client that
+            # falls too far behind is closed with 1013 (try again later)
+            self.mailbox = SubscriberMailbox(self._deliver, on_overflow=lambda: self.close(code=1013),
+                                             name=f"RealtimeConsumer {self.channel_name}")
+            self.mailbox.start()
+
             # Accept connection
             await self.accept()
 
@@ -48,10 +131,10 @@ class RealtimeConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_add(self.group_name, self.channel_name)
 
             # Send initial confirmation
-            await self.send(json.dumps({
+            self.mailbox.put_message({
                 "status": "connected",
                 "camera_id": self.camera_id
-            }))
+            }, critical=True)
             print(f"WebSocket connected: camera_id={self.camera_id}")
 
         except Exception as e:
@@ -64,6 +147,8 @@ class RealtimeConsumer(AsyncWebsocketConsumer):
             await self.channel_layer.group_discard(self.group_name, self.channel_name)
         except Exception:
             pass
+        if getattr(self, 'mailbox', None) is not None:
+            await self.mailbox.stop()
         print("WebSocket disconnected", close_code)
 
     async def receive(self, text_data=None, bytes_data=None):
@@ -72,10 +157,14 @@ class RealtimeConsumer(AsyncWebsocketConsumer):
                 data = json.loads(text_data)
                 print("Received:", data)
 
+                if data.get("action") == "stats":
+                    self.mailbox.put_message(dict(self.mailbox.stats(), type="delivery_stats"), critical=True)
+                    return
+
                 # Echo back
-                await self.send(json.dumps({
+                self.mailbox.put_message({
                     "echo": data
-                }))
+                })
 
                 # Example: broadcast to group
                 # await self.channel_layer.group_send(
@@ -87,10 +176,16 @@ class RealtimeConsumer(AsyncWebsocketConsumer):
                 # )
         except Exception as e:
             print("WebSocket receive error:", e)
-            await self.send(json.dumps({"error": str(e)}))
+            self.mailbox.put_message({"error": str(e)}, critical=True)
 
     # Optional: handler for group messages
     async def broadcast_message(self, event):
         message = event.get('message')
         if message:
-            await self.send(json.dumps(message))
\ No newline at end of file
+            if isinstance(message, dict) and message.get('frame_image'):
+                self.mailbox.put_frame(message)
+            else:
+                self.mailbox.put_message(message)
+
+    async def _deliver(self, message):
+        await self.send(json.dumps(message))
\ No newline at end of file
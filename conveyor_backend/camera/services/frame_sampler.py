@@ -0,0 +1,99 @@
+# camera/services/frame_sampler.py
+import logging
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+
+class FrameSampler:
+    """
+    Read every `interval`-th frame of a video without converting the ones in between.
+
+    Skipped frames are advanced with cap.grab(), which demuxes/decodes but skips the colour
+    conversion and copy of retrieve(). When the gap to the next sample spans more than a
+    couple of GOPs it is cheaper to seek: the decoder restarts at the keyframe before the
+    target and only decodes forward from there. The keyframe distance is learned from the
+    frames read so far (CAP_PROP_LRF_HAS_KEY_FRAME), so seeking only kicks in where it pays.
+    """
+
+    SEEK_OVERHEAD = 16  # frames OpenCV may decode before the target when seeking
+
+    def __init__(self, cap, interval=10, seek_threshold=None):
+        self.cap = cap
+        self.interval = max(1, int(interval))
+        self.seek_threshold = seek_threshold
+        self.keyframe_interval = None
+        self.grabbed = 0
+        self.retrieved = 0
+        self.seeks = 0
+        self._last_keyframe = None
+        self._can_seek = True
+
+    def _note_keyframe(self, index):
+        if self.cap.get(cv2.CAP_PROP_LRF_HAS_KEY_FRAME) > 0:
+            if self._last_keyframe is not None and index > self._last_keyframe:
+                distance = index - self._last_keyframe
+                self.keyframe_interval = distance if self.keyframe_interval is None else max(self.keyframe_interval,
+                                                                                            distance)
+            self._last_keyframe = index
+
+    def _should_seek(self, skip):
+        if not self._can_seek:
+            return False
+        if self.seek_threshold is not None:
+            return skip >= self.seek_threshold
+        if self.keyframe_interval is None:
+            return False
+        return skip > 2 * self.keyframe_interval + self.SEEK_OVERHEAD
+
+    def _seek(self, target):
+        """Seek towards target; returns the new 0-based position, or None if the capture can't seek"""
+        if self.cap.set(cv2.CAP_PROP_POS_FRAMES, target):
+            position = int(self.cap.get(cv2.CAP_PROP_POS_FRAMES))
+            if 0 <= position <= target:
+                self.seeks += 1
+                self._last_keyframe = None  # distances are only measured between frames read in sequence
+                return position
+        # Not seekable or overshot: give up on seeking and grab forward instead
+        logger.warning(f"Seeking to frame {target} failed, skipping frames with grab()")
+        self._can_seek = False
+        return None
+
+    def frames(self):
+        """
+        Yield (frame_number, frame) for frames interval, 2*interval, ... (1-based numbers).
+        The frame buffer is reused, so it is only valid until the next frame is requested.
+        """
+        position = 0  # 0-based index of the next frame the capture returns
+        target = self.interval - 1
+        frame = None
+        while True:
+            skip = target - position
+            seeked = skip > 0 and self._should_seek(skip)
+            if seeked:
+                new_position = self._seek(target)  # may be 0, the keyframe before the target
+                if new_position is not None:
+                    position = new_position
+            while position < target:
+                if not self.cap.grab():
+                    return
+                self.grabbed += 1
+                self._note_keyframe(position)
+                position += 1
+                # The keyframe distance may only become known part-way through a long gap; seek at
+                # most once per gap, the landing keyframe can be further back than where we are
+                if not seeked and self._should_seek(target - position):
+                    seeked = True
+                    new_position = self._seek(target)
+                    if new_position is not None:
+                        position = new_position
+
+            ret, frame = self.cap.read(frame)
+            if not ret:
+                return
+            self.retrieved += 1
+            self._note_keyframe(position)
+            position += 1
+            yield target + 1, frame
+            target += self.interval
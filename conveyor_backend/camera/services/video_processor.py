@@ -5,13 +5,15 @@ import time
 import json
 from datetime import datetime
 import logging
-from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 
+from camera.services.frame_sampler import FrameSampler
+from vision.services.progress_groups import send_progress
 
 
 logger = logging.getLogger(__name__)
 
+DEFAULT_SAMPLE_INTERVAL = 10  # analyse every 10th frame
 
 class VideoProcessor:
     def __init__(self):
@@ -21,14 +23,19 @@ class VideoProcessor:
         self.results = {}
         self.jobs = {}
 
-    def process_video_async(self, video_path, camera_id="default", callback=None):
-        """Start video processing in background thread"""
+    def process_video_async(self, video_path, camera_id="default", callback=None,
+                            sample_interval=DEFAULT_SAMPLE_INTERVAL):
+        """Start video processing in background thread, analysing every `sample_interval`-th frame"""
+        sample_interval = int(sample_interval)
+        if sample_interval < 1:
+            raise ValueError(f"sample_interval must be at least 1, got {sample_interval}")
         job_id = f"job_{int(time.time())}_{camera_id}"
 
         self.jobs[job_id] = {
             'video_path': video_path,
             'camera_id': camera_id,
             'status': 'processing',
+            'sample_interval': sample_interval,
             'progress': 0,
             'start_time': datetime.now().isoformat(),
             'results': None,
@@ -38,7 +45,7 @@ class VideoProcessor:
         # Start processing in background thread
         thread = threading.Thread(
             target=self._process_video,
-            args=(job_id, video_path, camera_id, callback)
+            args=(job_id, video_path, camera_id, callback, sample_interval)
         )
         thread.daemon = True
         thread.start()
@@ -50,7 +57,7 @@ class VideoProcessor:
         }
 
 
-    def _process_video(self, job_id, video_path, camera_id, callback):
+    def _process_video(self, job_id, video_path, camera_id, callback, sample_interval=DEFAULT_SAMPLE_INTERVAL):
         """Background video processing with live WebSocket updates"""
         try:
             logger.info(f"Starting video processing for job {job_id}")
@@ -73,6 +80,7 @@ class VideoProcessor:
                 'fps': fps,
                 'resolution': f"{width}x{height}",
                 'frames_processed': 0,
+                'sample_interval': sample_interval,
                 'object_counts': [],
                 'detections': [],
                 'start_time': datetime.now().isoformat(),
@@ -81,51 +89,48 @@ class VideoProcessor:
 
             frame_count = 0
             processed_frames = 0
+            counts = []
             channel_layer = get_channel_layer()
 
-            while True:
-                ret, frame = cap.read()
-                if not ret:
-                    break
-
-                frame_count += 1
-
-                if frame_count % 10 == 0:
-                    processed_frames += 1
-
-                    # Simple object detection
-                    gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-                    blur = cv2.GaussianBlur(gray, (5, 5), 0)
-                    edges = cv2.Canny(blur, 50, 150)
-                    contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-                    object_count = len([cnt for cnt in contours if cv2.contourArea(cnt) > 100])
-
-                    analysis_results['object_counts'].append({
-                        'frame': frame_count,
-                        'count': object_count
-                    })
-
-                    # Update progress
-                    progress = int((frame_count / total_frames) * 100)
-                    self.jobs[job_id]['progress'] = progress
-                    self.jobs[job_id]['frames_processed'] = processed_frames
-
-                    # Send WebSocket update
-                    try:
-                        async_to_sync(channel_layer.group_send)(
-                            "frame_progress",  # must match your consumer group
-                            {
-                                "type": "progress_message",  # matches FrameProgressConsumer method
-                                "frame": frame_count,
-                                "object_count": object_count,
-                                "progress": progress,
-                                "is_final": False
-                            }
-                        )
-                    except Exception as e:
-                        logger.error(f"WebSocket update error: {str(e)}")
-
-                    time.sleep(0.01)  # simulate processing time
+            # Frames between samples are skipped with grab() or a keyframe seek, never converted
+            sampler = FrameSampler(cap, sample_interval)
+            for frame_count, frame in sampler.frames():
+                processed_frames += 1
+
+                # Simple object detection
+                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                blur = cv2.GaussianBlur(gray, (5, 5), 0)
+                edges = cv2.Canny(blur, 50, 150)
+                contours, _ = cv2.findContours(edges, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+                object_count = len([cnt for cnt in contours if cv2.contourArea(cnt) > 100])
+
+                analysis_results['object_counts'].append({
+                    'frame': frame_count,
+                    'count': object_count
+                })
+
+                # Update progress
+                progress = int((frame_count / total_frames) * 100) if total_frames else 0
+                self.jobs[job_id]['progress'] = progress
+                self.jobs[job_id]['frames_processed'] = processed_frames
+
+                # Send WebSocket update
+                try:
+                    send_progress(
+                        channel_layer,
+                        {
+                            "type": "progress_message",  # matches FrameProgressConsumer method
+                            "job_id": job_id,
+                            "camera_id": camera_id,
+                            "frame": frame_count,
+                            "object_count": object_count,
+                            "progress": progress,
+                            "is_final": False
+                        },
+                        job_id, camera_id  # subscribers of this job or camera, plus the firehose
+                    )
+                except Exception as e:
+                    logger.error(f"WebSocket update error: {str(e)}")
 
             cap.release()
 
@@ -137,6 +142,11 @@ class VideoProcessor:
                 analysis_results['min_objects'] = min(counts)
 
             analysis_results['frames_processed'] = processed_frames
+            analysis_results['sampling'] = {
+                'grabbed_frames': sampler.grabbed,
+                'seeks': sampler.seeks,
+                'keyframe_interval': sampler.keyframe_interval
+            }
             analysis_results['end_time'] = datetime.now().isoformat()
             analysis_results['status'] = 'completed'
 
@@ -149,15 +159,18 @@ class VideoProcessor:
 
             # Final WebSocket message
             try:
-                async_to_sync(channel_layer.group_send)(
-                    "frame_progress",
+                send_progress(
+                    channel_layer,
                     {
                         "type": "progress_message",
+                        "job_id": job_id,
+                        "camera_id": camera_id,
                         "frame": frame_count,
                         "object_count": counts[-1] if counts else 0,
                         "progress": 100,
                         "is_final": True
-                    }
+                    },
+                    job_id, camera_id
                 )
             except Exception as e:
                 logger.error(f"Final WebSocket update error: {str(e)}")
@@ -176,12 +189,16 @@ class VideoProcessor:
         # Send WebSocket error
         try:
             channel_layer = get_channel_layer()
-            async_to_sync(channel_layer.group_send)(
-                "frame_progress",
+            camera_id = self.jobs[job_id].get('camera_id')
+            send_progress(
+                channel_layer,
                 {
                     "type": "error_message",
+                    "job_id": job_id,
+                    "camera_id": camera_id,
                     "error": error_msg
-                }
+                },
+                job_id, camera_id
             )
         except Exception as e:
             logger.error(f"WebSocket error sending failed: {str(e)}")
@@ -1,3 +1,64 @@
-from django.test import TestCase
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
 
-# Create your tests here.
+from camera.services.frame_sampler import FrameSampler
+
+
+class FakeCapture:
+    """In-memory capture whose frames hold their own 0-based index; seeks land on the keyframe before the target"""
+
+    def __init__(self, frame_count, keyframe_interval):
+        self.frame_count = frame_count
+        self.keyframe_interval = keyframe_interval
+        self.position = 0
+        self.last_read = None
+
+    def grab(self):
+        if self.position >= self.frame_count:
+            return False
+        self.last_read = self.position
+        self.position += 1
+        return True
+
+    def read(self, image=None):
+        if not self.grab():
+            return False, None
+        return True, np.full((2, 2), self.last_read, np.uint16)
+
+    def set(self, prop, value):
+        if prop != cv2.CAP_PROP_POS_FRAMES:
+            return False
+        self.position = int(value) - int(value) % self.keyframe_interval
+        return True
+
+    def get(self, prop):
+        if prop == cv2.CAP_PROP_POS_FRAMES:
+            return float(self.position)
+        if prop == cv2.CAP_PROP_LRF_HAS_KEY_FRAME:
+            return float(self.last_read is not None and self.last_read % self.keyframe_interval == 0)
+        return 0.0
+
+
+class FrameSamplerTests(SimpleTestCase):
+    def sample(self, sampler):
+        """(frame number, index of the frame actually returned) for every sample"""
+        return [(number, int(frame[0, 0])) for number, frame in sampler.frames()]
+
+    def test_grabs_every_interval_frame(self):
+        sampler = FrameSampler(FakeCapture(95, keyframe_interval=1000), interval=10)
+        samples = self.sample(sampler)
+        self.assertEqual(samples, [(n, n - 1) for n in range(10, 91, 10)])
+        self.assertEqual(sampler.seeks, 0)
+        self.assertEqual(sampler.retrieved, 9)
+
+    def test_seek_landing_on_frame_zero_keeps_frame_numbers(self):
+        # Every seek falls back to the only keyframe, frame 0
+        samples = self.sample(FrameSampler(FakeCapture(50, keyframe_interval=1000), interval=10, seek_threshold=1))
+        self.assertEqual(samples, [(n, n - 1) for n in range(10, 51, 10)])
+
+    def test_seek_to_keyframe_before_target(self):
+        sampler = FrameSampler(FakeCapture(200, keyframe_interval=25), interval=40, seek_threshold=5)
+        samples = self.sample(sampler)
+        self.assertEqual(samples, [(n, n - 1) for n in range(40, 201, 40)])
+        self.assertGreater(sampler.seeks, 0)
@@ -10,7 +10,7 @@ import random
 from ultralytics import YOLO
 from channels.layers import get_channel_layer
 from asgiref.sync import async_to_sync
-from camera.services.video_processor import video_processor
+from camera.services.video_processor import video_processor, DEFAULT_SAMPLE_INTERVAL
 from django.views.decorators.csrf import csrf_exempt
 from collections import deque
 import math
@@ -227,6 +227,7 @@ class ProcessVideoFile(APIView):
         """
         video_path = request.data.get("video_path")
         camera_id = request.data.get("camera_id", "default")
+        sample_interval = request.data.get("sample_interval", DEFAULT_SAMPLE_INTERVAL)
 
         if not video_path:
             return Response(
@@ -234,6 +235,16 @@ class ProcessVideoFile(APIView):
                 status=status.HTTP_400_BAD_REQUEST
             )
 
+        try:
+            sample_interval = int(sample_interval)
+            if sample_interval < 1:
+                raise ValueError
+        except (TypeError, ValueError):
+            return Response(
+                {"error": "sample_interval must be a positive integer"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
         logger.info(f"Processing video request received. Path: {video_path}")
 
         # Try to find the video file
@@ -265,12 +276,14 @@ class ProcessVideoFile(APIView):
             result = video_processor.process_video_async(
                 actual_path,
                 camera_id=camera_id,
-                callback=self._processing_complete_callback
+                callback=self._processing_complete_callback,
+                sample_interval=sample_interval
             )
 
             return Response({
                 "status": "processing_started",
                 "video_path": actual_path,
+                "sample_interval": sample_interval,
                 "message": "Video processing started successfully",
                 "file_info": {
                     "size": os.path.getsize(actual_path),
@@ -501,6 +514,10 @@ class RealTimeAnalysisAPI(APIView):
 # In camera/views.py, update the ConveyorAnalysisAPI class:
 
 class ConveyorAnalysisAPI(APIView):
+    # Contour search runs on frames downscaled to this width; thresholds below are in native pixels
+    analysis_max_width = 1280
+    min_object_area = 500
+
     def __init__(self):
         super().__init__()
         self.prev_positions = deque(maxlen=10)
@@ -580,8 +597,14 @@ class ConveyorAnalysisAPI(APIView):
             # Convert to grayscale
             gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
 
+            # Downscale large frames for the contour search
+            scale = min(1.0, self.analysis_max_width / float(width)) if self.analysis_max_width else 1.0
+            if scale < 1.0:
+                gray = cv2.resize(gray, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            blur_size = max(3, int(round(7 * scale)) | 1)
+
             # Apply Gaussian blur
-            blur = cv2.GaussianBlur(gray, (7, 7), 0)
+            blur = cv2.GaussianBlur(gray, (blur_size, blur_size), 0)
 
             # Edge detection
             edges = cv2.Canny(blur, 50, 150)
@@ -591,10 +614,16 @@ class ConveyorAnalysisAPI(APIView):
 
             objects = []
             valid_contours = []
+            min_area = self.min_object_area * scale * scale
 
             for contour in contours:
                 area = cv2.contourArea(contour)
-                if area > 500:  # Minimum area threshold
+                if area > min_area:  # Minimum area threshold
+                    if scale < 1.0:
+                        # Map back to full-frame coordinates
+                        contour = np.round(contour / scale).astype(np.int32)
+                        area = area / (scale * scale)
+
                     # Get bounding box
                     x, y, w, h = cv2.boundingRect(contour)
 
@@ -151,6 +151,12 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Replay recordings of live vision jobs (segmented JPEG + index files per job)
+REPLAY_ROOT = os.path.join(MEDIA_ROOT, 'replays')
+
+# Per-frame metric columns of vision jobs (one .npy file per metric per job)
+METRICS_ROOT = os.path.join(MEDIA_ROOT, 'metrics')
+
 # During development, also add this
 STATICFILES_DIRS = [
     os.path.join(BASE_DIR, 'static'),
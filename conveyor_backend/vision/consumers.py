@@ -1,25 +1,42 @@
 # vision/consumers.py
 import json
+from urllib.parse import parse_qs
 from channels.generic.websocket import AsyncWebsocketConsumer
 import logging
 
+from vision.services.frame_protocol import SUBPROTOCOL, encode_packet
+from vision.services.frame_store import frame_store
+from vision.services.metrics_schema import BELT_METRICS, SchemaError
+from vision.services.progress_groups import ProgressSubscriptions, parse_subscription
+from vision.services.subscriber_mailbox import SubscriberMailbox
+
 logger = logging.getLogger(__name__)
 
 
 class FrameProgressConsumer(AsyncWebsocketConsumer):
     async def connect(self):
-        await self.channel_layer.group_add(
-            "frame_progress",
-            self.channel_name
-        )
-        await self.accept()
-        logger.info("WebSocket connected")
+        # Binary frame protocol is opt-in: subprotocol vision.binary.v1 or ?format=binary
+        subprotocol = SUBPROTOCOL if SUBPROTOCOL in self.scope.get('subprotocols', []) else None
+        query = parse_qs(self.scope.get('query_string', b'').decode())
+        self.binary = subprotocol is not None or query.get('format', [''])[0] == 'binary'
+
+        # Channel-layer handlers only fill the mailbox; its task does the (possibly slow) sending.
+        # A client too far behind to drain the critical queue is closed with 1013 (try again later)
+        self.mailbox = SubscriberMailbox(self._deliver, on_superseded=self._metrics_only,
+                                         on_overflow=lambda: self.close(code=1013),
+                                         name=f"FrameProgressConsumer {self.channel_name}").start()
+        # Only the jobs/cameras asked for (?job=..&camera=..&firehose=1 or subscribe messages)
+        self.subscriptions = ProgressSubscriptions(self.channel_layer, self.channel_name)
+        latest = await self.subscriptions.subscribe(*parse_subscription(query))
+        await self.accept(subprotocol=subprotocol)
+        await self._replay_latest(latest)
+        logger.info(f"WebSocket connected ({'binary' if self.binary else 'json'} frames)")
 
     async def disconnect(self, close_code):
-        await self.channel_layer.group_discard(
-            "frame_progress",
-            self.channel_name
-        )
+        if getattr(self, 'subscriptions', None) is not None:
+            await self.subscriptions.clear()
+        if getattr(self, 'mailbox', None) is not None:
+            await self.mailbox.stop()
         logger.info(f"WebSocket disconnected with code: {close_code}")
 
     async def receive(self, text_data=None, bytes_data=None):
@@ -27,26 +44,111 @@ class FrameProgressConsumer(AsyncWebsocketConsumer):
         try:
             data = json.loads(text_data)
             logger.info(f"Received WebSocket message: {data}")
+            action = data.get('action')
+            if action == 'subscribe':
+                latest = await self.subscriptions.subscribe(*parse_subscription(data))
+                self.mailbox.put_message(self.subscriptions.describe(), critical=True)
+                await self._replay_latest(latest)
+            elif action == 'unsubscribe':
+                await self.subscriptions.unsubscribe(*parse_subscription(data))
+                self.mailbox.put_message(self.subscriptions.describe(), critical=True)
+            elif action == 'stats':
+                self.mailbox.put_message(dict(self.mailbox.stats(), type='delivery_stats'), critical=True)
         except Exception as e:
             logger.error(f"Error parsing WebSocket message: {e}")
 
-    async def send_json(self, content):
-        """Send JSON data through WebSocket"""
+    async def send_json(self, content, belt_metrics=None):
+        """Send JSON data through WebSocket; belt_metrics, if given, are appended as written by their schema"""
         try:
-            await self.send(text_data=json.dumps(content))
+            text = json.dumps(content)
+            if belt_metrics is not None:
+                text = f'{text[:-1]}, "belt_metrics": {self._metrics_json(belt_metrics)}}}'
+            await self.send(text_data=text)
         except Exception as e:
             logger.error(f"Error sending JSON: {e}")
 
+    @staticmethod
+    def _metrics_json(metrics):
+        """Per-frame metrics through BELT_METRICS.to_json (non-finite floats become null); other dicts, such
+        as an offline job's summary, through json.dumps"""
+        try:
+            return BELT_METRICS.to_json(metrics)
+        except SchemaError:
+            return json.dumps(metrics)
+
+    # Channel-layer handlers: frames go to the latest-frame mailbox, everything else is queued
+
+    async def _replay_latest(self, events):
+        """Latest event of each job just subscribed to, through the same handlers as live events"""
+        for event in events:
+            if event.get('type') in ('progress_message', 'unchanged_message', 'error_message'):
+                await getattr(self, event['type'])(event)
+
     async def progress_message(self, event):
         """Handle progress messages from channel layer"""
+        if self.subscriptions.duplicate(event):
+            return
+        if event.get('frame_key') or event.get('frame_image'):
+            self.mailbox.put_frame(event, slot=event.get('job_id'))
+        else:
+            self.mailbox.put_message(event)
+
+    async def unchanged_message(self, event):
+        """Handle updates for frames the motion gate found unchanged (no new image)"""
+        if not self.subscriptions.duplicate(event):
+            self.mailbox.put_message(event)
+
+    async def error_message(self, event):
+        """Handle error messages from channel layer"""
+        if not self.subscriptions.duplicate(event):
+            self.mailbox.put_message(event, critical=True)
+
+    @staticmethod
+    def _metrics_only(superseded, newer):
+        """Keep a dropped frame's metrics (without image) if its alert state differs from the newer frame"""
+        if bool(superseded.get('alert_triggered')) == bool(newer.get('alert_triggered')):
+            return None
+        event = dict(superseded)
+        event.pop('frame_key', None)
+        event.pop('frame_image', None)
+        return event
+
+    async def _deliver(self, event):
+        """Mailbox sender: write one event to the socket"""
+        message_type = event.get('type')
+        if message_type == 'progress_message':
+            await self.send_progress(event)
+        elif message_type == 'unchanged_message':
+            await self.send_unchanged(event)
+        elif message_type == 'error_message':
+            await self.send_error(event)
+        else:
+            await self.send_json(event)
+
+    @staticmethod
+    def _frame_image(event):
+        """Base64 JPEG for JSON clients, looked up in the frame store by the event's frame_key"""
+        key = event.get('frame_key')
+        if key:
+            return frame_store.get_base64(*key) or ''  # evicted: this client fell behind
+        return event.get('frame_image', '')
+
+    async def send_progress(self, event):
+        """Send a progress update (with the frame image, if it is still in the frame store)"""
         try:
+            if self.binary and 'belt_metrics' in event:
+                key = event.get('frame_key')
+                await self.send(bytes_data=encode_packet(event, frame_store.get(*key) if key else None))
+                return
+
             # Prepare the message data
             message = {
                 'type': 'progress',
+                'job_id': event.get('job_id'),
+                'camera_id': event.get('camera_id'),
                 'frame': int(event.get('frame', 0)),
                 'progress': int(event.get('progress', 0)),
-                'belt_metrics': event.get('belt_metrics', {}),
-                'frame_image': event.get('frame_image', ''),
+                'frame_image': self._frame_image(event),
                 'fps': float(event.get('fps', 0)),
                 'is_final': bool(event.get('is_final', False)),
                 'replay_available': bool(event.get('replay_available', False)),
@@ -54,15 +156,36 @@ class FrameProgressConsumer(AsyncWebsocketConsumer):
             }
 
             # Send the message
-            await self.send_json(message)
+            await self.send_json(message, event.get('belt_metrics', {}))
         except Exception as e:
             logger.error(f"Error sending progress message: {e}")
 
-    async def error_message(self, event):
-        """Handle error messages from channel layer"""
+    async def send_unchanged(self, event):
+        """Send an update for a frame the motion gate found unchanged"""
+        try:
+            if self.binary:
+                await self.send(bytes_data=encode_packet(event))
+                return
+
+            message = {
+                'type': 'unchanged',
+                'job_id': event.get('job_id'),
+                'camera_id': event.get('camera_id'),
+                'frame': int(event.get('frame', 0)),
+                'progress': int(event.get('progress', 0)),
+                'fps': float(event.get('fps', 0)),
+                'alert_triggered': bool(event.get('alert_triggered', False))
+            }
+            await self.send_json(message, event.get('belt_metrics', {}))
+        except Exception as e:
+            logger.error(f"Error sending unchanged message: {e}")
+
+    async def send_error(self, event):
+        """Send an error message"""
         try:
             message = {
                 'type': 'error',
+                'job_id': event.get('job_id'),
                 'error': str(event.get('error', 'Unknown error'))
             }
             await self.send_json(message)
@@ -0,0 +1,61 @@
+"""
+Benchmark BeltDetector throughput against the analysis scale.
+
+Usage (from conveyor_backend/):
+    python vision/scripts/benchmark_analysis_scale.py [video_path] [--frames N] [--scales 1.0,0.5,0.25]
+
+Without a video a synthetic 4K textured belt is generated.
+"""
+import os
+import sys
+import time
+import argparse
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conveyor_backend.settings')
+
+import django
+
+django.setup()
+
+from vision.scripts.synthetic_belt import synthetic_frames, video_frames
+from vision.services.belt_processor import BeltDetector, BeltTrackState
+
+
+def run(frames, scale, tracking):
+    detector = BeltDetector()
+    detector.set_detection_parameters({'analysis_scale': scale, 'tracking_enabled': tracking})
+    track_state = BeltTrackState() if tracking else None
+    found = 0
+    start = time.perf_counter()
+    for frame in frames:
+        belt_data = detector.detect_belt_with_details(frame, track_state)
+        found += int(belt_data['belt_found'])
+    elapsed = time.perf_counter() - start
+    return len(frames) / elapsed if elapsed > 0 else 0.0, found
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('video', nargs='?')
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--scales', default='1.0,0.75,0.5,0.33,0.25')
+    args = parser.parse_args()
+
+    frames = video_frames(args.video, args.frames) if args.video else synthetic_frames(args.frames, width=3840, height=2160)
+    if not frames:
+        print("No frames to benchmark")
+        return
+    h, w = frames[0].shape[:2]
+    print(f"{len(frames)} frames at {w}x{h}")
+    print(f"{'scale':>6} {'analysis':>10} {'fps':>8} {'fps (tracking)':>15} {'found':>6}")
+    for scale in [float(s) for s in args.scales.split(',')]:
+        fps, found = run(frames, scale, tracking=False)
+        fps_tracking, _ = run(frames, scale, tracking=True)
+        size = f"{int(w * scale)}x{int(h * scale)}"
+        print(f"{scale:>6.2f} {size:>10} {fps:>8.1f} {fps_tracking:>15.1f} {found:>6}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,101 @@
+"""
+Benchmark the speed estimator backends on synthetic belts moving at a known speed.
+
+Usage (from conveyor_backend/):
+    python vision/scripts/benchmark_speed_estimators.py [--frames N] [--speeds 2,5,12] [--jitter PX]
+                                                        [--noise SIGMA] [--video PATH]
+                                                        [--estimators farneback,lk,phase]
+
+Speeds are belt displacements in pixels per frame; with the default 1 mm per pixel and 30 fps
+the expected speed is px * 0.03 m/s. --jitter moves the belt band up and down by up to PX
+pixels per frame to mimic a jittering belt mask; each speed is also run on a copy of the clip
+with Gaussian sensor noise of --noise. The estimators are then run over --video (by default
+the textured sample clip, which loops every 120 frames) where the true speed is unknown:
+spikes counts estimates above twice the median, as a content jump throws off a tracker.
+"""
+import os
+import sys
+import time
+import argparse
+
+import numpy as np
+
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, BASE_DIR)
+os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conveyor_backend.settings')
+
+import django
+
+django.setup()
+
+from vision.scripts.synthetic_belt import synthetic_frames, video_frames
+from vision.services.belt_processor import BeltDetector, BeltTrackState
+from vision.services.frame_context import FrameContext, FrameWorkspace
+from vision.services.speed_estimators import SPEED_ESTIMATORS, create_speed_estimator
+
+FPS = 30.0
+SAMPLE_VIDEO = os.path.join(BASE_DIR, 'camera', 'scripts', 'public', 'videos', 'synthetic_conveyor.mp4')
+
+
+def run(frames, estimator_name):
+    detector = BeltDetector()
+    track_state = BeltTrackState()
+    workspace = FrameWorkspace()
+    estimator = create_speed_estimator(estimator_name)
+    prev_gray, prev_belt_data = None, None
+    speeds, elapsed = [], 0.0
+    for index, frame in enumerate(frames):
+        ctx = FrameContext(frame, workspace=workspace)
+        belt_data = detector.detect_belt_with_details(frame, track_state, ctx)
+        gray = ctx.gray
+        if prev_gray is not None:
+            start = time.perf_counter()
+            speeds.append(estimator.speed_mps(prev_gray, gray, prev_belt_data, belt_data, FPS, workspace,
+                                              (index - 1, index)))
+            elapsed += time.perf_counter() - start
+        prev_gray, prev_belt_data = gray, belt_data
+    return np.array(speeds), elapsed / max(1, len(speeds))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--frames', type=int, default=30)
+    parser.add_argument('--speeds', default='2,5,12')
+    parser.add_argument('--jitter', type=int, default=0)
+    parser.add_argument('--noise', type=float, default=12.0)
+    parser.add_argument('--video', default=SAMPLE_VIDEO, help="clip to run the estimators over ('' to skip)")
+    parser.add_argument('--video-frames', type=int, default=300)
+    parser.add_argument('--estimators', default=','.join(SPEED_ESTIMATORS))
+    args = parser.parse_args()
+
+    estimators = args.estimators.split(',')
+    print(f"{args.frames} frames at 1920x1080, jitter {args.jitter} px")
+    print(f"{'px/frame':>8} {'noise':>5} {'expected':>9} {'estimator':>10} {'mean m/s':>9} {'std':>7} {'error %':>8} "
+          f"{'ms/frame':>9}")
+    for px_per_frame in [float(s) for s in args.speeds.split(',')]:
+        expected = px_per_frame * FPS * 0.001
+        for noise in sorted({0.0, args.noise}):
+            frames = synthetic_frames(args.frames, px_per_frame, args.jitter, noise=noise)
+            for name in estimators:
+                speeds, seconds = run(frames, name)
+                mean = float(np.mean(speeds)) if speeds.size else 0.0
+                std = float(np.std(speeds)) if speeds.size else 0.0
+                error = 100.0 * (mean - expected) / expected if expected else 0.0
+                print(f"{px_per_frame:>8.1f} {noise:>5.0f} {expected:>9.3f} {name:>10} {mean:>9.3f} {std:>7.3f} "
+                      f"{error:>8.1f} {seconds * 1000:>9.1f}")
+
+    frames = video_frames(args.video, args.video_frames) if args.video else []
+    if not frames:
+        return
+    print(f"\n{os.path.basename(args.video)}, {len(frames)} frames")
+    print(f"{'estimator':>10} {'mean m/s':>9} {'median':>7} {'std':>7} {'max':>7} {'spikes':>6} {'ms/frame':>9}")
+    for name in estimators:
+        speeds, seconds = run(frames, name)
+        median = float(np.median(speeds))
+        spikes = int(np.count_nonzero(speeds > 2 * median)) if median > 0 else 0
+        print(f"{name:>10} {np.mean(speeds):>9.3f} {median:>7.3f} {np.std(speeds):>7.3f} {np.max(speeds):>7.3f} "
+              f"{spikes:>6} {seconds * 1000:>9.1f}")
+
+
+if __name__ == '__main__':
+    main()
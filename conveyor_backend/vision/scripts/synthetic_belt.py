@@ -0,0 +1,41 @@
+"""
+Conveyor footage shared by the benchmark scripts in this directory.
+"""
+import cv2
+import numpy as np
+
+
+def synthetic_frames(count, px_per_frame=12, jitter=0, width=1920, height=1080, noise=0):
+    """
+    Textured belt band moving left to right by px_per_frame over a noisy background, optionally
+    jittering vertically by up to `jitter` pixels per frame. `noise` adds Gaussian sensor noise of
+    that standard deviation to every frame, belt included.
+    """
+    rng = np.random.default_rng(0)
+    top, bottom = int(height * 0.35), int(height * 0.70)
+    texture = cv2.GaussianBlur(rng.integers(0, 255, (bottom - top, width * 2), dtype=np.uint8), (5, 5), 0)
+    frames = []
+    for i in range(count):
+        frame = np.full((height, width, 3), 60, np.uint8)
+        frame += rng.integers(0, 8, frame.shape, dtype=np.uint8)
+        offset = int(rng.integers(-jitter, jitter + 1)) if jitter else 0
+        shift = width - (int(i * px_per_frame) % width)
+        frame[top + offset:bottom + offset] = texture[:, shift:shift + width, None]
+        if noise:
+            grain = rng.normal(0, noise, frame.shape[:2]).astype(np.int16)
+            frame = np.clip(frame + grain[..., None], 0, 255).astype(np.uint8)
+        frames.append(frame)
+    return frames
+
+
+def video_frames(path, count):
+    """Up to `count` frames read from the start of the video at `path`"""
+    cap = cv2.VideoCapture(path)
+    frames = []
+    while len(frames) < count:
+        ret, frame = cap.read()
+        if not ret:
+            break
+        frames.append(frame)
+    cap.release()
+    return frames
@@ -0,0 +1,108 @@
+# vision/services/belt_geometry.py
+import cv2
+import numpy as np
+
+
+class BeltGeometry:
+    """
+    Derived geometry of a detected belt outline, computed on first access and cached.
+
+    Hull, minimum-area rectangle and corners are only produced when a consumer (visualizer,
+    alert logic, subscriber) reads them, and at most once per outline. scaled() returns a
+    geometry whose values are mapped from this one, so tracked outlines share the work.
+    """
+
+    def __init__(self, contour, corner_distance=10, source=None, factor=1.0):
+        self.contour = contour
+        self.corner_distance = corner_distance
+        self._source = source  # geometry the values are mapped from (scaled())
+        self._factor = factor
+        self._cache = {}
+
+    def scaled(self, factor, contour=None):
+        """Geometry at another resolution, e.g. analysis -> native; values are mapped lazily"""
+        if contour is None:
+            contour = self._polygon(self.contour, factor)
+        return BeltGeometry(contour, self.corner_distance, source=self, factor=factor)
+
+    @staticmethod
+    def _polygon(points, factor):
+        return None if points is None else np.round(points * factor).astype(np.int32)
+
+    def _cached(self, key, compute):
+        if key not in self._cache:
+            self._cache[key] = compute()
+        return self._cache[key]
+
+    @property
+    def min_area_rect(self):
+        """cv2.minAreaRect of the outline: ((cx, cy), (w, h), angle)"""
+        def compute():
+            if self._source is not None:
+                (cx, cy), (w, h), angle = self._source.min_area_rect
+                f = self._factor
+                return (cx * f, cy * f), (w * f, h * f), angle
+            return cv2.minAreaRect(self.contour)
+        return self._cached('min_area_rect', compute)
+
+    @property
+    def box_points(self):
+        """Corners of the minimum-area rectangle as an int32 polygon"""
+        def compute():
+            if self._source is not None:
+                return self._polygon(self._source.box_points, self._factor)
+            return cv2.boxPoints(self.min_area_rect).astype(np.int32)
+        return self._cached('box_points', compute)
+
+    @property
+    def convex_hull(self):
+        def compute():
+            if self._source is not None:
+                return self._polygon(self._source.convex_hull, self._factor)
+            return cv2.convexHull(self.contour)
+        return self._cached('convex_hull', compute)
+
+    @property
+    def convex_hull_area(self):
+        def compute():
+            if self._source is not None:
+                return float(self._source.convex_hull_area * self._factor * self._factor)
+            hull = self.convex_hull
+            return float(cv2.contourArea(hull)) if hull is not None else 0.0
+        return self._cached('convex_hull_area', compute)
+
+    @property
+    def min_area_rect_area(self):
+        def compute():
+            if self._source is not None:
+                return float(self._source.min_area_rect_area * self._factor * self._factor)
+            return float(cv2.contourArea(self.box_points))
+        return self._cached('min_area_rect_area', compute)
+
+    @property
+    def orientation(self):
+        return float(self.min_area_rect[2])
+
+    @property
+    def corners(self):
+        """Up to 20 corner points of the outline as [x, y] lists"""
+        def compute():
+            if self._source is not None:
+                f = self._factor
+                return [[int(round(x * f)), int(round(y * f))] for x, y in self._source.corners]
+            return self._find_corner_points(self.contour, min_distance=self.corner_distance)
+        return self._cached('corners', compute)
+
+    @property
+    def corner_points(self):
+        return len(self.corners)
+
+    @staticmethod
+    def _find_corner_points(contour, max_corners=20, quality=0.01, min_distance=10):
+        if contour is None or len(contour) < 4:
+            return []
+        pts = contour.reshape(-1, 2).astype(np.float32)
+        corners = cv2.goodFeaturesToTrack(pts, max_corners, quality, min_distance)
+        if corners is not None:
+            return corners.reshape(-1, 2).astype(int).tolist()
+        return []
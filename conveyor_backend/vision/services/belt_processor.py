@@ -1,27 +1,60 @@
 # vision/services/belt_processor.py
 import os
+import re
 import time
 import queue
 import threading
 import logging
 import base64
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 from datetime import datetime
-from collections import deque
 
 import numpy as np
-from asgiref.sync import async_to_sync
 from channels.layers import get_channel_layer
 from django.conf import settings
 
 from vision.models import ProcessingJob, VideoFile
+from vision.services.belt_geometry import BeltGeometry
+from vision.services.detector_scheduler import DetectorScheduler
+from vision.services.frame_context import FrameContext, FrameWorkspace
+from vision.services.frame_pipeline import FramePipeline
+from vision.services.frame_store import frame_store
+from vision.services.job_state import JobRegistry
+from vision.services.metrics_schema import BELT_METRICS
+from vision.services.metrics_store import DEFAULT_POINTS, MetricsStore
+from vision.services.motion_gate import MotionGate
+from vision.services.progress_groups import send_progress
+from vision.services.replay_store import ReplayReader, ReplayWriter
+from vision.services.rolling_stats import RollingWindow
+from vision.services import offline_analysis
+from vision.services.speed_estimators import FarnebackSpeedEstimator, create_speed_estimator
 import cv2
 
 logger = logging.getLogger(__name__)
 
+MODE_LIVE = 'live'
+MODE_OFFLINE = 'offline'
+PROCESSING_MODES = (MODE_LIVE, MODE_OFFLINE)
+
+# Live-job pacing: play recordings at the source frame rate, or process frames as fast as possible
+PACING_REALTIME = 'realtime'
+PACING_MAX_THROUGHPUT = 'max_throughput'
+PACING_MODES = (PACING_REALTIME, PACING_MAX_THROUGHPUT)
+
+# Replay recordings of live jobs, one directory per job
+REPLAY_ROOT = getattr(settings, 'REPLAY_ROOT', os.path.join(settings.MEDIA_ROOT, 'replays'))
+MAX_REPLAY_FRAMES = 300  # frames returned per get_replay_frames() call
+# Consecutive frames the motion gate must find unchanged before the belt is reported stopped
+STOPPED_AFTER_UNCHANGED = 5
+METRICS_ROOT = getattr(settings, 'METRICS_ROOT', os.path.join(settings.MEDIA_ROOT, 'metrics'))
+
 
 class BeltUtils:
     """Utility methods for belt processing, speed calculation, and visualization"""
 
+    _default_estimator = FarnebackSpeedEstimator()  # stateless, safe to share
+
     def ensure_serializable(self, obj):
         if obj is None:
             return None
@@ -47,69 +80,34 @@ class BeltUtils:
             except:
                 return None
 
-    def calculate_speed_fast(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps):
-        """Calculate belt speed using optical flow limited to the belt mask (m/s)"""
-        try:
-            if not prev_belt_data or not curr_belt_data or not prev_belt_data.get(
-                    'belt_found') or not curr_belt_data.get('belt_found'):
-                return 0.0
-            height, width = prev_frame_gray.shape[:2]
-
-            def safe_mask(mask):
-                if mask is None:
-                    return np.zeros((height, width), dtype=np.uint8)
-                m = mask.astype(np.uint8)
-                if m.shape != (height, width):
-                    m = cv2.resize(m, (width, height), interpolation=cv2.INTER_NEAREST)
-                return (m > 0).astype(np.uint8) * 255
-
-            prev_mask = safe_mask(prev_belt_data.get('belt_mask'))
-            curr_mask = safe_mask(curr_belt_data.get('belt_mask'))
-
-            # Ensure masks are the same size as frames
-            if prev_mask.shape != prev_frame_gray.shape:
-                prev_mask = cv2.resize(prev_mask, (prev_frame_gray.shape[1], prev_frame_gray.shape[0]))
-            if curr_mask.shape != curr_frame_gray.shape:
-                curr_mask = cv2.resize(curr_mask, (curr_frame_gray.shape[1], curr_frame_gray.shape[0]))
-
-            prev_masked = cv2.bitwise_and(prev_frame_gray, prev_frame_gray, mask=prev_mask)
-            curr_masked = cv2.bitwise_and(curr_frame_gray, curr_frame_gray, mask=curr_mask)
-
-            if np.count_nonzero(prev_mask) < 50:
-                return 0.0
-
-            flow = cv2.calcOpticalFlowFarneback(prev_masked, curr_masked, None,
-                                                0.5, 3, 15, 3, 5, 1.2, 0)
-            if flow is None:
-                return 0.0
-
-            flow_x = flow[..., 0]
-            movements = flow_x[prev_mask > 0]
-            valid = movements[np.abs(movements) > 0.05]
-            if valid.size == 0:
-                return 0.0
-
-            avg_px_per_frame = float(np.mean(valid))
-            pixel_to_meter = 0.001  # default 1 mm per px
-            try:
-                if curr_belt_data.get('belt_physical_width_mm') and curr_belt_data.get('belt_width'):
-                    physical_mm = float(curr_belt_data['belt_physical_width_mm'])
-                    pixel_width = float(curr_belt_data['belt_width'])
-                    pixel_to_meter = (physical_mm / 1000.0) / pixel_width if pixel_width > 0 else 0.001
-            except:
-                pass
-
-            return float(abs(avg_px_per_frame) * fps * pixel_to_meter)
-        except Exception as e:
-            logger.error(f"Error calculating speed: {e}")
-            return 0.0
-
-    def calculate_speed_kmh(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps):
-        return self.calculate_speed_fast(prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps) * 3.6
-
-    def draw_enhanced_visualizations(self, frame, belt_data, metrics, alert_active=False):
-        """Draw contours, edges, speed, alignment, and overlay metrics with spillage/damage alarms"""
-        vis = frame.copy()
+    def calculate_speed_fast(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps,
+                             workspace=None, estimator=None, frame_numbers=None):
+        """
+        Calculate belt speed (m/s) with a speed estimator backend (dense Farneback flow by default).
+        With a FrameWorkspace the masked images and flow field reuse the job's buffers; frame_numbers
+        (previous, current) lets stateful backends continue from the last call.
+        """
+        if estimator is None:
+            estimator = self._default_estimator
+        return estimator.speed_mps(prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps, workspace,
+                                   frame_numbers)
+
+    def calculate_speed_kmh(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps,
+                            workspace=None, estimator=None, frame_numbers=None):
+        return self.calculate_speed_fast(prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps,
+                                         workspace, estimator, frame_numbers) * 3.6
+
+    def draw_enhanced_visualizations(self, frame, belt_data, metrics, alert_active=False, out=None, now=None):
+        """
+        Draw contours, edges, speed, alignment, and overlay metrics with spillage/damage alarms.
+        `out` is an optional frame-sized buffer the annotated image is drawn into; `now` is the
+        job clock the alert timer is measured on (defaults to the wall clock).
+        """
+        if out is not None and out.shape == frame.shape:
+            np.copyto(out, frame)
+            vis = out
+        else:
+            vis = frame.copy()
         h, w = vis.shape[:2]
         COLOR_GREEN = (0, 255, 0)
         COLOR_RED = (0, 0, 255)
@@ -130,10 +128,10 @@ class BeltUtils:
         contour = belt_data.get('contour')
         if contour is not None and len(contour) > 2:
             cv2.drawContours(vis, [contour], -1, COLOR_GREEN, 2)
-        if belt_data.get('convex_hull') is not None:
-            cv2.drawContours(vis, [belt_data['convex_hull']], -1, COLOR_CYAN, 2)
-        if belt_data.get('min_area_rect') is not None:
-            cv2.drawContours(vis, [belt_data['min_area_rect']], -1, COLOR_BLUE, 2)
+        geometry = belt_data.get('geometry')
+        if geometry is not None:
+            cv2.drawContours(vis, [geometry.convex_hull], -1, COLOR_CYAN, 2)
+            cv2.drawContours(vis, [geometry.box_points], -1, COLOR_BLUE, 2)
 
         # Draw edges inside belt - safely
         edges = belt_data.get('edges')
@@ -231,9 +229,9 @@ class BeltUtils:
         # Show STOP warning only when alert is active
         if alert_active:
             # Create semi-transparent red overlay
-            overlay = vis.copy()
-            cv2.rectangle(overlay, (0, 0), (w, h), (0, 0, 255), -1)
-            vis = cv2.addWeighted(overlay, 0.2, vis, 0.8, 0)
+            # Blend 20% red in place (same as addWeighted with a filled red overlay)
+            cv2.convertScaleAbs(vis, vis, alpha=0.8)
+            cv2.add(vis, (0, 0, 51, 0), dst=vis)
 
             # Draw STOP warning
             cv2.putText(vis, "!!! STOP !!!", (w // 2 - 200, h // 2),
@@ -248,7 +246,7 @@ class BeltUtils:
 
             # Add timer for how long the alert has been active
             if 'alert_start_time' in metrics:
-                alert_duration = time.time() - metrics['alert_start_time']
+                alert_duration = (time.time() if now is None else now) - metrics['alert_start_time']
                 timer_text = f"Alert active: {alert_duration:.1f}s"
                 cv2.putText(vis, timer_text, (w // 2 - 150, h // 2 + 200),
                             cv2.FONT_HERSHEY_SIMPLEX, 0.7, COLOR_RED, 2, cv2.LINE_AA)
@@ -256,6 +254,33 @@ class BeltUtils:
         return vis
 
 
+class BeltTrackState:
+    """Per-job memory of the last full belt detection, used by the detector's tracking mode"""
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.belt_data = None  # base belt data of the last full detection (no damage/spillage fields)
+        self.frame_shape = None
+        self.roi = None  # (x, y, w, h) in crop coordinates covering the band around the belt outline
+        self.inner_band = None  # ring just inside the last known belt edges (roi-sized)
+        self.outer_band = None  # ring just outside the last known belt edges (roi-sized)
+        self.mask_roi = None
+        self.inner_area = 0
+        self.outer_area = 0
+        self.canny_thresholds = None
+        self.full_res_geometry = None  # belt geometry mapped back to native resolution (analysis_scale < 1)
+        self.edge_band = None  # belt pixels near the belt edge, cached for damage detection
+        self.edge_band_search = None  # `searches` value the cached edge band was computed at
+        self.searches = 0  # full searches run; the belt mask only changes with a new search
+        self.last_full_bbox = None  # bbox of the previous full detection; tracking locks when it repeats
+        self.baseline_contrast = 0.0
+        self.frames_since_full = 0
+        self.full_detections = 0
+        self.tracked_frames = 0
+
+
 class BeltDetector:
     """Detect conveyor belt contours, mask, and key metrics with spillage and damage detection"""
 
@@ -283,7 +308,16 @@ class BeltDetector:
             'damage_detection_enabled': False,
             # Confidence thresholds
             'damage_confidence_threshold': 0.7,
-            'spillage_confidence_threshold': 0.9
+            'spillage_confidence_threshold': 0.9,
+            # Tracking mode: reuse last belt outline and verify it in a narrow band
+            'tracking_enabled': True,
+            'tracking_band_px': 10,  # half-width of the verification band around the belt edges
+            'tracking_min_contrast_ratio': 0.6,  # re-detect when band contrast drops below this share of baseline
+            'tracking_max_frames': 30,  # force a full detection at least every N frames
+            'tracking_lock_iou': 0.9,  # lock only when two consecutive full detections overlap this much
+            # Multi-resolution: segmentation runs on a downscaled frame, results are mapped back
+            'analysis_scale': 1.0,  # fraction of native resolution used for analysis
+            'analysis_max_width': 0  # if > 0, frames wider than this are downscaled to this width
         }
 
     def set_detection_parameters(self, parameters=None):
@@ -303,21 +337,15 @@ class BeltDetector:
             'alignment_deviation': 0,
             'frame_center': frame_center,
             'contour': None,
-            'convex_hull': None,
-            'min_area_rect': None,
+            'geometry': None,  # BeltGeometry: hull, min-area rect and corners, computed on demand
             'edges': edges_img if edges_img is not None else np.zeros((height, width), dtype=np.uint8),
             'edge_points': 0,
             'belt_mask': np.zeros((height, width), dtype=np.uint8),
             'confidence': 0.0,
             'contour_points': 0,
-            'corner_points': 0,
-            'convex_hull_area': 0.0,
-            'min_area_rect_area': 0.0,
             'aspect_ratio': 0.0,
             'solidity': 0.0,
             'extent': 0.0,
-            'corners': [],
-            'belt_orientation': 0.0,
             # New fields for damage and spillage detection
             'damaged_points': [],
             'spillage_points': [],
@@ -328,20 +356,92 @@ class BeltDetector:
             'has_spillage': False,
             'has_damage': False,
             'damage_confidence': 0.0,
-            'spillage_confidence': 0.0
+            'spillage_confidence': 0.0,
+            'detection_mode': 'full',
+            'analysis_scale': 1.0
         }
 
-    def _find_corner_points(self, contour, max_corners=20, quality=0.01, min_distance=10):
-        if contour is None or len(contour) < 4:
-            return []
-        pts = contour.reshape(-1, 2).astype(np.float32)
-        corners = cv2.goodFeaturesToTrack(pts, max_corners, quality, min_distance)
-        if corners is not None:
-            return corners.reshape(-1, 2).astype(int).tolist()
-        return []
-
-    def _detect_damage_points(self, frame, belt_mask, contour, edges):
-        """Detect potential damage points (edge tears, holes) on the belt"""
+    def _analysis_scale(self, width):
+        """Resolution factor used for analysis of a frame of the given width"""
+        scale = float(self.detection_params.get('analysis_scale', 1.0) or 1.0)
+        max_width = int(self.detection_params.get('analysis_max_width', 0) or 0)
+        if max_width > 0 and width * scale > max_width:
+            scale = max_width / float(width)
+        return min(1.0, max(0.05, scale))
+
+    @staticmethod
+    def _scaled_px(value, scale, minimum=1):
+        """Scale a length threshold given in native pixels to analysis resolution"""
+        return max(minimum, int(round(value * scale)))
+
+    def _map_to_full_resolution(self, belt_data, context, scale, track_state=None):
+        """Map analysis-resolution belt data back to the native frame of `context` (in place)"""
+        height, width = context.shape
+        inv = 1.0 / scale
+
+        def point(p):
+            return int(round(p[0] * inv)), int(round(p[1] * inv))
+
+        def polygon(a):
+            return None if a is None else np.round(a * inv).astype(np.int32)
+
+        geometry = track_state.full_res_geometry if track_state is not None else None
+        if geometry is None:
+            contour = polygon(belt_data['contour'])
+            # Full-resolution mask is redrawn from the scaled contour rather than upsampled
+            belt_mask = context.zeros('belt_mask', rotate=True)
+            cv2.drawContours(belt_mask, [contour], -1, 255, -1)
+            geometry = {
+                'belt_bbox': [int(round(v * inv)) for v in belt_data['belt_bbox']],
+                'belt_center': point(belt_data['belt_center']),
+                'belt_width': float(belt_data['belt_width'] * inv),
+                'belt_height': float(belt_data['belt_height'] * inv),
+                'belt_area_pixels': float(belt_data['belt_area_pixels'] * inv * inv),
+                'alignment_deviation': int(round(belt_data['alignment_deviation'] * inv)),
+                'frame_center': width // 2,
+                'contour': contour,
+                'geometry': belt_data['geometry'].scaled(inv, contour),
+                'belt_mask': belt_mask
+            }
+            if track_state is not None:
+                track_state.full_res_geometry = geometry
+
+        belt_data.update(geometry)
+        for key in ('damaged_points', 'spillage_points', 'edge_tear_points'):
+            belt_data[key] = [point(p) for p in belt_data.get(key, [])]
+        belt_data['analysis_scale'] = scale
+        return belt_data
+
+    def _belt_edge_band(self, ctx, belt_mask, track_state=None):
+        """
+        Belt pixels within 15 px (native) of the belt edge, from one distance transform of the mask.
+        Cached on the track state until the next full search; the mask buffer itself is pooled and
+        rotates, so its identity does not tell whether its contents changed.
+        """
+        if track_state is not None and track_state.edge_band is not None \
+                and track_state.edge_band_search == track_state.searches:
+            return track_state.edge_band
+
+        max_edge_distance = 15 * ctx.scale
+        distance = cv2.distanceTransform(belt_mask, cv2.DIST_L2, 3,
+                                         dst=ctx.buffer('edge_distance', dtype=np.float32))
+        # A cached band must outlive the frame, so it only uses a pooled buffer when not tracking
+        edge_band = ctx.buffer('edge_band') if track_state is None else None
+        edge_band = cv2.compare(distance, max_edge_distance, cv2.CMP_LT, dst=edge_band)
+        # Pixels outside the belt have distance 0 and are removed by the mask AND
+        cv2.bitwise_and(edge_band, belt_mask, dst=edge_band)
+
+        if track_state is not None:
+            track_state.edge_band = edge_band
+            track_state.edge_band_search = track_state.searches
+        return edge_band
+
+    def _detect_damage_points(self, ctx, belt_mask, contour, edges, track_state=None):
+        """
+        Detect potential damage points (edge tears, holes) on the belt.
+        Strong-gradient edge pixels near the belt edge are selected with array masks and
+        grouped into clusters with connected components; one point is reported per cluster.
+        """
         damaged_points = []
         damage_confidence = 0.0
 
@@ -349,156 +449,148 @@ class BeltDetector:
             return damaged_points, damage_confidence
 
         try:
-            # Convert mask to binary
-            mask_binary = (belt_mask > 0).astype(np.uint8)
-
-            # Find edges within the belt mask
-            belt_edges = cv2.bitwise_and(edges, edges, mask=mask_binary)
+            # Find edges within the belt mask (masks are 0/255)
+            belt_edges = cv2.bitwise_and(edges, belt_mask, dst=ctx.buffer('damage_belt_edges'))
 
             # Apply morphological operations to highlight irregular edges
             kernel = np.ones((3, 3), np.uint8)
-            dilated_edges = cv2.dilate(belt_edges, kernel, iterations=1)
-            eroded_edges = cv2.erode(dilated_edges, kernel, iterations=1)
+            dilated_edges = cv2.dilate(belt_edges, kernel, dst=ctx.buffer('damage_dilated'), iterations=1)
+            eroded_edges = cv2.erode(dilated_edges, kernel, dst=ctx.buffer('damage_eroded'), iterations=1)
 
             # The difference highlights potential damage/tears
-            damage_mask = cv2.absdiff(dilated_edges, eroded_edges)
-
-            # Find strong gradient changes within the belt (potential holes/tears)
-            if len(frame.shape) == 3:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = frame.copy()
-
-            # Apply Sobel edge detection for more sensitive damage detection
-            sobelx = cv2.Sobel(gray, cv2.CV_64F, 1, 0, ksize=3)
-            sobely = cv2.Sobel(gray, cv2.CV_64F, 0, 1, ksize=3)
-            gradient_magnitude = np.sqrt(sobelx ** 2 + sobely ** 2)
-            gradient_magnitude = np.uint8(np.clip(gradient_magnitude, 0, 255))
-
-            # Ensure damage_mask and gradient_magnitude have same size
-            if damage_mask.shape != gradient_magnitude.shape:
-                damage_mask = cv2.resize(damage_mask, (gradient_magnitude.shape[1], gradient_magnitude.shape[0]))
-
-            # Combine with damage mask
-            combined_damage = cv2.bitwise_and(gradient_magnitude, gradient_magnitude, mask=damage_mask)
-
-            # Find points with high gradient within damage areas
-            _, damage_thresh = cv2.threshold(combined_damage, 60, 255, cv2.THRESH_BINARY)  # Increased threshold
-
-            # Get coordinates of potential damage points
-            damage_points_y, damage_points_x = np.where(damage_thresh > 0)
-
-            # Filter points to avoid too many false positives
-            min_damage_area = self.detection_params.get('min_damage_area', 80)
-            valid_points = 0
-
-            for y, x in zip(damage_points_y[:100], damage_points_x[:100]):  # Limit points
-                # Ensure point is inside belt contour
-                if cv2.pointPolygonTest(contour, (x, y), False) >= 0:
-                    # Check if it's near the edges (more likely to be damage)
-                    distance_to_contour = cv2.pointPolygonTest(contour, (x, y), True)
-                    if abs(distance_to_contour) < 15:  # Reduced to 15 pixels
-                        # Check if this is a cluster of points (more likely to be real damage)
-                        damaged_points.append((x, y))
-                        valid_points += 1
-
-            # Calculate confidence based on number of valid points and clustering
-            if valid_points > 0:
-                # Higher confidence if we have clustered points
-                if valid_points > 5:
-                    damage_confidence = min(1.0, valid_points / 20.0)
+            damage_mask = cv2.absdiff(dilated_edges, eroded_edges, dst=ctx.buffer('damage_mask'))
+
+            # Keep strong gradient changes (potential holes/tears) inside the damage areas
+            gradient_magnitude = ctx.gradient_magnitude
+            _, strong = cv2.threshold(gradient_magnitude, 60, 255, cv2.THRESH_BINARY,
+                                      dst=ctx.buffer('damage_strong'))
+            candidates = cv2.bitwise_and(strong, damage_mask, dst=ctx.buffer('damage_candidates'))
+
+            # Only points inside the belt and near its edges (more likely to be damage)
+            candidates = cv2.bitwise_and(candidates, self._belt_edge_band(ctx, belt_mask, track_state),
+                                         dst=candidates)
+
+            # Cluster candidates; small clusters are treated as noise
+            count, _, stats, centroids = cv2.connectedComponentsWithStats(
+                candidates, labels=ctx.buffer('damage_labels', dtype=np.int32), connectivity=8)
+            if count <= 1:
+                return damaged_points, damage_confidence
+
+            min_damage_area = self.detection_params.get('min_damage_area', 80) * ctx.scale * ctx.scale
+            areas = stats[1:, cv2.CC_STAT_AREA]
+            keep = np.flatnonzero(areas >= min_damage_area)
+            keep = keep[np.argsort(areas[keep])[::-1]]  # largest clusters first
+            damaged_points = [(int(round(x)), int(round(y))) for x, y in centroids[keep + 1]]
+
+            # Damaged area in units of the smallest reportable cluster (each kept cluster counts >= 1)
+            damage_units = float(areas[keep].sum()) / min_damage_area if keep.size else 0.0
+
+            # Calculate confidence based on the amount of clustered damage
+            if damage_units > 0:
+                if damage_units >= 2.0:
+                    # 0.33 at two minimal clusters' worth, saturating at six
+                    damage_confidence = min(1.0, damage_units / 6.0)
                 else:
-                    damage_confidence = 0.3  # Low confidence for few points
+                    damage_confidence = 0.3  # Low confidence for a single small cluster
 
         except Exception as e:
             logger.error(f"Error detecting damage points: {e}")
 
-        return damaged_points[:30], damage_confidence  # Limit to 30 points
+        return damaged_points[:30], damage_confidence  # Limit to 30 clusters
 
-    def _detect_spillage_points(self, frame, belt_mask, contour):
-        """Detect potential spillage (material outside the belt)"""
+    def _detect_spillage_points(self, ctx, belt_mask, contour):
+        """
+        Detect potential spillage (material outside the belt).
+        Outlines outside the belt large enough to count are filled with their own label, and their
+        overlap with the band around the belt is counted for all of them in one pass.
+        """
         spillage_points = []
         spillage_confidence = 0.0
+        scale = ctx.scale
 
         try:
-            if len(frame.shape) == 3:
-                gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
-            else:
-                gray = frame.copy()
-
             # Create inverse mask (areas outside the belt)
-            inverse_mask = cv2.bitwise_not(belt_mask)
-
-            # Apply CLAHE to enhance contrast
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            enhanced = clahe.apply(gray)
+            inverse_mask = cv2.bitwise_not(belt_mask, dst=ctx.buffer('spillage_inverse'))
 
-            # Detect edges outside the belt with higher thresholds
-            edges_outside = cv2.Canny(enhanced, 70, 180)  # Increased thresholds
-            edges_outside = cv2.bitwise_and(edges_outside, edges_outside, mask=inverse_mask)
+            # Detect edges outside the belt on the CLAHE image with higher thresholds
+            edges_outside = ctx.canny(70, 180, source='clahe')  # Increased thresholds
+            edges_outside = cv2.bitwise_and(edges_outside, inverse_mask, dst=ctx.buffer('spillage_edges'))
 
             # Apply morphological operations to connect nearby edges
-            kernel = np.ones((5, 5), np.uint8)
-            edges_outside = cv2.morphologyEx(edges_outside, cv2.MORPH_CLOSE, kernel, iterations=2)
+            close_size = self._scaled_px(5, scale, 3)
+            kernel = np.ones((close_size, close_size), np.uint8)
+            edges_outside = cv2.morphologyEx(edges_outside, cv2.MORPH_CLOSE, kernel, dst=edges_outside, iterations=2)
 
-            # Find contours outside the belt
+            # Outlines outside the belt; areas are filled contour areas, which is what
+            # min_spillage_area and the confidence scale were calibrated on
             contours, _ = cv2.findContours(edges_outside, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-
-            min_spillage_area = self.detection_params.get('min_spillage_area', 150)
-            total_spillage_area = 0
-
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                # Filter small noise
-                if area < min_spillage_area:
-                    continue
-
-                # Get bounding box
-                x, y, w, h = cv2.boundingRect(cnt)
-
-                # Check if contour is near the belt (adjacent to belt edges)
-                # Create a small expanded belt mask to check proximity
-                expanded_belt = cv2.dilate(belt_mask, np.ones((20, 20), np.uint8), iterations=1)  # Increased dilation
-
-                # Check overlap with expanded belt
-                roi_mask = np.zeros_like(belt_mask)
-                cv2.drawContours(roi_mask, [cnt], -1, 255, -1)
-                overlap = cv2.bitwise_and(roi_mask, expanded_belt)
-
-                overlap_area = np.sum(overlap > 0)
-                if overlap_area > 20:  # Increased minimum overlap
-                    total_spillage_area += area
-
-                    # Get center point of the spillage contour
-                    M = cv2.moments(cnt)
-                    if M['m00'] != 0:
-                        cx = int(M['m10'] / M['m00'])
-                        cy = int(M['m01'] / M['m00'])
-                        spillage_points.append((cx, cy))
-
-                        # Limit number of points per contour
-                        for i in range(0, len(cnt), max(1, len(cnt) // 3)):
-                            point = cnt[i][0]
-                            spillage_points.append(tuple(point))
+            min_spillage_area = self.detection_params.get('min_spillage_area', 250) * scale * scale
+            candidates = [(cv2.contourArea(cnt), cnt) for cnt in contours]
+            candidates = [(area, cnt) for area, cnt in candidates if area >= min_spillage_area]
+            if not candidates:
+                return spillage_points, spillage_confidence
+
+            # Fill every candidate with its own label, then count the overlap of all of them with the
+            # band around the belt (adjacent to belt edges) in one bincount
+            labels = ctx.zeros('spillage_labels', dtype=np.int32)
+            for label, (_, cnt) in enumerate(candidates, start=1):
+                cv2.drawContours(labels, [cnt], -1, label, -1)
+            proximity_size = self._scaled_px(20, scale)
+            expanded_belt = cv2.dilate(belt_mask, np.ones((proximity_size, proximity_size), np.uint8),
+                                       dst=ctx.buffer('spillage_expanded'), iterations=1)
+            overlap = np.bincount(labels[expanded_belt > 0], minlength=len(candidates) + 1)
+
+            min_overlap_area = 20 * scale * scale
+            spills = [candidates[label - 1] for label in np.flatnonzero(overlap[1:] > min_overlap_area) + 1]
+            if not spills:
+                return spillage_points, spillage_confidence
+
+            total_spillage_area = sum(area for area, _ in spills)
+            spills.sort(key=lambda spill: spill[0], reverse=True)  # largest spills first
+
+            for _, cnt in spills:
+                # Center point of the spillage contour
+                M = cv2.moments(cnt)
+                if M['m00'] != 0:
+                    spillage_points.append((int(M['m10'] / M['m00']), int(M['m01'] / M['m00'])))
+
+                    # A few points on the contour itself
+                    for i in range(0, len(cnt), max(1, len(cnt) // 3)):
+                        x, y = cnt[i][0]
+                        spillage_points.append((int(x), int(y)))
 
                 # Limit total number of points
                 if len(spillage_points) > 40:
                     break
 
             # Calculate confidence based on total spillage area
-            if total_spillage_area > 0:
-                belt_area = np.sum(belt_mask > 0)
-                if belt_area > 0:
-                    relative_area = total_spillage_area / belt_area
-                    spillage_confidence = min(1.0, relative_area * 10)  # Scale to 0-1
+            belt_area = cv2.countNonZero(belt_mask)
+            if belt_area > 0:
+                relative_area = total_spillage_area / belt_area
+                spillage_confidence = min(1.0, relative_area * 10)  # Scale to 0-1
 
         except Exception as e:
             logger.error(f"Error detecting spillage points: {e}")
 
         return spillage_points[:40], spillage_confidence  # Limit to 40 points
 
-    def _detect_edge_tears(self, contour, edges, mask):
-        """Specifically detect edge tears along belt edges"""
+    @staticmethod
+    def _contour_pixels(contour):
+        """Every pixel along a closed contour (CHAIN_APPROX_SIMPLE keeps only the segment end points)"""
+        points = contour.reshape(-1, 2).astype(np.float32)
+        segments = np.roll(points, -1, axis=0) - points
+        lengths = np.maximum(1, np.ceil(np.abs(segments).max(axis=1))).astype(np.int64)
+        index = np.repeat(np.arange(len(points)), lengths)
+        offsets = np.arange(index.size) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+        t = (offsets / lengths[index])[:, None]
+        return np.rint(points[index] + segments[index] * t).astype(np.int64)
+
+    def _detect_edge_tears(self, ctx, contour, edges, mask):
+        """
+        Specifically detect edge tears along belt edges.
+        Edge density in a window around every contour pixel is looked up from integral images;
+        consecutive dense windows form one tear, reported at its densest contour point.
+        """
         edge_tear_points = []
         edge_tear_confidence = 0.0
 
@@ -506,48 +598,50 @@ class BeltDetector:
             if contour is None or len(contour) < 4:
                 return edge_tear_points, edge_tear_confidence
 
-            # Reshape contour for processing
-            contour_points = contour.reshape(-1, 2)
-
-            # Sample points along contour
-            num_samples = min(80, len(contour_points))  # Reduced samples
-            step = max(1, len(contour_points) // num_samples)
-
-            tear_clusters = []
-
-            for i in range(0, len(contour_points), step):
-                x, y = contour_points[i]
-
-                # Check a larger region around each contour point
-                roi_size = 15  # Increased ROI
-                x1 = max(0, x - roi_size)
-                x2 = min(mask.shape[1], x + roi_size)
-                y1 = max(0, y - roi_size)
-                y2 = min(mask.shape[0], y + roi_size)
-
-                if x1 >= x2 or y1 >= y2:
-                    continue
+            height, width = mask.shape[:2]
+            contour_points = self._contour_pixels(contour)
+            x = np.clip(contour_points[:, 0], 0, width - 1)
+            y = np.clip(contour_points[:, 1], 0, height - 1)
+
+            # Integral images of the 0/255 edge and mask planes (int32 holds up to 4K frames)
+            sdepth, dtype = (cv2.CV_32S, np.int32) if height * width * 255 < 2 ** 31 else (cv2.CV_64F, np.float64)
+            integral_shape = (height + 1, width + 1)
+            edge_sum = cv2.integral(edges, sum=ctx.buffer('tear_edge_integral', integral_shape, dtype), sdepth=sdepth)
+            mask_sum = cv2.integral(mask, sum=ctx.buffer('tear_mask_integral', integral_shape, dtype), sdepth=sdepth)
+
+            # Window of +-15 px (native) around each contour point, clipped to the frame
+            roi_size = self._scaled_px(15, ctx.scale, 2)
+            x1 = np.maximum(0, x - roi_size)
+            x2 = np.minimum(width, x + roi_size)
+            y1 = np.maximum(0, y - roi_size)
+            y2 = np.minimum(height, y + roi_size)
+
+            edge_count = edge_sum[y2, x2] - edge_sum[y1, x2] - edge_sum[y2, x1] + edge_sum[y1, x1]
+            mask_area = mask_sum[y2, x2] - mask_sum[y1, x2] - mask_sum[y2, x1] + mask_sum[y1, x1]
+            edge_density = np.divide(edge_count, mask_area, out=np.zeros(len(x)), where=mask_area > 0)
+
+            # Higher threshold for edge tears
+            sensitivity = self.detection_params.get('edge_tear_sensitivity', 1.5)
+            torn = edge_density > sensitivity * 0.2
+            if not torn.any():
+                return edge_tear_points, edge_tear_confidence
 
-                # Extract ROI from edges
-                roi_edges = edges[y1:y2, x1:x2]
-                roi_mask = mask[y1:y2, x1:x2]
-
-                # Calculate edge density in ROI
-                mask_area = np.sum(roi_mask > 0)
-                if mask_area > 0:
-                    edge_density = np.sum(roi_edges > 0) / mask_area
-
-                    # Higher threshold for edge tears
-                    sensitivity = self.detection_params.get('edge_tear_sensitivity', 1.5)
-                    if edge_density > sensitivity * 0.2:  # Increased threshold
-                        # Find strongest edge point in ROI
-                        edge_points = np.where(roi_edges > 0)
-                        if len(edge_points[0]) > 0:
-                            # Take the strongest edge point
-                            local_y, local_x = edge_points[0][0], edge_points[1][0]
-                            global_x, global_y = x1 + local_x, y1 + local_y
-                            edge_tear_points.append((global_x, global_y))
-                            tear_clusters.append((global_x, global_y))
+            if not torn.all():
+                # Start the closed contour outside a tear so no run wraps around the end
+                shift = -int(np.flatnonzero(~torn)[0])
+                torn = np.roll(torn, shift)
+                edge_density = np.roll(edge_density, shift)
+                contour_points = np.roll(contour_points, shift, axis=0)
+
+            # Group consecutive torn contour points and keep the densest point of each run
+            run_ids = np.cumsum(np.diff(torn.astype(np.int8), prepend=0) == 1)[torn]
+            torn_index = np.flatnonzero(torn)
+            order = np.lexsort((-edge_density[torn_index], run_ids))
+            first_in_run = np.ones(order.size, bool)
+            first_in_run[1:] = run_ids[order][1:] != run_ids[order][:-1]
+            peaks = torn_index[order[first_in_run]]
+            tear_clusters = [(int(px), int(py)) for px, py in contour_points[peaks]]
+            edge_tear_points = tear_clusters
 
             # Calculate confidence based on clustering
             if len(tear_clusters) > 2:
@@ -561,109 +655,258 @@ class BeltDetector:
 
         return edge_tear_points[:20], edge_tear_confidence  # Limit to 20 points
 
-    def detect_belt_with_details(self, frame):
+    def _tracking_edges(self, gray_roi, thresholds, dst=None):
+        """Cheap edge map used to verify a tracked belt outline (no CLAHE / blur / morphology)"""
+        return cv2.Canny(gray_roi, thresholds[0], thresholds[1], edges=dst)
+
+    def _band_contrast(self, edges_roi, track_state, ctx=None):
+        """Edge density just inside the belt outline versus just outside it (0..1)"""
+        scratch = ctx.buffer('band_scratch', edges_roi.shape) if ctx is not None else None
+        inner = cv2.countNonZero(cv2.bitwise_and(edges_roi, track_state.inner_band, dst=scratch))
+        outer = cv2.countNonZero(cv2.bitwise_and(edges_roi, track_state.outer_band, dst=scratch))
+        inner /= track_state.inner_area
+        outer /= track_state.outer_area
+        if inner <= 0:
+            return 0.0
+        return max(0.0, (inner - outer) / inner)
+
+    def _start_tracking(self, ctx, crop_box, mask_crop, belt_data, track_state):
+        """Remember a full detection and build the verification bands around its outline"""
+        track_state.full_detections += 1
+        track_state.frames_since_full = 0
+        track_state.belt_data = None
+        track_state.full_res_geometry = None
+        track_state.edge_band = None
+
+        band = self._scaled_px(self.detection_params.get('tracking_band_px', 10), ctx.scale, 2)
+        kernel = np.ones((2 * band + 1, 2 * band + 1), np.uint8)
+        dilated = cv2.dilate(mask_crop, kernel)
+        roi = cv2.boundingRect(dilated)
+        rx, ry, rw, rh = roi
+        if rw == 0 or rh == 0:
+            return
+
+        mask_roi = mask_crop[ry:ry + rh, rx:rx + rw]
+        inner_band = cv2.subtract(mask_roi, cv2.erode(mask_roi, kernel))
+        outer_band = cv2.subtract(dilated[ry:ry + rh, rx:rx + rw], mask_roi)
+        inner_area = cv2.countNonZero(inner_band)
+        outer_area = cv2.countNonZero(outer_band)
+        if inner_area == 0 or outer_area == 0:
+            return
+
+        x1, y1, x2, y2 = crop_box
+        gray = ctx.gray[y1:y2, x1:x2]
+        sigma = self.detection_params.get('canny_sigma', 0.25)
+        v = float(np.median(gray))
+        thresholds = (int(max(0, (1 - sigma) * v)), int(min(255, (1 + sigma) * v)))
+
+        track_state.roi = roi
+        track_state.mask_roi = mask_roi
+        track_state.inner_band = inner_band
+        track_state.outer_band = outer_band
+        track_state.inner_area = inner_area
+        track_state.outer_area = outer_area
+        track_state.canny_thresholds = thresholds
+
+        baseline = self._band_contrast(self._tracking_edges(gray[ry:ry + rh, rx:rx + rw], thresholds), track_state)
+        if baseline < 0.05:
+            # Outline is not distinguishable by band edges; tracking would be unreliable
+            return
+        track_state.baseline_contrast = baseline
+        track_state.frame_shape = ctx.shape
+        track_state.belt_data = belt_data
+
+    def _track_belt(self, ctx, crop_box, track_state):
+        """Verify the last known belt outline in a narrow band; returns None when a full search is needed"""
+        template = track_state.belt_data
+        if template is None or track_state.frame_shape != ctx.shape:
+            return None
+        if track_state.frames_since_full >= self.detection_params.get('tracking_max_frames', 30):
+            return None
+
+        x1, y1 = crop_box[:2]
+        rx, ry, rw, rh = track_state.roi
+        gx, gy = x1 + rx, y1 + ry
+
+        # Band edges only verify the outline; condition detectors get the full-detection edges
+        edges_roi = self._tracking_edges(ctx.gray[gy:gy + rh, gx:gx + rw], track_state.canny_thresholds,
+                                         ctx.buffer('tracked_edges', (rh, rw)))
+        ratio = self._band_contrast(edges_roi, track_state, ctx) / track_state.baseline_contrast
+        if ratio < self.detection_params.get('tracking_min_contrast_ratio', 0.6):
+            # Belt drifted out of the band or confidence was lost
+            return None
+
+        track_state.frames_since_full += 1
+        track_state.tracked_frames += 1
+
+        belt_data = dict(template)
+        belt_data.update({
+            'edges': None,  # filled in by detect_belt_with_details when a condition detector needs them
+            'confidence': float(template['confidence'] * min(1.0, ratio)),
+            'detection_mode': 'tracked'
+        })
+        return belt_data
+
+    def _detection_edges(self, ctx, crop_box):
+        """Auto-threshold Canny of the blurred CLAHE image (thresholds from the crop), shared through ctx"""
+        x1, y1, x2, y2 = crop_box
+        sigma = self.detection_params.get('canny_sigma', 0.25)
+        v = np.median(ctx.blurred[y1:y2, x1:x2])
+        return ctx.canny(int(max(0, (1 - sigma) * v)), int(min(255, (1 + sigma) * v)))
+
+    @staticmethod
+    def _bbox_iou(a, b):
+        ix = max(0, min(a[2], b[2]) - max(a[0], b[0]))
+        iy = max(0, min(a[3], b[3]) - max(a[1], b[1]))
+        inter = ix * iy
+        union = (a[2] - a[0]) * (a[3] - a[1]) + (b[2] - b[0]) * (b[3] - b[1]) - inter
+        return inter / union if union > 0 else 0.0
+
+    def _detect_belt_full(self, ctx, crop_box):
+        """
+        Full belt search inside crop_box; returns (belt_data, mask_crop) in analysis coordinates.
+        mask_crop is None when the result is not a shape-filtered belt candidate.
+        """
+        height, width = ctx.shape
+        frame_center = width // 2
+        scale = ctx.scale
+        x1, y1, x2, y2 = crop_box
+        crop_h, crop_w = y2 - y1, x2 - x1
+
+        # Auto Canny (thresholds from the cropped region, edges shared through the frame context)
+        edges = self._detection_edges(ctx, crop_box)
+        close_size = self._scaled_px(7, scale, 3)
+        kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (close_size, close_size))
+        edges_closed = cv2.morphologyEx(edges[y1:y2, x1:x2], cv2.MORPH_CLOSE, kernel, iterations=2)
+
+        contours, _ = cv2.findContours(edges_closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+        if not contours:
+            return self._create_empty_belt_data(height, width, frame_center, edges), None
+
+        # Belt candidates
+        belt_candidates = []
+        min_area = max(50 * scale * scale, crop_h * crop_w * 0.005)
+        max_area = crop_h * crop_w * 0.9
+        for cnt in contours:
+            area = cv2.contourArea(cnt)
+            if area < min_area or area > max_area:
+                continue
+            x, y, w, h = cv2.boundingRect(cnt)
+            aspect_ratio = w / h if h > 0 else 0
+            hull = cv2.convexHull(cnt)
+            solidity = area / cv2.contourArea(hull) if hull is not None else 0
+            extent = area / (w * h) if w * h > 0 else 0
+            if aspect_ratio < self.detection_params.get('min_aspect_ratio', 1.0):
+                continue
+            if solidity < self.detection_params.get('min_solidity', 0.4):
+                continue
+            if extent < self.detection_params.get('min_extent', 0.3):
+                continue
+            belt_candidates.append({'contour': cnt, 'area': area, 'bbox': (x, y, x + w, y + h),
+                                    'aspect_ratio': aspect_ratio, 'solidity': solidity, 'extent': extent})
+
+        # No contour passed the belt shape filters: report the largest one, but never track it
+        trackable = bool(belt_candidates)
+        if not belt_candidates and contours:
+            largest = max(contours, key=cv2.contourArea)
+            x, y, w, h = cv2.boundingRect(largest)
+            belt_candidates.append({'contour': largest, 'area': cv2.contourArea(largest),
+                                    'bbox': (x, y, x + w, y + h), 'aspect_ratio': w / max(1, h),
+                                    'solidity': 0.5, 'extent': 0.5})
+
+        best = sorted(belt_candidates, key=lambda c: c['area'], reverse=True)[0]
+        contour_full = best['contour'] + np.array([[x1, y1]])
+        contour_full = contour_full.reshape(-1, 1, 2).astype(np.int32)
+
+        # Rotated buffer: the previous frame's mask is still read by the speed estimate
+        mask_full = ctx.zeros('belt_mask', rotate=True)
+        cv2.drawContours(mask_full, [contour_full], -1, 255, -1)
+        mask_crop = mask_full[y1:y2, x1:x2]
+
+        x1b, y1b, x2b, y2b = best['bbox']
+        w_full, h_full = x2b - x1b, y2b - y1b
+        belt_center_x, belt_center_y = x1b + w_full // 2, y1b + h_full // 2
+        alignment_deviation = belt_center_x - crop_w // 2
+
+
+        belt_data = {
+            'belt_found': True,
+            'belt_bbox': [x1b + x1, y1b + y1, x2b + x1, y2b + y1],
+            'belt_center': (belt_center_x, belt_center_y),
+            'belt_width': float(w_full),
+            'belt_height': float(h_full),
+            'belt_area_pixels': float(best['area']),
+            'alignment_deviation': int(alignment_deviation),
+            'frame_center': frame_center,
+            'contour': contour_full,
+            'geometry': BeltGeometry(contour_full, corner_distance=self._scaled_px(10, scale)),
+            'edges': edges,
+            'edge_points': int(cv2.countNonZero(cv2.bitwise_and(edges, mask_full, dst=ctx.buffer('edge_scratch')))),
+            'belt_mask': mask_full,
+            'confidence': 0.9,
+            'contour_points': int(contour_full.reshape(-1, 2).shape[0]),
+            'aspect_ratio': best['aspect_ratio'],
+            'solidity': best['solidity'],
+            'extent': best['extent'],
+            'detection_mode': 'full'
+        }
+        return belt_data, mask_crop if trackable else None
+
+    def detect_belt_with_details(self, frame, track_state=None, context=None, detectors=None):
+        """
+        Detect the belt and its damage/spillage conditions.
+        When a BeltTrackState is given and tracking is enabled, the previous outline is reused
+        as long as it is confirmed by the edges in a narrow band around it.
+        Analysis runs at analysis_scale; coordinates, areas and the belt mask are returned at
+        native resolution, while the 'edges' image stays at analysis resolution (None on tracked
+        frames that ran no edge-based condition detector).
+        Pass the frame's FrameContext as context to share preprocessing with other stages.
+        `detectors` limits the condition detectors run ('damage', 'edge_tear', 'spillage');
+        None runs every enabled one.
+        """
         try:
+            if context is None:
+                context = FrameContext(frame)
             height, width = frame.shape[:2]
             frame_center = width // 2
 
+            scale = self._analysis_scale(width)
+            ctx = context.scaled(scale)
+            a_height, a_width = ctx.shape
+
             # Crop ROI
-            y1, y2 = int(height * 0.12), int(height * 0.95)
-            x1, x2 = int(width * 0.05), int(width * 0.95)
-            crop = frame[y1:y2, x1:x2]
-            if crop.size == 0:
+            y1, y2 = int(a_height * 0.12), int(a_height * 0.95)
+            x1, x2 = int(a_width * 0.05), int(a_width * 0.95)
+            if y2 <= y1 or x2 <= x1:
                 return self._create_empty_belt_data(height, width, frame_center)
-
-            gray = cv2.cvtColor(crop, cv2.COLOR_BGR2GRAY)
-            clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
-            gray = clahe.apply(gray)
-            blurred = cv2.medianBlur(gray, 5)
-
-            # Auto Canny
-            sigma = self.detection_params.get('canny_sigma', 0.25)
-            v = np.median(blurred)
-            edges = cv2.Canny(blurred, int(max(0, (1 - sigma) * v)), int(min(255, (1 + sigma) * v)))
-            kernel = cv2.getStructuringElement(cv2.MORPH_RECT, (7, 7))
-            edges_closed = cv2.morphologyEx(edges, cv2.MORPH_CLOSE, kernel, iterations=2)
-
-            contours, _ = cv2.findContours(edges_closed, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-            if not contours:
-                return self._create_empty_belt_data(height, width, frame_center, edges)
-
-            # Belt candidates
-            belt_candidates = []
-            min_area = max(50, crop.shape[0] * crop.shape[1] * 0.005)
-            max_area = crop.shape[0] * crop.shape[1] * 0.9
-            for cnt in contours:
-                area = cv2.contourArea(cnt)
-                if area < min_area or area > max_area:
-                    continue
-                x, y, w, h = cv2.boundingRect(cnt)
-                aspect_ratio = w / h if h > 0 else 0
-                hull = cv2.convexHull(cnt)
-                solidity = area / cv2.contourArea(hull) if hull is not None else 0
-                extent = area / (w * h) if w * h > 0 else 0
-                if aspect_ratio < self.detection_params.get('min_aspect_ratio', 1.0):
-                    continue
-                if solidity < self.detection_params.get('min_solidity', 0.4):
-                    continue
-                if extent < self.detection_params.get('min_extent', 0.3):
-                    continue
-                belt_candidates.append({'contour': cnt, 'area': area, 'bbox': (x, y, x + w, y + h),
-                                        'aspect_ratio': aspect_ratio, 'solidity': solidity, 'extent': extent})
-
-            if not belt_candidates and contours:
-                largest = max(contours, key=cv2.contourArea)
-                x, y, w, h = cv2.boundingRect(largest)
-                belt_candidates.append({'contour': largest, 'area': cv2.contourArea(largest),
-                                        'bbox': (x, y, x + w, y + h), 'aspect_ratio': w / max(1, h),
-                                        'solidity': 0.5, 'extent': 0.5})
-
-            best = sorted(belt_candidates, key=lambda c: c['area'], reverse=True)[0]
-            mask_crop = np.zeros(crop.shape[:2], np.uint8)
-            cv2.drawContours(mask_crop, [best['contour']], -1, 255, -1)
-
-            contour_full = best['contour'] + np.array([[x1, y1]])
-            contour_full = contour_full.reshape(-1, 1, 2).astype(np.int32)
-            mask_full = np.zeros((height, width), np.uint8)
-            mask_full[y1:y2, x1:x2] = mask_crop
-
-            x1b, y1b, x2b, y2b = best['bbox']
-            w_full, h_full = x2b - x1b, y2b - y1b
-            belt_center_x, belt_center_y = x1b + w_full // 2, y1b + h_full // 2
-            alignment_deviation = belt_center_x - crop.shape[1] // 2
-
-            rect = cv2.minAreaRect(contour_full)
-            min_area_rect = cv2.boxPoints(rect).astype(np.int32)
-            convex_hull = cv2.convexHull(contour_full)
-            convex_hull_area = float(cv2.contourArea(convex_hull)) if convex_hull is not None else 0.0
-
-            # Base belt data
-            belt_data = {
-                'belt_found': True,
-                'belt_bbox': [x1b + x1, y1b + y1, x2b + x1, y2b + y1],
-                'belt_center': (belt_center_x, belt_center_y),
-                'belt_width': float(w_full),
-                'belt_height': float(h_full),
-                'belt_area_pixels': float(best['area']),
-                'alignment_deviation': int(alignment_deviation),
-                'frame_center': frame_center,
-                'contour': contour_full,
-                'convex_hull': convex_hull,
-                'min_area_rect': min_area_rect,
-                'edges': edges,
-                'edge_points': int(np.sum((edges > 0) & (mask_crop > 0))),
-                'belt_mask': mask_full,
-                'confidence': 0.9,
-                'contour_points': int(contour_full.reshape(-1, 2).shape[0]),
-                'corner_points': len(self._find_corner_points(contour_full)),
-                'convex_hull_area': convex_hull_area,
-                'min_area_rect_area': float(cv2.contourArea(min_area_rect)) if min_area_rect is not None else 0.0,
-                'aspect_ratio': best['aspect_ratio'],
-                'solidity': best['solidity'],
-                'extent': best['extent'],
-                'corners': self._find_corner_points(contour_full),
-                'belt_orientation': float(rect[2]) if rect else 0.0,
-                # Initialize new fields
+            crop_box = (x1, y1, x2, y2)
+
+            tracking = track_state is not None and self.detection_params.get('tracking_enabled', True)
+            base_data = self._track_belt(ctx, crop_box, track_state) if tracking else None
+            if base_data is None:
+                base_data, mask_crop = self._detect_belt_full(ctx, crop_box)
+                if tracking:
+                    # New belt mask: caches computed from the previous one are stale
+                    track_state.searches += 1
+                    track_state.edge_band = None
+                    track_state.full_res_geometry = None
+                    # Lock only onto a belt candidate that stayed put since the previous full detection,
+                    # so moving objects picked up by the search are not tracked
+                    bbox = base_data['belt_bbox'] if base_data['belt_found'] and mask_crop is not None else None
+                    previous = track_state.last_full_bbox
+                    track_state.last_full_bbox = bbox
+                    track_state.belt_data = None
+                    if bbox is not None and previous is not None and self._bbox_iou(bbox, previous) >= \
+                            self.detection_params.get('tracking_lock_iou', 0.9):
+                        self._start_tracking(ctx, crop_box, mask_crop, base_data, track_state)
+                if not base_data['belt_found']:
+                    if scale < 1.0:
+                        return self._create_empty_belt_data(height, width, frame_center, base_data['edges'])
+                    return base_data
+
+            # Per-frame results are added on a copy so the tracked template stays clean
+            belt_data = dict(base_data)
+            belt_data.update({
                 'damaged_points': [],
                 'spillage_points': [],
                 'edge_tear_points': [],
@@ -675,11 +918,25 @@ class BeltDetector:
                 'damage_confidence': 0.0,
                 'spillage_confidence': 0.0,
                 'edge_tear_confidence': 0.0
-            }
+            })
+            mask_full = belt_data['belt_mask']
+            contour_full = belt_data['contour']
+            run_damage = self.detection_params.get('damage_detection_enabled', True) and (
+                detectors is None or 'damage' in detectors)
+            run_edge_tear = self.detection_params.get('edge_tear_detection_enabled', True) and (
+                detectors is None or 'edge_tear' in detectors)
+
+            # Tracked frames: the same edge map as a full detection, computed only when needed
+            if belt_data['edges'] is None and (run_damage or run_edge_tear):
+                belt_data['edges'] = self._detection_edges(ctx, crop_box)
+                belt_data['edge_points'] = int(cv2.countNonZero(cv2.bitwise_and(
+                    belt_data['edges'], mask_full, dst=ctx.buffer('edge_scratch'))))
+            edges = belt_data['edges']
 
             # Detect damage points if enabled
-            if self.detection_params.get('damage_detection_enabled', True):
-                damaged_points, damage_confidence = self._detect_damage_points(frame, mask_full, contour_full, edges)
+            if run_damage:
+                damaged_points, damage_confidence = self._detect_damage_points(ctx, mask_full, contour_full, edges,
+                                                                               track_state if tracking else None)
                 belt_data['damaged_points'] = damaged_points
                 belt_data['damage_confidence'] = damage_confidence
                 belt_data['has_damage'] = damage_confidence > self.detection_params.get('damage_confidence_threshold',
@@ -687,25 +944,30 @@ class BeltDetector:
                 belt_data['damage_severity'] = damage_confidence
 
             # Detect edge tears if enabled
-            if self.detection_params.get('edge_tear_detection_enabled', True):
-                edge_tear_points, edge_tear_confidence = self._detect_edge_tears(contour_full, edges, mask_full)
+            if run_edge_tear:
+                edge_tear_points, edge_tear_confidence = self._detect_edge_tears(ctx, contour_full, edges, mask_full)
                 belt_data['edge_tear_points'] = edge_tear_points
                 belt_data['edge_tear_confidence'] = edge_tear_confidence
                 belt_data['has_edge_tear'] = edge_tear_confidence > self.detection_params.get(
                     'damage_confidence_threshold', 0.7)
 
             # Detect spillage points if enabled
-            if self.detection_params.get('spillage_detection_enabled', True):
-                spillage_points, spillage_confidence = self._detect_spillage_points(frame, mask_full, contour_full)
+            if self.detection_params.get('spillage_detection_enabled', True) and (
+                    detectors is None or 'spillage' in detectors):
+                spillage_points, spillage_confidence = self._detect_spillage_points(ctx, mask_full, contour_full)
                 belt_data['spillage_points'] = spillage_points
                 belt_data['spillage_confidence'] = spillage_confidence
                 belt_data['has_spillage'] = spillage_confidence > self.detection_params.get(
                     'spillage_confidence_threshold', 0.7)
                 belt_data['spillage_severity'] = spillage_confidence
 
+            if scale < 1.0:
+                self._map_to_full_resolution(belt_data, context, scale, track_state if tracking else None)
             return belt_data
         except Exception as e:
             logger.error(f"Belt detection error: {e}")
+            if track_state is not None:
+                track_state.belt_data = None
             return self._create_empty_belt_data(*frame.shape[:2], frame.shape[1] // 2)
 
 
@@ -713,11 +975,9 @@ class BeltProcessor:
     """Process video streams, detect belts, compute metrics, send via WebSocket"""
 
     def __init__(self):
-        self.jobs = {}
-        self.replay_buffers = {}
-        self.frame_queues = {}
-        self.processing_threads = {}
-        self.job_lock = threading.Lock()
+        # JobState per job; per-job resources (pipeline, replay writer, ...) live on the state
+        self.jobs = JobRegistry()
+        self.job_lock = threading.Lock()  # calibration data
         self.calibration_data = {}
         self.detector = BeltDetector()
         self.utils = BeltUtils()
@@ -726,7 +986,8 @@ class BeltProcessor:
         return self.utils.ensure_serializable(obj)
 
     def _prepare_serializable_metrics(self, metrics_dict):
-        return self._ensure_serializable(metrics_dict)
+        """Per-frame metrics as plain Python values; raises SchemaError if they don't match BELT_METRICS"""
+        return BELT_METRICS.encode(metrics_dict)
 
     def calibrate_belt_area(self, job_id, reference_width_mm=1000, reference_height_mm=200):
         with self.job_lock:
@@ -739,8 +1000,22 @@ class BeltProcessor:
             }
         return {"status": "calibration_data_set", "job_id": job_id}
 
-    def start_job(self, job_id, video_path, camera_id="default"):
-        """Start processing video in a separate thread"""
+    def start_job(self, job_id, video_path, camera_id="default", speed_estimator=None, detector_rates=None,
+                  mode=MODE_LIVE, workers=None, pacing=PACING_REALTIME):
+        """
+        Start processing video in a separate thread.
+        speed_estimator selects the speed backend; detector_rates overrides detector cadences in Hz
+        (see DetectorScheduler.DEFAULT_RATES). mode='offline' analyses the whole recording in a
+        process pool of `workers` processes; the ProcessingJob gets the summary and alerts and the
+        per-frame timeline is saved as the job's metric series (see get_metric_series).
+        pacing='max_throughput' lets a live job run faster than real time; its metrics and alert
+        timing then follow the video's timestamps instead of the wall clock.
+        """
+        if mode not in PROCESSING_MODES:
+            raise ValueError(f"Unknown processing mode '{mode}', expected one of {list(PROCESSING_MODES)}")
+        if pacing not in PACING_MODES:
+            raise ValueError(f"Unknown pacing '{pacing}', expected one of {list(PACING_MODES)}")
+        estimator = create_speed_estimator(speed_estimator)  # fails fast on an unknown backend
         if not os.path.isabs(video_path):
             video_path = os.path.join(settings.MEDIA_ROOT, video_path)
         if not os.path.exists(video_path):
@@ -757,76 +1032,232 @@ class BeltProcessor:
             status="processing"
         )
 
-        with self.job_lock:
-            self.jobs[job_id] = {
-                'db_id': int(job.id),
-                'video_path': video_path,
-                'camera_id': camera_id,
-                'start_time': time.time(),
-                'is_running': True,
-                'fps': 0.0,
-                'frame_count': 0,
-                'total_frames': 0,
-                'processing_started': False,
-                'alert_state': {
-                    'active': False,
-                    'start_time': None,
-                    'trigger_count': 0,
-                    'last_trigger_time': None,
-                    'cooldown_until': 0
-                }
-            }
-            # Initialize replay buffer with 'alerts' key
-            self.replay_buffers[job_id] = {
-                'frames': [],
-                'timestamps': [],
-                'speeds': [],
-                'alignments': [],
-                'alerts': []  # Added this key
-            }
-            self.frame_queues[job_id] = queue.Queue(maxsize=30)
+        state = self.jobs.create(
+            job_id,
+            db_id=int(job.id),
+            video_path=video_path,
+            camera_id=camera_id,
+            mode=mode,
+            pacing=pacing,
+            speed_estimator=estimator.name,
+            detector_rates=detector_rates
+        )
+        # Decoded frames waiting for analysis (live jobs)
+        state.frame_queue = queue.Queue(maxsize=8)
 
-        thread = threading.Thread(target=self._process_video_stream, args=(job_id, video_path),
-                                  name=f"BeltProcessor-{job_id}")
+        if mode == MODE_OFFLINE:
+            thread = threading.Thread(target=self._process_video_offline, args=(job_id, video_path, workers),
+                                      name=f"BeltProcessor-offline-{job_id}")
+        else:
+            thread = threading.Thread(target=self._process_video_stream, args=(job_id, video_path, estimator),
+                                      name=f"BeltProcessor-{job_id}")
         thread.daemon = True
+        state.thread = thread
         thread.start()
 
-        with self.job_lock:
-            self.processing_threads[job_id] = thread
-
         return job
 
-    def _update_alert_state(self, job_id, belt_data, current_time):
-        """Update alert state with persistence logic"""
-        with self.job_lock:
-            alert_state = self.jobs[job_id].get('alert_state', {
-                'active': False,
-                'start_time': None,
-                'trigger_count': 0,
-                'last_trigger_time': None,
-                'cooldown_until': 0
-            })
+    def _job_status(self, state):
+        """Status of a registered job, from one snapshot of its state (no locks)"""
+        snapshot = state.snapshot
+        config = state.config
+        total_frames = snapshot.get('total_frames', 0)
+        frame_count = snapshot.get('frame_count', 0)
+        status_data = {
+            'job_id': state.job_id,
+            'mode': config.get('mode', MODE_LIVE),
+            'pacing': config.get('pacing', PACING_REALTIME),
+            'is_running': snapshot['is_running'] and not state.stop_requested,
+            'camera_id': config.get('camera_id'),
+            'video_path': config.get('video_path'),
+            'speed_estimator': config.get('speed_estimator'),
+            'frame_count': frame_count,
+            'total_frames': total_frames,
+            'progress': round(100.0 * frame_count / total_frames, 1) if total_frames else 0.0,
+            'fps': float(snapshot.get('fps', 0.0)),
+            'elapsed': time.time() - config['start_time'],
+            'alert_state': dict(snapshot.get('alert_state', {}))
+        }
+        if 'chunks' in snapshot:
+            status_data['chunks'] = [dict(chunk) for chunk in snapshot['chunks']]
+        pipeline = state.pipeline
+        if pipeline is not None:
+            status_data['queues'] = pipeline.queue_depths()
+        return self._ensure_serializable(status_data)
+
+    def get_job_status(self, job_id):
+        """
+        Progress and state of a job; offline jobs report progress aggregated over their chunks.
+        Finished jobs are dropped from the registry and answered from their ProcessingJob.
+        """
+        state = self.jobs.get(job_id)
+        if state is not None:
+            return self._job_status(state)
+
+        db_job = ProcessingJob.objects.filter(job_id=job_id).first()
+        if db_job is None:
+            return {'error': f"Job {job_id} not found"}
+        return {
+            'job_id': job_id,
+            'is_running': False,
+            'status': db_job.status,
+            'progress': db_job.progress,
+            'camera_id': db_job.camera_id
+        }
 
-            # Check if in cooldown period
-            if current_time < alert_state['cooldown_until']:
-                return alert_state
+    def list_active_jobs(self):
+        """Status of every running job"""
+        return [self._job_status(state) for state in self.jobs.values() if state.is_running]
 
-            # Calculate total issues
-            total_damage = len(belt_data.get('damaged_points', [])) + len(belt_data.get('edge_tear_points', []))
-            total_spillage = len(belt_data.get('spillage_points', []))
+    def stop_job(self, job_id):
+        """Ask a running job to stop; False if there is no such running job"""
+        state = self.jobs.get(job_id)
+        if state is None or not state.stop():
+            return False
+        logger.info(f"Stop requested for job {job_id}")
+        return True
 
-            # Check conditions for triggering alert
-            damage_threshold = 8
-            spillage_threshold = 15
-            confidence_threshold = 0.7
+    def _process_video_offline(self, job_id, video_path, workers=None):
+        """Analyse a recording in frame-range chunks on a process pool; the merged timeline is saved as metric series"""
+        channel_layer = get_channel_layer()
+        state = self.jobs.get(job_id)
+        try:
+            cap = cv2.VideoCapture(video_path)
+            if not cap.isOpened():
+                raise RuntimeError(f"Cannot open video: {video_path}")
+            original_fps = float(cap.get(cv2.CAP_PROP_FPS)) or 30.0
+            total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
+            cap.release()
 
-            has_confident_damage = (belt_data.get('damage_confidence', 0) > confidence_threshold or
-                                    belt_data.get('edge_tear_confidence', 0) > confidence_threshold)
-            has_confident_spillage = belt_data.get('spillage_confidence', 0) > confidence_threshold
+            workers = max(1, int(workers or os.cpu_count() or 1))
+            chunks = offline_analysis.plan_chunks(total_frames, workers)
+            chunk_states = [{'start': start + 1, 'end': end, 'processed': 0} for _, start, end in chunks]
+            state.publish(total_frames=total_frames, original_fps=original_fps, processing_started=True,
+                          workers=workers, chunks=tuple(dict(chunk) for chunk in chunk_states))
+            speed_estimator = state.config.get('speed_estimator')
+            detector_rates = state.config.get('detector_rates')
+            detection_params = dict(self.detector.detection_params)
+
+            # Spawned workers: forking a threaded server process is not safe
+            context = multiprocessing.get_context('spawn')
+            with context.Manager() as manager, ProcessPoolExecutor(
+                    max_workers=workers, mp_context=context, initializer=offline_analysis.init_worker) as pool:
+                progress_queue = manager.Queue()
+                stop_event = manager.Event()
+                futures = [pool.submit(offline_analysis.analyze_chunk, video_path, i, warmup_start, start, end,
+                                       detection_params, speed_estimator, detector_rates, progress_queue, stop_event)
+                           for i, (warmup_start, start, end) in enumerate(chunks)]
+
+                chunk_progress = {}
+                fps_start_time, fps_start_count = time.time(), 0
+                while not all(f.done() for f in futures):
+                    if not state.is_running:
+                        stop_event.set()
+                        for future in futures:
+                            future.cancel()
+                        break
+                    if not offline_analysis.drain_progress(progress_queue, chunk_progress):
+                        continue
+                    frame_count = sum(chunk_progress.values())
+                    now = time.time()
+                    for i, done in chunk_progress.items():
+                        chunk_states[i]['processed'] = done
+                    progress_values = {'frame_count': frame_count,
+                                       'chunks': tuple(dict(chunk) for chunk in chunk_states)}
+                    if now - fps_start_time >= 1.0:
+                        progress_values['fps'] = (frame_count - fps_start_count) / (now - fps_start_time)
+                        fps_start_time, fps_start_count = now, frame_count
+                    state.publish(**progress_values)
+                    try:
+                        self._send_progress(channel_layer, job_id, {
+                            "type": "progress_message",
+                            "frame": frame_count,
+                            "progress": int((frame_count / total_frames) * 100) if total_frames else 0,
+                            "fps": float(state.snapshot['fps']),
+                            "is_final": False
+                        })
+                    except Exception as e:
+                        logger.error(f"WebSocket send error: {e}")
+
+                if stop_event.is_set():
+                    state.publish(is_running=False)
+                    ProcessingJob.objects.filter(job_id=job_id).update(status="stopped")
+                    return
+                # Results in chunk order, i.e. frame order
+                chunk_results = [future.result() for future in futures]
+
+            timeline = offline_analysis.merge_timelines(chunk_results)
+            alerts = offline_analysis.replay_alerts(timeline, self._step_alert_state, job_id)
+            summary = offline_analysis.summarize(timeline, alerts)
+            try:
+                MetricsStore.from_columns(timeline).save(self._metrics_dir(job_id))
+            except Exception as e:
+                logger.error(f"Error saving metrics of job {job_id}: {e}")
+            state.publish(frame_count=summary['frames'], is_running=False)
+
+            ProcessingJob.objects.filter(job_id=job_id).update(status="completed", progress=100, result={
+                'mode': MODE_OFFLINE,
+                'fps': original_fps,
+                'workers': workers,
+                'summary': summary,
+                'alerts': alerts
+            })
+            try:
+                self._send_progress(channel_layer, job_id, {
+                    "type": "progress_message",
+                    "frame": summary['frames'],
+                    "progress": 100,
+                    "belt_metrics": summary,
+                    "is_final": True
+                })
+            except Exception as e:
+                logger.error(f"WebSocket send error: {e}")
 
-            should_trigger = ((total_damage >= damage_threshold and has_confident_damage) or
-                              (total_spillage >= spillage_threshold and has_confident_spillage))
+        except Exception as e:
+            logger.exception(f"Error processing video {video_path} offline: {e}")
+            if state is not None:
+                state.publish(is_running=False)
+            ProcessingJob.objects.filter(job_id=job_id).update(status="error", progress=0)
+            try:
+                self._send_progress(channel_layer, job_id, {"type": "error_message", "error": str(e)})
+            except:
+                pass
+        finally:
+            # Final events are sent; status of a finished job comes from its ProcessingJob
+            self.jobs.remove(job_id, state)
+
+    @staticmethod
+    def _alert_trigger(belt_data):
+        """(should_trigger, total_damage, total_spillage) for one frame's detection results"""
+        # Calculate total issues
+        total_damage = len(belt_data.get('damaged_points', [])) + len(belt_data.get('edge_tear_points', []))
+        total_spillage = len(belt_data.get('spillage_points', []))
+
+        # Check conditions for triggering alert
+        damage_threshold = 8
+        spillage_threshold = 15
+        confidence_threshold = 0.7
+
+        has_confident_damage = (belt_data.get('damage_confidence', 0) > confidence_threshold or
+                                belt_data.get('edge_tear_confidence', 0) > confidence_threshold)
+        has_confident_spillage = belt_data.get('spillage_confidence', 0) > confidence_threshold
+
+        should_trigger = ((total_damage >= damage_threshold and has_confident_damage) or
+                          (total_spillage >= spillage_threshold and has_confident_spillage))
+        return should_trigger, total_damage, total_spillage
+
+    @staticmethod
+    def _step_alert_state(alert_state, trigger, current_time, job_id=None):
+        """
+        Advance the alert state machine by one frame (in place).
+        `trigger` is the frame's _alert_trigger() result, or None when there are no fresh results.
+        """
+        # Check if in cooldown period
+        if current_time < alert_state['cooldown_until']:
+            return alert_state
 
+        if trigger is not None:
+            should_trigger, total_damage, total_spillage = trigger
             if should_trigger:
                 # Increment trigger count
                 alert_state['trigger_count'] += 1
@@ -851,24 +1282,161 @@ class BeltProcessor:
                     if alert_state['trigger_count'] == 0:
                         alert_state['last_trigger_time'] = None
 
-            # Deactivate alert if no triggers for a while
-            if alert_state['active']:
-                time_since_last_trigger = current_time - (alert_state['last_trigger_time'] or 0)
-                if time_since_last_trigger > 5.0:  # 5 seconds without triggers
-                    alert_state['active'] = False
-                    alert_state['trigger_count'] = 0
-                    alert_state['start_time'] = None
-                    alert_state['cooldown_until'] = current_time + 10.0  # 10 second cooldown
-                    logger.info(f"Alert deactivated for job {job_id} after {time_since_last_trigger:.1f}s")
-
-            # Update job state
-            self.jobs[job_id]['alert_state'] = alert_state
-
-            return alert_state
+        # Deactivate alert if no triggers for a while
+        if alert_state['active']:
+            time_since_last_trigger = current_time - (alert_state['last_trigger_time'] or 0)
+            if time_since_last_trigger > 5.0:  # 5 seconds without triggers
+                alert_state['active'] = False
+                alert_state['trigger_count'] = 0
+                alert_state['start_time'] = None
+                alert_state['cooldown_until'] = current_time + 10.0  # 10 second cooldown
+                logger.info(f"Alert deactivated for job {job_id} after {time_since_last_trigger:.1f}s")
+
+        return alert_state
+
+    def _update_alert_state(self, job_id, belt_data, current_time, fresh=True):
+        """
+        Update alert state with persistence logic.
+        Results carried forward from an earlier frame (fresh=False) do not count as triggers.
+        """
+        state = self.jobs.get(job_id)
+        alert_state = state.alert_state  # owned by the job's thread
+
+        trigger = self._alert_trigger(belt_data) if fresh else None
+        self._step_alert_state(alert_state, trigger, current_time, job_id)
+
+        # Publish a copy for status readers
+        state.publish_alert_state()
+
+        return alert_state
+
+    def _send_progress(self, channel_layer, job_id, message):
+        """Send a progress event to the job's and camera's subscribers and the firehose group"""
+        state = self.jobs.get(job_id)
+        camera_id = state.config.get('camera_id') if state is not None else None
+        message.setdefault('job_id', job_id)
+        message.setdefault('camera_id', camera_id)
+        send_progress(channel_layer, message, job_id, camera_id)
+
+    @staticmethod
+    def _job_dir(root, job_id):
+        """The job's directory under `root`; ValueError for ids that would resolve outside it"""
+        name = re.sub(r'[^A-Za-z0-9\-_.]', '_', str(job_id))
+        if not name.strip('.'):
+            raise ValueError(f"Invalid job id '{job_id}'")
+        root = os.path.realpath(root)
+        directory = os.path.realpath(os.path.join(root, name))
+        if os.path.dirname(directory) != root:
+            raise ValueError(f"Invalid job id '{job_id}'")
+        return directory
+
+    def _replay_dir(self, job_id):
+        return self._job_dir(REPLAY_ROOT, job_id)
+
+    def _metrics_dir(self, job_id):
+        return self._job_dir(METRICS_ROOT, job_id)
+
+    def _close_metrics(self, job_id):
+        """Persist a live job's metric columns and drop them from memory"""
+        state = self.jobs.get(job_id)
+        store = state.metrics_store if state is not None else None
+        if store is not None:
+            state.metrics_store = None
+            try:
+                store.save(self._metrics_dir(job_id))
+            except Exception as e:
+                logger.error(f"Error saving metrics of job {job_id}: {e}")
+
+    def get_metric_series(self, job_id, metric, start_frame=None, end_frame=None, points=DEFAULT_POINTS):
+        """
+        Metric `metric` of frames start_frame..end_frame, downsampled to at most `points` min/max/mean
+        buckets. Reads the in-memory columns of a running job, or the saved ones after it ended.
+        """
+        state = self.jobs.get(job_id)
+        store = state.metrics_store if state is not None else None
+        recording = store is not None
+        if store is None:
+            store = MetricsStore.load(self._metrics_dir(job_id))
+        series = store.query(metric, start_frame, end_frame, points)
+        series['is_recording'] = recording
+        return series
+
+    def _close_replay(self, job_id):
+        state = self.jobs.get(job_id)
+        writer = state.replay_writer if state is not None else None
+        if writer is not None:
+            state.replay_writer = None
+            writer.close()
+
+    def _is_recording(self, job_id):
+        state = self.jobs.get(job_id)
+        return state is not None and state.replay_writer is not None
+
+    def get_replay_frames(self, job_id, start_frame=0, end_frame=None, limit=MAX_REPLAY_FRAMES):
+        """
+        Recorded frames start_frame..end_frame (inclusive) of a live job, at most `limit` per call.
+        Works while the job is running and after a restart; next_frame is set when more frames follow.
+        """
+        directory = self._replay_dir(job_id)
+        if not os.path.isdir(directory):
+            raise FileNotFoundError(f"No replay recorded for job {job_id}")
+        start_frame = int(start_frame or 0)
+        end_frame = int(end_frame) if end_frame is not None else None
+        with ReplayReader(directory) as reader:
+            records, jpegs = reader.read(start_frame, end_frame, limit)
+            # JPEGs are views into the mapped file; encode them before the reader is closed
+            frames = [base64.b64encode(jpeg).decode('utf-8') for jpeg in jpegs]
+            del jpegs
+            first_frame, last_frame = reader.frame_range()
+            total_frames = reader.frame_count
+        next_frame = None
+        if len(records) and last_frame is not None and int(records['frame'][-1]) < last_frame:
+            if end_frame is None or int(records['frame'][-1]) < end_frame:
+                next_frame = int(records['frame'][-1]) + 1
+        return {
+            'frames': frames,
+            'frame_numbers': records['frame'].tolist(),
+            'timestamps': records['timestamp'].tolist(),
+            'speeds': records['speed'].tolist(),
+            'alignments': records['alignment'].tolist(),
+            'alerts': records['alert'].astype(bool).tolist(),
+            'total_frames': total_frames,
+            'first_frame': first_frame,
+            'last_frame': last_frame,
+            'next_frame': next_frame,
+            'is_recording': self._is_recording(job_id)
+        }
 
-    def _process_video_stream(self, job_id, video_path):
-        """Internal processing loop for frames"""
+    def _publish_frame(self, job_id, channel_layer, message, replay=None):
+        """
+        Publisher stage: put the encoded frame in the frame store, record it for replay and send
+        the message via WebSocket. The message carries only the frame's store key, not the image.
+        """
+        jpeg = message.pop('frame_jpeg', None)
+        if jpeg is not None:
+            message['frame_key'] = frame_store.put(job_id, message['frame'], jpeg)
+        state = self.jobs.get(job_id)
+        writer = state.replay_writer if state is not None else None
+        if replay is not None and jpeg is not None and writer is not None:
+            try:
+                writer.append(message['frame'], replay['timestamp'], jpeg, replay['speed'], replay['alignment'],
+                              replay['alert'])
+            except Exception as e:
+                logger.error(f"Replay recording error: {e}")
+        try:
+            self._send_progress(channel_layer, job_id, message)
+        except Exception as e:
+            logger.error(f"WebSocket send error: {e}")
+
+    def _process_video_stream(self, job_id, video_path, speed_estimator=None):
+        """
+        Live processing loop. Decoding, JPEG encoding and publishing run as separate pipeline
+        stages (see FramePipeline); analysis stays on this thread because tracking, the speed
+        estimator and the alert state depend on the previous frame.
+        """
         channel_layer = get_channel_layer()
+        state = self.jobs.get(job_id)  # this thread is the only writer of its progress
+        pipeline = None
         try:
             cap = cv2.VideoCapture(video_path)
             if not cap.isOpened():
@@ -878,54 +1446,148 @@ class BeltProcessor:
             total_frames = int(cap.get(cv2.CAP_PROP_FRAME_COUNT))
             frame_width = int(cap.get(cv2.CAP_PROP_FRAME_WIDTH))
             frame_height = int(cap.get(cv2.CAP_PROP_FRAME_HEIGHT))
-            frame_interval = 1.0 / min(original_fps, 30.0)
-
-            with self.job_lock:
-                self.jobs[job_id].update(
-                    {'total_frames': total_frames, 'original_fps': original_fps, 'processing_started': True})
+            # Real-time jobs pace reading to the source rate (at most 30 fps); max-throughput jobs
+            # don't wait and take their clock from the video timestamps instead of time.time()
+            video_clock = state.config.get('pacing') == PACING_MAX_THROUGHPUT
+            frame_interval = 0.0 if video_clock else 1.0 / min(original_fps, 30.0)
+
+            state.publish(total_frames=total_frames, original_fps=original_fps, processing_started=True)
+
+            if speed_estimator is None:
+                speed_estimator = create_speed_estimator()
+            scheduler = DetectorScheduler(state.config.get('detector_rates'))
+            motion_gate = MotionGate()
+
+            def is_running():
+                return state.is_running
+
+            # The whole job is recorded to disk for replay (written by the publisher thread)
+            # and every frame's metrics are kept in columns (saved at job end)
+            metrics_store = MetricsStore()
+            state.replay_writer = ReplayWriter(self._replay_dir(job_id))
+            state.metrics_store = metrics_store
+
+            pipeline = FramePipeline(
+                cap,
+                publish_fn=lambda message, replay: self._publish_frame(job_id, channel_layer, message, replay),
+                is_running=is_running,
+                frame_interval=frame_interval,
+                decode_queue=state.frame_queue,
+                name=f"BeltProcessor-{job_id}"
+            )
+            state.pipeline = pipeline
+            pipeline.start()
 
-            frame_no = 0
             prev_frame_gray = None
             prev_belt_data = None
-            prev_time = time.time()
+            prev_metrics = None
+            last_speed_kmh = 0.0
+            unchanged_run = 0  # frames in a row the motion gate skipped
+            processed_frame_no = 0
+            track_state = BeltTrackState()
+            # Per-job buffer pool: steady-state frames reuse masks and edges
+            workspace = FrameWorkspace()
             fps_start_time = time.time()
             fps_frame_count = 0
 
-            # Use deque for efficient sliding window
-            speed_history = deque(maxlen=50)
-            alignment_history = deque(maxlen=50)
-            area_history = deque(maxlen=50)
-            damage_history = deque(maxlen=30)
-            spillage_history = deque(maxlen=30)
-            confidence_history = deque(maxlen=20)
-
-            while self.jobs.get(job_id, {}).get('is_running', False):
-                ret, frame = cap.read()
-                if not ret:
+            # Sliding windows with O(1) running mean (see RollingWindow)
+            speed_history = RollingWindow(50)
+            alignment_history = RollingWindow(50)
+            area_history = RollingWindow(50)
+            damage_history = RollingWindow(30)
+            spillage_history = RollingWindow(30)
+            confidence_history = RollingWindow(20)
+
+            for frame_no, frame, timestamp in pipeline.frames():
+                if not is_running():
+                    pipeline.release_frame(frame)
                     break
-                frame_no += 1
                 fps_frame_count += 1
-                current_time = time.time()
+                wall_time = time.time()
+                if video_clock:
+                    # Some backends report no position; fall back to the nominal frame time
+                    current_time = timestamp if timestamp > 0 or frame_no == 1 else (frame_no - 1) / original_fps
+                else:
+                    current_time = wall_time
 
-                if current_time - fps_start_time >= 1.0:
-                    current_fps = fps_frame_count / (current_time - fps_start_time)
-                    with self.job_lock:
-                        self.jobs[job_id]['fps'] = float(current_fps)
-                    fps_start_time = current_time
+                # Processing rate, always measured on the wall clock
+                if wall_time - fps_start_time >= 1.0:
+                    current_fps = fps_frame_count / (wall_time - fps_start_time)
+                    state.publish(fps=float(current_fps))
+                    fps_start_time = wall_time
                     fps_frame_count = 0
 
-                with self.job_lock:
-                    self.jobs[job_id]['frame_count'] = frame_no
-
-                elapsed = current_time - prev_time
-                time.sleep(max(0, frame_interval - elapsed))
+                state.publish(frame_count=frame_no)
 
-                belt_data = self.detector.detect_belt_with_details(frame)
-                frame_gray = cv2.cvtColor(frame, cv2.COLOR_BGR2GRAY)
+                progress = int((frame_no / total_frames) * 100) if total_frames else 0
 
-                speed_kmh = self.utils.calculate_speed_kmh(prev_frame_gray, frame_gray, prev_belt_data, belt_data,
-                                                           self.jobs[job_id][
-                                                               'fps']) if prev_frame_gray is not None else 0.0
+                # Static scene (e.g. stopped line): reuse the last results and send a lightweight update
+                if prev_metrics is not None and not motion_gate.changed(frame, current_time):
+                    pipeline.release_frame(frame)
+                    unchanged_run += 1
+                    # A single unchanged frame may be sub-threshold motion: carry the last speed forward,
+                    # and only report a stop once the scene has stayed still for a few frames
+                    if unchanged_run >= STOPPED_AFTER_UNCHANGED:
+                        last_speed_kmh = 0.0
+                        if prev_belt_data.get('belt_found', False):
+                            speed_history.append(0.0)
+                    alert_state = self._update_alert_state(job_id, prev_belt_data, current_time, fresh=False)
+                    metrics = dict(prev_metrics)
+                    metrics.update({
+                        'speed': last_speed_kmh,
+                        'avg_speed': speed_history.mean,
+                        'speed_confidence': None,
+                        'unchanged': True,
+                        'alert_active': alert_state['active'],
+                        'alert_trigger_count': alert_state['trigger_count'],
+                        'in_cooldown': current_time < alert_state.get('cooldown_until', 0)
+                    })
+                    prev_metrics = metrics
+                    metrics_store.append(frame_no, current_time, metrics)
+                    pipeline.publish({
+                        "type": "unchanged_message",
+                        "job_id": job_id,
+                        "frame": frame_no,
+                        "progress": progress,
+                        "belt_metrics": self._prepare_serializable_metrics(metrics),
+                        "fps": float(state.snapshot['fps']),
+                        "alert_triggered": alert_state['active']
+                    })
+                    continue
+                unchanged_run = 0
+                # The belt region gets its own, finer comparison so texture translation counts as change
+                belt_roi = prev_belt_data.get('belt_bbox') if prev_belt_data and prev_belt_data.get('belt_found') else None
+                motion_gate.accept(current_time, roi=belt_roi)
+                # Frames skipped by the motion gate lie between this frame and the previous processed one
+                frame_gap = max(1, frame_no - processed_frame_no)
+                processed_frame_no = frame_no
+
+                # Shared preprocessing: every stage reads gray/CLAHE/edges from the same context
+                frame_ctx = FrameContext(frame, workspace=workspace)
+
+                # Detectors below their target rate carry their last result forward
+                due = scheduler.due(current_time)
+                conditions = due & DetectorScheduler.CONDITION_DETECTORS
+                if 'alignment' in due or conditions or prev_belt_data is None:
+                    belt_data = self.detector.detect_belt_with_details(frame, track_state, frame_ctx,
+                                                                       detectors=conditions)
+                    scheduler.carry_forward(belt_data, conditions)
+                else:
+                    belt_data = prev_belt_data
+                frame_gray = frame_ctx.gray
+
+                if prev_frame_gray is None:
+                    speed_kmh = 0.0
+                elif 'speed' in due:
+                    # Displacement per frame converts with the source rate when running on video time
+                    speed_fps = original_fps if video_clock else state.snapshot['fps']
+                    speed_kmh = self.utils.calculate_speed_kmh(prev_frame_gray, frame_gray, prev_belt_data, belt_data,
+                                                               speed_fps / frame_gap, workspace, speed_estimator,
+                                                               (frame_no - frame_gap, frame_no))
+                else:
+                    # Speed not due: reuse the last measurement, as carry_forward does for the detectors
+                    speed_kmh = last_speed_kmh
+                last_speed_kmh = speed_kmh
 
                 if belt_data.get('belt_found', False):
                     speed_history.append(speed_kmh)
@@ -942,25 +1604,28 @@ class BeltProcessor:
                     confidence_history.append(
                         belt_data.get('damage_confidence', 0) + belt_data.get('spillage_confidence', 0))
 
-                # Update alert state with persistence
-                alert_state = self._update_alert_state(job_id, belt_data, current_time)
+                # Update alert state with persistence; only fresh condition results count as triggers
+                alert_state = self._update_alert_state(job_id, belt_data, current_time, fresh=bool(conditions))
+                scheduler.set_boost(alert_state['trigger_count'] > 0 and not alert_state['active'])
 
                 # Prepare metrics
-                avg_speed = np.mean(list(speed_history)) if speed_history else 0.0
-                avg_alignment = np.mean(list(alignment_history)) if alignment_history else 0.0
-                avg_area = np.mean(list(area_history)) if area_history else 0.0
-                avg_damage = np.mean(list(damage_history)) if damage_history else 0.0
-                avg_spillage = np.mean(list(spillage_history)) if spillage_history else 0.0
-                avg_confidence = np.mean(list(confidence_history)) if confidence_history else 0.0
+                avg_speed = speed_history.mean
+                avg_alignment = alignment_history.mean
+                avg_area = area_history.mean
+                avg_damage = damage_history.mean
+                avg_spillage = spillage_history.mean
+                avg_confidence = confidence_history.mean
 
                 metrics = {
                     'speed': speed_kmh,
                     'avg_speed': float(avg_speed),
+                    'speed_confidence': speed_estimator.confidence,
                     'alignment_deviation': int(belt_data.get('alignment_deviation', 0)),
                     'avg_alignment': float(avg_alignment),
                     'belt_area_pixels': float(belt_data.get('belt_area_pixels', 0)),
                     'avg_belt_area': float(avg_area),
                     'belt_found': belt_data.get('belt_found', False),
+                    'detection_mode': belt_data.get('detection_mode', 'full'),
                     # Damage and spillage metrics
                     'damage_points': len(belt_data.get('damaged_points', [])),
                     'edge_tear_points': len(belt_data.get('edge_tear_points', [])),
@@ -979,64 +1644,76 @@ class BeltProcessor:
                     'alert_active': alert_state['active'],
                     'alert_start_time': alert_state['start_time'],
                     'alert_trigger_count': alert_state['trigger_count'],
-                    'in_cooldown': current_time < alert_state.get('cooldown_until', 0)
+                    'in_cooldown': current_time < alert_state.get('cooldown_until', 0),
+                    'unchanged': False
                 }
+                prev_metrics = metrics
+                metrics_store.append(frame_no, current_time, metrics)
 
-                # Draw visualization with alert state
+                # Draw into a pooled buffer; encoding and sending continue on the pipeline's threads
                 annotated_frame = self.utils.draw_enhanced_visualizations(frame, belt_data, metrics,
-                                                                          alert_state['active'])
-                _, buffer = cv2.imencode('.jpg', annotated_frame, [int(cv2.IMWRITE_JPEG_QUALITY), 85])
-                frame_base64 = base64.b64encode(buffer).decode('utf-8')
-
-                progress = int((frame_no / total_frames) * 100) if total_frames else 0
-
-                with self.job_lock:
-                    replay_buffer = self.replay_buffers[job_id]
-                    if len(replay_buffer['frames']) < 300:
-                        replay_buffer['frames'].append(frame_base64)
-                        replay_buffer['timestamps'].append(float(current_time))
-                        replay_buffer['speeds'].append(speed_kmh)
-                        replay_buffer['alignments'].append(int(belt_data.get('alignment_deviation', 0)))
-                        replay_buffer['alerts'].append(alert_state['active'])  # Now this key exists
-
-                # Send via WebSocket
-                try:
-                    async_to_sync(channel_layer.group_send)("frame_progress", {
-                        "type": "progress_message",
-                        "frame": frame_no,
-                        "progress": progress,
-                        "belt_metrics": self._prepare_serializable_metrics(metrics),
-                        "frame_image": frame_base64,
-                        "fps": float(self.jobs[job_id].get('fps', 0)),
-                        "is_final": False,
-                        "alert_triggered": alert_state['active'],
-                        "alert_details": {
-                            "active": alert_state['active'],
-                            "duration": current_time - alert_state['start_time'] if alert_state['start_time'] else 0,
-                            "trigger_count": alert_state['trigger_count'],
-                            "cooldown_remaining": max(0, alert_state.get('cooldown_until', 0) - current_time)
-                        }
-                    })
-                except Exception as e:
-                    logger.error(f"WebSocket send error: {e}")
+                                                                          alert_state['active'],
+                                                                          pipeline.annotated_buffer(), current_time)
+                pipeline.release_frame(frame)
+
+                pipeline.publish({
+                    "type": "progress_message",
+                    "job_id": job_id,
+                    "frame": frame_no,
+                    "progress": progress,
+                    "belt_metrics": self._prepare_serializable_metrics(metrics),
+                    "fps": float(state.snapshot['fps']),
+                    "is_final": False,
+                    "alert_triggered": alert_state['active'],
+                    "alert_details": {
+                        "active": alert_state['active'],
+                        "duration": current_time - alert_state['start_time'] if alert_state['start_time'] else 0,
+                        "trigger_count": alert_state['trigger_count'],
+                        "cooldown_remaining": max(0, alert_state.get('cooldown_until', 0) - current_time)
+                    }
+                }, annotated_frame, {
+                    'timestamp': float(current_time),
+                    'speed': speed_kmh,
+                    'alignment': int(belt_data.get('alignment_deviation', 0)),
+                    'alert': alert_state['active']
+                })
 
-                prev_frame_gray = frame_gray.copy()
+                prev_frame_gray = frame_gray
                 prev_belt_data = belt_data
-                prev_time = current_time
 
+            # Flush frames still being encoded or sent
+            pipeline.close()
             cap.release()
-            with self.job_lock:
-                self.jobs[job_id]['is_running'] = False
-
-            ProcessingJob.objects.filter(job_id=job_id).update(status="completed", progress=100)
+            self._close_replay(job_id)
+            self._close_metrics(job_id)
+            if pipeline.error is not None:
+                raise pipeline.error
+            frame_store.close_job(job_id)
+            state.pipeline = None
+            state.publish(is_running=False)
+
+            if state.stop_requested:
+                ProcessingJob.objects.filter(job_id=job_id).update(status="stopped")
+            else:
+                ProcessingJob.objects.filter(job_id=job_id).update(status="completed", progress=100)
 
         except Exception as e:
             logger.exception(f"Error processing video {video_path}: {e}")
+            if state is not None:
+                state.publish(is_running=False)
+                state.pipeline = None
+            if pipeline is not None:
+                pipeline.close()
+            self._close_replay(job_id)
+            self._close_metrics(job_id)
+            frame_store.close_job(job_id)
             ProcessingJob.objects.filter(job_id=job_id).update(status="error", progress=0)
             try:
-                async_to_sync(channel_layer.group_send)("frame_progress", {"type": "error_message", "error": str(e)})
+                self._send_progress(channel_layer, job_id, {"type": "error_message", "error": str(e)})
             except:
                 pass
+        finally:
+            self.jobs.remove(job_id, state)
 
 
 # Singleton instance
@@ -0,0 +1,96 @@
+# vision/services/detector_scheduler.py
+
+
+class DetectorScheduler:
+    """
+    Per-job cadence for the belt pipeline's detectors.
+
+    Each detector runs at its own target rate in Hz (None = every frame). due() returns the
+    detectors to run for a frame; carry_forward() copies the last results of the detectors
+    that did not run into the frame's belt_data. While an alert is being confirmed the
+    boost rates apply, so confirmation is not slowed down by the lower cadence.
+    """
+
+    DEFAULT_RATES = {
+        'speed': None,
+        'alignment': 10.0,  # belt detection / tracking
+        'damage': 2.0,
+        'edge_tear': 2.0,
+        'spillage': 2.0,
+    }
+    BOOST_RATES = {
+        'damage': None,
+        'edge_tear': None,
+        'spillage': None,
+    }
+    # belt_data fields produced by each condition detector
+    RESULT_KEYS = {
+        'damage': ('damaged_points', 'damage_confidence', 'has_damage', 'damage_severity'),
+        'edge_tear': ('edge_tear_points', 'edge_tear_confidence', 'has_edge_tear'),
+        'spillage': ('spillage_points', 'spillage_confidence', 'has_spillage', 'spillage_severity'),
+    }
+    CONDITION_DETECTORS = frozenset(RESULT_KEYS)
+
+    def __init__(self, rates=None, boost_rates=None):
+        self.rates = dict(self.DEFAULT_RATES)
+        self.rates.update(rates or {})
+        self.boost_rates = dict(self.BOOST_RATES)
+        self.boost_rates.update(boost_rates or {})
+        self.boosted = False
+        self.run_counts = {name: 0 for name in self.rates}
+        self._next_run = {}
+        self._results = {}
+
+    def set_boost(self, active):
+        active = bool(active)
+        if active and not self.boosted:
+            # Boosted detectors become due immediately
+            for name in self.boost_rates:
+                self._next_run.pop(name, None)
+        self.boosted = active
+
+    def rate(self, name):
+        if self.boosted and name in self.boost_rates:
+            return self.boost_rates[name]
+        return self.rates.get(name)
+
+    def due(self, now):
+        """Names of the detectors to run for a frame at time `now` (seconds)"""
+        due = set()
+        for name in self.rates:
+            rate = self.rate(name)
+            next_run = self._next_run.get(name)
+            if rate is None or rate <= 0 or next_run is None or now >= next_run:
+                due.add(name)
+                self.run_counts[name] += 1
+                if rate and rate > 0:
+                    interval = 1.0 / rate
+                    # Keep the phase so the average rate holds with jittery frame times
+                    next_run = now + interval if next_run is None else next_run + interval
+                    self._next_run[name] = next_run if next_run > now else now + interval
+        return due
+
+    def seek(self, frame_index, fps):
+        """
+        Advance the cadence as if due() had been called for frames 0..frame_index-1 at `fps`, so a
+        scheduler starting mid-video (an offline chunk) runs its detectors on the same frames as
+        one that saw the whole video. Run counts are left as they were.
+        """
+        run_counts = dict(self.run_counts)
+        for index in range(frame_index):
+            self.due(index / fps)
+        self.run_counts = run_counts
+
+    def carry_forward(self, belt_data, ran):
+        """Store results of detectors in `ran`, fill the others in from their last run"""
+        for name, keys in self.RESULT_KEYS.items():
+            if name in ran:
+                self._results[name] = {key: belt_data[key] for key in keys if key in belt_data}
+            elif name in self._results:
+                belt_data.update(self._results[name])
+        return belt_data
+
+    def reset(self):
+        self.boosted = False
+        self._next_run.clear()
+        self._results.clear()
@@ -0,0 +1,171 @@
+# vision/services/frame_context.py
+import threading
+
+import cv2
+import numpy as np
+
+_local = threading.local()
+
+
+def _get_clahe():
+    """One CLAHE instance per thread (OpenCV algorithm objects are not safe to share across threads)"""
+    clahe = getattr(_local, 'clahe', None)
+    if clahe is None:
+        clahe = cv2.createCLAHE(clipLimit=2.0, tileGridSize=(8, 8))
+        _local.clahe = clahe
+    return clahe
+
+
+class FrameWorkspace:
+    """
+    Per-job pool of reusable frame-sized buffers.
+
+    buffer() returns the same array for a given (name, shape, dtype) every time and suits
+    scratch images consumed within one frame. next_buffer() rotates through `depth` arrays
+    and suits results that are still read while the next frame is processed (e.g. the
+    previous belt mask used by the speed estimate).
+    """
+
+    def __init__(self, depth=2):
+        self.depth = depth
+        self._buffers = {}
+        self._rings = {}
+        self.allocations = 0
+
+    def _allocate(self, shape, dtype):
+        self.allocations += 1
+        return np.empty(shape, dtype)
+
+    def buffer(self, name, shape, dtype=np.uint8):
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        buf = self._buffers.get(key)
+        if buf is None:
+            buf = self._buffers[key] = self._allocate(shape, dtype)
+        return buf
+
+    def next_buffer(self, name, shape, dtype=np.uint8):
+        key = (name, tuple(shape), np.dtype(dtype).str)
+        ring = self._rings.get(key)
+        if ring is None:
+            ring = self._rings[key] = {'buffers': [], 'index': -1}
+        ring['index'] = (ring['index'] + 1) % self.depth
+        if len(ring['buffers']) <= ring['index']:
+            ring['buffers'].append(self._allocate(shape, dtype))
+        return ring['buffers'][ring['index']]
+
+    @property
+    def nbytes(self):
+        total = sum(buf.nbytes for buf in self._buffers.values())
+        total += sum(buf.nbytes for ring in self._rings.values() for buf in ring['buffers'])
+        return total
+
+    def clear(self):
+        self._buffers.clear()
+        self._rings.clear()
+
+
+class FrameContext:
+    """
+    Lazily evaluated per-frame preprocessing shared by every vision stage.
+
+    Grayscale, CLAHE, median blur, Canny edges and Sobel gradients are computed on first
+    access and cached, so each is produced at most once per frame. Cached arrays are
+    shared between stages and must be treated as read-only.
+
+    With a FrameWorkspace the outputs are written into the job's reusable buffers, so they
+    are only valid until the same stage runs on a later frame.
+    """
+
+    def __init__(self, frame, scale=1.0, workspace=None):
+        self.frame = frame
+        self.scale = scale  # resolution relative to the native camera frame
+        self.workspace = workspace
+        self._gray = None
+        self._cache = {}
+        self._scaled = {}
+
+    def buffer(self, name, shape=None, dtype=np.uint8, rotate=False):
+        """Output buffer for a stage: pooled when a workspace is attached, freshly allocated otherwise"""
+        shape = self.shape if shape is None else shape
+        if self.workspace is None:
+            return np.empty(shape, dtype)
+        if rotate:
+            return self.workspace.next_buffer(name, shape, dtype)
+        return self.workspace.buffer(name, shape, dtype)
+
+    def zeros(self, name, shape=None, dtype=np.uint8, rotate=False):
+        buf = self.buffer(name, shape, dtype, rotate)
+        buf.fill(0)
+        return buf
+
+    @property
+    def shape(self):
+        return self.frame.shape[:2]
+
+    @property
+    def gray(self):
+        if self._gray is None:
+            if self.frame.ndim == 3:
+                # Rotated: the previous frame's gray is still needed by the speed estimate
+                self._gray = cv2.cvtColor(self.frame, cv2.COLOR_BGR2GRAY,
+                                          dst=self.buffer('gray', rotate=True))
+            else:
+                self._gray = self.frame
+        return self._gray
+
+    @property
+    def clahe(self):
+        if 'clahe' not in self._cache:
+            self._cache['clahe'] = _get_clahe().apply(self.gray, dst=self.buffer('clahe'))
+        return self._cache['clahe']
+
+    @property
+    def blurred(self):
+        """Median-blurred CLAHE image"""
+        if 'blurred' not in self._cache:
+            self._cache['blurred'] = cv2.medianBlur(self.clahe, 5, dst=self.buffer('blurred'))
+        return self._cache['blurred']
+
+    def canny(self, lower, upper, source='blurred'):
+        """Canny edges of the 'blurred', 'clahe' or 'gray' image, cached per thresholds"""
+        key = ('canny', source, int(lower), int(upper))
+        if key not in self._cache:
+            # Pooled buffer per source image; a second threshold pair on the same source allocates
+            name = f'canny_{source}'
+            if name in self._cache:
+                edges = np.empty(self.shape, np.uint8)
+            else:
+                edges = self._cache[name] = self.buffer(name)
+            self._cache[key] = cv2.Canny(getattr(self, source), int(lower), int(upper), edges=edges)
+        return self._cache[key]
+
+    @property
+    def sobel(self):
+        """(gx, gy) Sobel gradients of the grayscale image as float32"""
+        if 'sobel' not in self._cache:
+            gx = cv2.Sobel(self.gray, cv2.CV_32F, 1, 0, dst=self.buffer('sobel_x', dtype=np.float32), ksize=3)
+            gy = cv2.Sobel(self.gray, cv2.CV_32F, 0, 1, dst=self.buffer('sobel_y', dtype=np.float32), ksize=3)
+            self._cache['sobel'] = (gx, gy)
+        return self._cache['sobel']
+
+    @property
+    def gradient_magnitude(self):
+        """Sobel gradient magnitude clipped to uint8"""
+        if 'gradient_magnitude' not in self._cache:
+            gx, gy = self.sobel
+            magnitude = cv2.magnitude(gx, gy, self.buffer('magnitude', dtype=np.float32))
+            # Saturating conversion clips to 0..255
+            self._cache['gradient_magnitude'] = cv2.convertScaleAbs(magnitude, self.buffer('gradient_magnitude'))
+        return self._cache['gradient_magnitude']
+
+    def scaled(self, scale):
+        """Context for the same frame at a lower analysis resolution (self when scale >= 1)"""
+        if scale >= 1.0:
+            return self
+        if scale not in self._scaled:
+            h, w = self.shape
+            size = (max(1, int(round(w * scale))), max(1, int(round(h * scale))))
+            dst = self.buffer('scaled_frame', (size[1], size[0]) + self.frame.shape[2:])
+            frame = cv2.resize(self.frame, size, dst=dst, interpolation=cv2.INTER_AREA)
+            self._scaled[scale] = FrameContext(frame, scale=self.scale * scale, workspace=self.workspace)
+        return self._scaled[scale]
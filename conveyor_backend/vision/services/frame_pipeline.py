@@ -0,0 +1,171 @@
+# vision/services/frame_pipeline.py
+import logging
+import queue
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+import cv2
+
+logger = logging.getLogger(__name__)
+
+_END = object()  # end-of-stream marker passed through the queues
+
+
+class BufferPool:
+    """
+    Fixed number of reusable frame buffers handed between pipeline stages.
+
+    get() blocks while every buffer is in flight, which also bounds the work queued
+    between stages. Slots start out empty (None) and are filled by the first producer.
+    """
+
+    def __init__(self, size):
+        self._free = queue.Queue()
+        for _ in range(size):
+            self._free.put(None)
+
+    def get(self, timeout=None):
+        return self._free.get(timeout=timeout)
+
+    def put(self, buffer):
+        self._free.put(buffer)
+
+
+class FramePipeline:
+    """
+    Decode / analyse / encode / publish stages for a live job.
+
+    A decoder thread reads frames into pooled buffers and queues them; the caller's thread
+    analyses them in order (tracking and speed estimation are sequential) and hands
+    annotated frames to publish(). JPEG encoding runs on a small thread pool
+    (OpenCV releases the GIL) and a publisher thread delivers results in frame order.
+    Every stage is bounded, so a slow stage applies back-pressure instead of growing memory.
+    """
+
+    def __init__(self, cap, publish_fn, is_running, frame_interval=0.0, decode_queue=None, decode_depth=8,
+                 publish_depth=8, encode_workers=2, jpeg_quality=85, name='pipeline'):
+        self.cap = cap
+        self.publish_fn = publish_fn  # called as publish_fn(message, context) on the publisher thread
+        self.is_running = is_running
+        self.frame_interval = frame_interval
+        self.jpeg_quality = jpeg_quality
+        self.name = name
+        self.decode_queue = decode_queue if decode_queue is not None else queue.Queue(maxsize=decode_depth)
+        self.publish_queue = queue.Queue(maxsize=publish_depth)
+        self.encode_workers = encode_workers
+        # Frames: queued for analysis, being analysed, and one being decoded
+        self._frames = BufferPool((self.decode_queue.maxsize or decode_depth) + 2)
+        # Annotated images: queued for publishing, being encoded, and one being drawn
+        self._annotated = BufferPool(publish_depth + encode_workers + 1)
+        self._encoder = ThreadPoolExecutor(max_workers=encode_workers, thread_name_prefix=f"{name}-encode")
+        self._encoding = 0
+        self._encoding_lock = threading.Lock()
+        self._decoder = threading.Thread(target=self._decode, name=f"{name}-decode", daemon=True)
+        self._publisher = threading.Thread(target=self._publish, name=f"{name}-publish", daemon=True)
+        self.error = None
+
+    def start(self):
+        self._decoder.start()
+        self._publisher.start()
+        return self
+
+    def queue_depths(self):
+        return {
+            'decode': self.decode_queue.qsize(),
+            'encode': self._encoding,
+            'publish': self.publish_queue.qsize()
+        }
+
+    # Decode stage
+
+    def _decode(self):
+        frame_no = 0
+        prev_time = time.time()
+        try:
+            while self.is_running():
+                buffer = self._frames.get()
+                ret, frame = self.cap.read(buffer)
+                if not ret:
+                    self._frames.put(buffer)
+                    break
+                frame_no += 1
+                timestamp = self.cap.get(cv2.CAP_PROP_POS_MSEC) / 1000.0  # video time of this frame
+                # Pace reading to the source frame rate
+                elapsed = time.time() - prev_time
+                if self.frame_interval > elapsed:
+                    time.sleep(self.frame_interval - elapsed)
+                prev_time = time.time()
+                self.decode_queue.put((frame_no, frame, timestamp))
+        except Exception as e:
+            logger.error(f"Frame decode error: {e}")
+            self.error = e
+        finally:
+            self.decode_queue.put(_END)
+
+    def frames(self):
+        """Decoded (frame_no, frame, timestamp) in order; return each frame with release_frame()"""
+        while True:
+            item = self.decode_queue.get()
+            if item is _END:
+                return
+            yield item
+
+    def release_frame(self, frame):
+        self._frames.put(frame)
+
+    # Encode stage
+
+    def annotated_buffer(self):
+        """Buffer to draw the next annotated frame into (None until the pool slot is first filled)"""
+        return self._annotated.get()
+
+    def _encode(self, annotated):
+        try:
+            _, buffer = cv2.imencode('.jpg', annotated, [int(cv2.IMWRITE_JPEG_QUALITY), self.jpeg_quality])
+            return buffer.tobytes()
+        finally:
+            self._annotated.put(annotated)
+            with self._encoding_lock:
+                self._encoding -= 1
+
+    # Publish stage
+
+    def publish(self, message, annotated=None, context=None):
+        """
+        Queue a message for publishing in frame order. With an annotated image the raw JPEG
+        bytes are added as message['frame_jpeg'] once encoded; the buffer returns to the pool.
+        """
+        future = None
+        if annotated is not None:
+            with self._encoding_lock:
+                self._encoding += 1
+            future = self._encoder.submit(self._encode, annotated)
+        self.publish_queue.put((message, future, context))
+
+    def _publish(self):
+        while True:
+            item = self.publish_queue.get()
+            if item is _END:
+                return
+            message, future, context = item
+            try:
+                if future is not None:
+                    message['frame_jpeg'] = future.result()
+                self.publish_fn(message, context)
+            except Exception as e:
+                logger.error(f"Frame publish error: {e}")
+
+    def close(self):
+        """Flush the encode and publish stages and stop the threads"""
+        self.publish_queue.put(_END)
+        self._publisher.join()
+        self._encoder.shutdown(wait=True)
+        # Unblock the decoder if it is waiting for a buffer or queue slot
+        while self._decoder.is_alive():
+            try:
+                item = self.decode_queue.get(timeout=0.1)
+                if item is not _END:
+                    self._frames.put(item[1])
+            except queue.Empty:
+                pass
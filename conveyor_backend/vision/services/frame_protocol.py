@@ -0,0 +1,112 @@
+# vision/services/frame_protocol.py
+"""
+Binary frame protocol for the vision progress WebSocket.
+
+Clients opt in at connect time, either with the WebSocket subprotocol `vision.binary.v1` or
+with `?format=binary` in the URL. Frame updates are then sent as binary messages:
+
+    header   HEADER (little-endian, HEADER.size bytes)
+    metrics  METRICS (little-endian, METRICS.size bytes)
+    job id   uint8 length + UTF-8 job_id (lets clients watching several jobs tell them apart)
+    image    raw JPEG bytes up to the end of the message (empty for 'unchanged' updates)
+
+header_size in the header is the offset of the JPEG, so clients can skip fields they don't know.
+Floats that have no value (e.g. speed_confidence on unchanged frames) are sent as NaN. Errors
+and other control messages stay JSON text messages.
+"""
+import struct
+
+from vision.services.metrics_schema import BELT_METRICS
+
+SUBPROTOCOL = 'vision.binary.v1'
+VERSION = 1
+MAGIC = b'VB'
+
+KIND_PROGRESS = 1
+KIND_UNCHANGED = 2
+
+# magic, version, kind, header_size, flags, frame, progress (%), fps
+HEADER = struct.Struct('<2sBBHHIBxxxf')
+
+# (belt_metrics key, struct code) in wire order
+METRIC_FIELDS = (
+    ('speed', 'f'),
+    ('avg_speed', 'f'),
+    ('speed_confidence', 'f'),
+    ('alignment_deviation', 'i'),
+    ('avg_alignment', 'f'),
+    ('belt_area_pixels', 'f'),
+    ('avg_belt_area', 'f'),
+    ('damage_points', 'H'),
+    ('edge_tear_points', 'H'),
+    ('spillage_points', 'H'),
+    ('alert_trigger_count', 'H'),
+    ('avg_damage', 'f'),
+    ('avg_spillage', 'f'),
+    ('damage_severity', 'f'),
+    ('spillage_severity', 'f'),
+    ('damage_confidence', 'f'),
+    ('spillage_confidence', 'f'),
+    ('avg_confidence', 'f'),
+    ('alert_start_time', 'd'),
+)
+METRICS_RECORD = BELT_METRICS.record(METRIC_FIELDS)
+METRICS = METRICS_RECORD.struct
+
+# Header flag bits: boolean metrics and message fields
+FLAGS = (
+    'belt_found',
+    'has_damage',
+    'has_edge_tear',
+    'has_spillage',
+    'alert_active',
+    'in_cooldown',
+    'unchanged',
+    'tracked',  # detection_mode == 'tracked'
+    'alert_triggered',
+    'is_final',
+)
+
+def encode_packet(event, jpeg=b''):
+    """Pack a progress/unchanged channel-layer event and its JPEG bytes into one binary message"""
+    metrics = event.get('belt_metrics') or {}
+    kind = KIND_UNCHANGED if event.get('type') == 'unchanged_message' else KIND_PROGRESS
+    values = dict(metrics)
+    values['tracked'] = metrics.get('detection_mode') == 'tracked'
+    values['alert_triggered'] = event.get('alert_triggered', False)
+    values['is_final'] = event.get('is_final', False)
+    flags = 0
+    for bit, name in enumerate(FLAGS):
+        if values.get(name):
+            flags |= 1 << bit
+
+    job_id = str(event.get('job_id') or '').encode('utf-8')[:255]
+    header_size = HEADER.size + METRICS.size + 1 + len(job_id)
+    header = HEADER.pack(MAGIC, VERSION, kind, header_size, flags, int(event.get('frame', 0)),
+                         min(255, max(0, int(event.get('progress', 0)))), float(event.get('fps', 0.0)))
+    body = METRICS_RECORD.pack(metrics)
+    return b''.join((header, body, bytes((len(job_id),)), job_id, jpeg or b''))
+
+
+def decode_packet(data):
+    """Inverse of encode_packet, for Python clients and debugging; returns (message, jpeg_bytes)"""
+    magic, version, kind, header_size, flags, frame, progress, fps = HEADER.unpack_from(data)
+    if magic != MAGIC:
+        raise ValueError("Not a vision frame packet")
+    metrics = METRICS_RECORD.unpack_from(data, HEADER.size)
+    for bit, name in enumerate(FLAGS):
+        metrics[name] = bool(flags & (1 << bit))
+    job_offset = HEADER.size + METRICS.size
+    job_id = bytes(data[job_offset + 1:job_offset + 1 + data[job_offset]]).decode('utf-8')
+    message = {
+        'type': 'unchanged' if kind == KIND_UNCHANGED else 'progress',
+        'version': version,
+        'job_id': job_id or None,
+        'frame': frame,
+        'progress': progress,
+        'fps': fps,
+        'alert_triggered': metrics.pop('alert_triggered'),
+        'is_final': metrics.pop('is_final'),
+        'belt_metrics': metrics
+    }
+    return message, bytes(data[header_size:])
@@ -0,0 +1,86 @@
+# vision/services/frame_store.py
+import base64
+import threading
+from collections import OrderedDict, deque
+
+
+class FrameStore:
+    """
+    In-process store of recently encoded frames, keyed by (job_id, frame_no).
+
+    Producers put each JPEG here once and only send the key through the channel layer, so
+    a frame is never copied per subscriber; consumers look the bytes up when they send.
+    Each job keeps a ring of the last `capacity` frames. A consumer that falls behind finds
+    its frame evicted and can send latest() instead. Rings of finished jobs are kept until
+    `keep_closed` newer jobs have finished, so late readers still get the final frames.
+
+    Only valid with an in-process channel layer (InMemoryChannelLayer), where consumers and
+    processors share this process.
+    """
+
+    def __init__(self, capacity=32, keep_closed=4):
+        self.capacity = capacity
+        self.keep_closed = keep_closed
+        self._rings = {}
+        self._closed = deque()
+        self._lock = threading.Lock()
+
+    def put(self, job_id, frame_no, jpeg):
+        """Store a frame and return its key"""
+        with self._lock:
+            ring = self._rings.get(job_id)
+            if ring is None:
+                ring = self._rings[job_id] = OrderedDict()
+            if self._closed and job_id in self._closed:  # job id reused
+                self._closed.remove(job_id)
+            ring[frame_no] = [jpeg, None]  # [JPEG bytes, base64 text computed on first use]
+            while len(ring) > self.capacity:
+                ring.popitem(last=False)
+        return job_id, frame_no
+
+    def _entry(self, job_id, frame_no):
+        ring = self._rings.get(job_id)
+        return ring.get(frame_no) if ring else None
+
+    def get(self, job_id, frame_no):
+        """JPEG bytes of a frame, or None if it has been evicted"""
+        with self._lock:
+            entry = self._entry(job_id, frame_no)
+            return entry[0] if entry else None
+
+    def get_base64(self, job_id, frame_no):
+        """Base64 text of a frame for JSON clients, encoded once and shared by all of them"""
+        with self._lock:
+            entry = self._entry(job_id, frame_no)
+            if entry is None:
+                return None
+            if entry[1] is None:
+                entry[1] = base64.b64encode(entry[0]).decode('utf-8')
+            return entry[1]
+
+    def latest(self, job_id):
+        """Newest stored frame number of a job, or None"""
+        with self._lock:
+            ring = self._rings.get(job_id)
+            return next(reversed(ring)) if ring else None
+
+    def close_job(self, job_id):
+        """Mark a job finished; the oldest finished jobs beyond keep_closed are dropped"""
+        with self._lock:
+            if job_id in self._closed:
+                return
+            self._closed.append(job_id)
+            while len(self._closed) > self.keep_closed:
+                self._rings.pop(self._closed.popleft(), None)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'jobs': len(self._rings),
+                'frames': sum(len(ring) for ring in self._rings.values()),
+                'bytes': sum(len(entry[0]) for ring in self._rings.values() for entry in ring.values())
+            }
+
+
+# Shared by the processors and the WebSocket consumers
+frame_store = FrameStore()
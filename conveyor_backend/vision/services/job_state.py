@@ -0,0 +1,119 @@
+# vision/services/job_state.py
+"""
+Per-job state for BeltProcessor, without a processor-wide lock.
+
+A job's progress (frame count, fps, alert state, ...) has one writer, the job's processing
+thread, which changes it with JobState.publish(). publish() builds a new read-only mapping
+and swaps it in with a single reference assignment, so request threads reading `snapshot`
+always see one consistent set of values and never wait. The registry of jobs is split
+into shards with their own lock, taken only when a job is added or removed; lookups are
+plain dict reads.
+"""
+import threading
+import time
+from types import MappingProxyType
+
+
+def default_alert_state():
+    return {
+        'active': False,
+        'start_time': None,
+        'trigger_count': 0,
+        'last_trigger_time': None,
+        'cooldown_until': 0
+    }
+
+
+class JobState:
+    """One job: fixed `config`, writer-owned progress published as `snapshot`, and a stop flag"""
+
+    def __init__(self, job_id, **config):
+        self.job_id = job_id
+        config.setdefault('start_time', time.time())
+        self.config = MappingProxyType(config)
+        self._stop = threading.Event()
+        # Owned by the job's threads; other threads only read the references
+        self.thread = None
+        self.frame_queue = None
+        self.pipeline = None
+        self.replay_writer = None
+        self.metrics_store = None
+        self.alert_state = default_alert_state()
+        self.snapshot = MappingProxyType({
+            'is_running': True,
+            'fps': 0.0,
+            'frame_count': 0,
+            'total_frames': 0,
+            'processing_started': False,
+            'alert_state': dict(self.alert_state)
+        })
+
+    def publish(self, **values):
+        """Writer only: replace the snapshot with one that has `values` changed"""
+        snapshot = dict(self.snapshot)
+        snapshot.update(values)
+        self.snapshot = MappingProxyType(snapshot)
+
+    def publish_alert_state(self):
+        self.publish(alert_state=dict(self.alert_state))
+
+    def get(self, key, default=None):
+        """A progress value from the current snapshot, else a config value"""
+        snapshot = self.snapshot
+        if key in snapshot:
+            return snapshot[key]
+        return self.config.get(key, default)
+
+    @property
+    def is_running(self):
+        return self.snapshot['is_running'] and not self._stop.is_set()
+
+    @property
+    def stop_requested(self):
+        return self._stop.is_set()
+
+    def stop(self):
+        """Ask the job's thread to stop (any thread); False if it was not running"""
+        was_running = self.is_running
+        self._stop.set()
+        return was_running
+
+
+class JobRegistry:
+    """job_id -> JobState, sharded so adding or removing a job locks only its shard"""
+
+    def __init__(self, shards=16):
+        self._shards = tuple({} for _ in range(shards))
+        self._locks = tuple(threading.Lock() for _ in range(shards))
+
+    def _shard(self, job_id):
+        return hash(job_id) % len(self._shards)
+
+    def create(self, job_id, **config):
+        """Register a new job; a finished job with the same id is replaced"""
+        state = JobState(job_id, **config)
+        index = self._shard(job_id)
+        with self._locks[index]:
+            self._shards[index][job_id] = state
+        return state
+
+    def remove(self, job_id, state=None):
+        """Drop a job; with `state`, only if that is still the job registered under job_id"""
+        index = self._shard(job_id)
+        with self._locks[index]:
+            shard = self._shards[index]
+            if state is not None and shard.get(job_id) is not state:
+                return None
+            return shard.pop(job_id, None)
+
+    def get(self, job_id):
+        return self._shards[self._shard(job_id)].get(job_id)
+
+    def __contains__(self, job_id):
+        return job_id in self._shards[self._shard(job_id)]
+
+    def values(self):
+        states = []
+        for shard in self._shards:
+            states.extend(tuple(shard.values()))
+        return states
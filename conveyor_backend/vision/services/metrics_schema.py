@@ -0,0 +1,216 @@
+# vision/services/metrics_schema.py
+"""
+Typed schema of the per-frame belt metrics.
+
+A MetricsSchema is a fixed list of (name, kind) fields compiled once into flat per-field
+converters, so encoding a frame's metrics is one pass over known keys instead of a
+recursive isinstance walk. Encoders are strict: a missing or unknown key, or a value of
+the wrong type, raises SchemaError. In particular a NumPy array (e.g. a belt_mask) never
+silently turns into a huge list in a payload.
+
+    encode(metrics)   dict of plain Python scalars (channel layer / JSON)
+    to_json(metrics)  JSON text written directly from the fields (WebSocket JSON clients)
+    record(fields)    binary record packer over a subset of fields (see frame_protocol)
+"""
+import json
+import math
+import struct
+
+import numpy as np
+
+FLOAT = 'float'
+OPTIONAL_FLOAT = 'float?'  # None when there is no value
+INT = 'int'
+BOOL = 'bool'
+STR = 'str'
+
+_NUMBERS = (int, float, np.integer, np.floating)
+_INTEGERS = (int, np.integer)
+
+
+class SchemaError(TypeError):
+    """A metrics dict doesn't match its schema"""
+
+
+def _reject(name, value, expected):
+    if isinstance(value, np.ndarray):
+        raise SchemaError(f"Metric '{name}' is a NumPy array of shape {value.shape}; metrics must be scalars")
+    raise SchemaError(f"Metric '{name}' must be {expected}, got {type(value).__name__}")
+
+
+def _float_converter(name, optional=False):
+    def convert(value):
+        if type(value) is float:
+            return value
+        if value is None and optional:
+            return None
+        if isinstance(value, _NUMBERS):
+            return float(value)
+        _reject(name, value, 'a number')
+    return convert
+
+
+def _optional_float_converter(name):
+    return _float_converter(name, optional=True)
+
+
+def _int_converter(name):
+    def convert(value):
+        if type(value) is int:
+            return value
+        if isinstance(value, _INTEGERS):
+            return int(value)
+        _reject(name, value, 'an integer')
+    return convert
+
+
+def _bool_converter(name):
+    def convert(value):
+        if type(value) is bool:
+            return value
+        if isinstance(value, np.bool_):
+            return bool(value)
+        _reject(name, value, 'a bool')
+    return convert
+
+
+def _str_converter(name):
+    def convert(value):
+        if type(value) is str:
+            return value
+        _reject(name, value, 'a string')
+    return convert
+
+
+def _json_number(value):
+    # NaN/Infinity are not JSON; browsers' JSON.parse rejects them
+    return repr(value) if value is not None and math.isfinite(value) else 'null'
+
+
+_CONVERTERS = {
+    FLOAT: _float_converter,
+    OPTIONAL_FLOAT: _optional_float_converter,
+    INT: _int_converter,
+    BOOL: _bool_converter,
+    STR: _str_converter,
+}
+
+_JSON_WRITERS = {
+    FLOAT: _json_number,
+    OPTIONAL_FLOAT: _json_number,
+    INT: str,
+    BOOL: lambda value: 'true' if value else 'false',
+    STR: json.dumps,
+}
+
+
+class MetricsSchema:
+    def __init__(self, fields):
+        self.fields = tuple(fields)
+        self.kinds = dict(self.fields)
+        unknown = set(self.kinds.values()) - set(_CONVERTERS)
+        if unknown:
+            raise ValueError(f"Unknown field kinds {sorted(unknown)}")
+        self.names = frozenset(self.kinds)
+        self._converters = tuple((name, _CONVERTERS[kind](name)) for name, kind in self.fields)
+        self._writers = tuple((name, _JSON_WRITERS[kind]) for name, kind in self.fields)
+        self._json_template = '{' + ', '.join(f'{json.dumps(name)}: %s' for name, _ in self.fields) + '}'
+
+    def _check_keys(self, metrics):
+        if metrics.keys() != self.names:
+            missing = sorted(self.names - metrics.keys())
+            extra = sorted(metrics.keys() - self.names)
+            raise SchemaError(f"Metrics don't match the schema (missing {missing}, unexpected {extra})")
+
+    def encode(self, metrics):
+        """Plain-Python copy of `metrics` with every field converted to its kind"""
+        self._check_keys(metrics)
+        return {name: convert(metrics[name]) for name, convert in self._converters}
+
+    def to_json(self, metrics):
+        """JSON object text of `metrics`; non-finite floats are written as null"""
+        values = self.encode(metrics)
+        return self._json_template % tuple(write(values[name]) for name, write in self._writers)
+
+    def record(self, fields):
+        """Binary packer for `fields`, a sequence of (name, struct code) of this schema"""
+        return MetricsRecord(self, fields)
+
+
+class MetricsRecord:
+    """
+    Fixed-layout little-endian record of some schema fields. Unlike encode(), missing fields
+    are allowed (packed as NaN or 0) so partial metrics dicts still pack; arrays still fail.
+    """
+
+    _INT_LIMITS = {'B': (0, 0xFF), 'H': (0, 0xFFFF), 'I': (0, 0xFFFFFFFF), 'i': (-2 ** 31, 2 ** 31 - 1)}
+
+    def __init__(self, schema, fields):
+        self.fields = tuple(fields)
+        for name, _ in self.fields:
+            if name not in schema.names:
+                raise ValueError(f"'{name}' is not a field of the schema")
+        self.struct = struct.Struct('<' + ''.join(code for _, code in self.fields))
+        self.size = self.struct.size
+        self._packers = tuple((name, self._packer(name, code)) for name, code in self.fields)
+
+    def _packer(self, name, code):
+        if code in self._INT_LIMITS:
+            low, high = self._INT_LIMITS[code]
+
+            def pack(value):
+                if value is None:
+                    return 0
+                if isinstance(value, _NUMBERS):
+                    return min(high, max(low, int(value)))
+                _reject(name, value, 'an integer')
+            return pack
+
+        def pack(value):
+            if value is None:
+                return math.nan
+            if isinstance(value, _NUMBERS):
+                return float(value)
+            _reject(name, value, 'a number')
+        return pack
+
+    def pack(self, metrics):
+        return self.struct.pack(*(pack(metrics.get(name)) for name, pack in self._packers))
+
+    def unpack_from(self, data, offset=0):
+        """Dict of the record's fields; NaN floats come back as None"""
+        values = {}
+        for (name, _), value in zip(self.fields, self.struct.unpack_from(data, offset)):
+            values[name] = None if isinstance(value, float) and math.isnan(value) else value
+        return values
+
+
+BELT_METRICS = MetricsSchema((
+    ('speed', FLOAT),
+    ('avg_speed', FLOAT),
+    ('speed_confidence', OPTIONAL_FLOAT),
+    ('alignment_deviation', INT),
+    ('avg_alignment', FLOAT),
+    ('belt_area_pixels', FLOAT),
+    ('avg_belt_area', FLOAT),
+    ('belt_found', BOOL),
+    ('detection_mode', STR),
+    ('damage_points', INT),
+    ('edge_tear_points', INT),
+    ('spillage_points', INT),
+    ('avg_damage', FLOAT),
+    ('avg_spillage', FLOAT),
+    ('has_edge_tear', BOOL),
+    ('has_spillage', BOOL),
+    ('has_damage', BOOL),
+    ('damage_severity', FLOAT),
+    ('spillage_severity', FLOAT),
+    ('damage_confidence', FLOAT),
+    ('spillage_confidence', FLOAT),
+    ('avg_confidence', FLOAT),
+    ('alert_active', BOOL),
+    ('alert_start_time', OPTIONAL_FLOAT),
+    ('alert_trigger_count', INT),
+    ('in_cooldown', BOOL),
+    ('unchanged', BOOL),
+))
@@ -0,0 +1,194 @@
+# vision/services/metrics_store.py
+"""
+Columnar per-job store of per-frame metrics.
+
+Each numeric metric is a preallocated NumPy column that doubles when full, so appending a
+frame is a handful of scalar writes. At job end the columns are saved as one .npy file per
+column in the job's directory; loading maps them read-only (mmap), so a query on a
+multi-hour job only touches the frames it asks for. Queries cut a frame range with a
+binary search on the frame column and downsample it to at most `points` buckets with
+vectorized min/max/mean (reduceat), ignoring NaN (missing) values.
+"""
+import os
+import threading
+
+import numpy as np
+
+# Metric columns recorded for live jobs; belt_metrics keys, plus frame and timestamp
+METRIC_COLUMNS = {
+    'frame': np.uint32,
+    'timestamp': np.float64,
+    'speed': np.float32,
+    'avg_speed': np.float32,
+    'speed_confidence': np.float32,
+    'alignment_deviation': np.int32,
+    'avg_alignment': np.float32,
+    'belt_area_pixels': np.float32,
+    'avg_belt_area': np.float32,
+    'damage_points': np.uint16,
+    'edge_tear_points': np.uint16,
+    'spillage_points': np.uint16,
+    'avg_damage': np.float32,
+    'avg_spillage': np.float32,
+    'damage_severity': np.float32,
+    'spillage_severity': np.float32,
+    'damage_confidence': np.float32,
+    'spillage_confidence': np.float32,
+    'avg_confidence': np.float32,
+    'alert_trigger_count': np.uint16,
+    'belt_found': np.bool_,
+    'alert_active': np.bool_,
+    'unchanged': np.bool_,
+}
+
+INITIAL_CAPACITY = 4096
+DEFAULT_POINTS = 500
+
+
+def _as_list(values):
+    """JSON-friendly list; NaN (no value) becomes None"""
+    if values.dtype.kind == 'f':
+        missing = np.isnan(values)
+        if missing.any():
+            return np.where(missing, None, values.astype(object)).tolist()
+    return values.tolist()
+
+
+class MetricsStore:
+    """Per-frame metric columns of one job; appended from one thread, queried from any"""
+
+    def __init__(self, columns=None, capacity=INITIAL_CAPACITY):
+        self.dtypes = {name: np.dtype(dtype) for name, dtype in (columns or METRIC_COLUMNS).items()}
+        self.columns = {name: np.zeros(capacity, dtype) for name, dtype in self.dtypes.items()}
+        self.size = 0
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return self.size
+
+    def _grow(self):
+        capacity = max(INITIAL_CAPACITY, 2 * len(self.columns['frame']))
+        grown = {}
+        for name, column in self.columns.items():
+            grown[name] = np.zeros(capacity, column.dtype)
+            grown[name][:self.size] = column[:self.size]
+        self.columns = grown
+
+    def append(self, frame_no, timestamp, metrics):
+        """Record one frame; frame numbers must increase. Missing float metrics are stored as NaN"""
+        with self._lock:
+            if self.size == len(self.columns['frame']):
+                self._grow()
+            i = self.size
+            for name, column in self.columns.items():
+                if name == 'frame':
+                    column[i] = frame_no
+                elif name == 'timestamp':
+                    column[i] = timestamp
+                else:
+                    value = metrics.get(name)
+                    if value is None:
+                        column[i] = np.nan if column.dtype.kind == 'f' else 0
+                    else:
+                        column[i] = value
+            self.size = i + 1
+
+    def column(self, name):
+        """The first `size` values of a column (a view, not a copy)"""
+        with self._lock:
+            return self.columns[name][:self.size]
+
+    def query(self, metric, start_frame=None, end_frame=None, points=DEFAULT_POINTS):
+        """
+        Values of `metric` for frames start_frame..end_frame (inclusive). When the range holds
+        more than `points` frames it is split into `points` equal buckets, each reported with
+        its first frame and timestamp and the min/max/mean of its values.
+        """
+        if metric not in self.dtypes or metric == 'frame':
+            raise ValueError(f"Unknown metric '{metric}', expected one of "
+                             f"{[name for name in self.dtypes if name != 'frame']}")
+        with self._lock:
+            size = self.size
+            frames = self.columns['frame'][:size]
+            timestamps = self.columns['timestamp'][:size] if 'timestamp' in self.columns else None
+            values = self.columns[metric][:size]
+
+        lo = 0 if start_frame is None else int(np.searchsorted(frames, int(start_frame), side='left'))
+        hi = size if end_frame is None else int(np.searchsorted(frames, int(end_frame), side='right'))
+        hi = max(lo, hi)
+        values = values[lo:hi]
+        if values.dtype.kind != 'f':
+            values = values.astype(np.float64)
+        count = len(values)
+        points = max(1, int(points or DEFAULT_POINTS))
+
+        if count <= points:
+            starts = np.arange(lo, hi)
+            low = high = mean = values
+        else:
+            # Bucket boundaries, relative to lo; the last bucket ends at hi
+            edges = np.linspace(0, count, points + 1).astype(np.int64)[:-1]
+            starts = lo + edges
+            # fmin/fmax skip NaN unless a whole bucket is NaN
+            low = np.fmin.reduceat(values, edges)
+            high = np.fmax.reduceat(values, edges)
+            valid = ~np.isnan(values)
+            totals = np.add.reduceat(np.where(valid, values, 0.0), edges)
+            counts = np.add.reduceat(valid.astype(np.int64), edges)
+            with np.errstate(invalid='ignore', divide='ignore'):
+                mean = np.where(counts > 0, totals / np.maximum(counts, 1), np.nan)
+
+        return {
+            'metric': metric,
+            'start_frame': int(frames[lo]) if count else None,
+            'end_frame': int(frames[hi - 1]) if count else None,
+            'count': count,
+            'downsampled': count > points,
+            'frames': frames[starts].tolist(),
+            'timestamps': timestamps[starts].tolist() if timestamps is not None else [],
+            'min': _as_list(low),
+            'max': _as_list(high),
+            'mean': _as_list(mean),
+        }
+
+    def save(self, directory):
+        """Write each column as <directory>/<name>.npy"""
+        os.makedirs(directory, exist_ok=True)
+        with self._lock:
+            size = self.size
+            columns = dict(self.columns)
+        for name, column in columns.items():
+            np.save(os.path.join(directory, f"{name}.npy"), column[:size])
+
+    @classmethod
+    def load(cls, directory):
+        """Read-only store over the columns saved in `directory` (memory-mapped)"""
+        if not os.path.exists(os.path.join(directory, 'frame.npy')):
+            raise FileNotFoundError(f"No metrics saved in {directory}")
+        columns = {}
+        for filename in sorted(os.listdir(directory)):
+            if filename.endswith('.npy'):
+                columns[filename[:-4]] = np.load(os.path.join(directory, filename), mmap_mode='r')
+        store = cls.__new__(cls)
+        store.dtypes = {name: column.dtype for name, column in columns.items()}
+        store.columns = columns
+        store.size = len(columns['frame'])
+        store._lock = threading.Lock()
+        return store
+
+    @classmethod
+    def from_columns(cls, columns):
+        """Store over lists of per-frame values (e.g. an offline timeline); non-numeric columns are skipped"""
+        arrays = {}
+        for name, values in columns.items():
+            array = np.asarray(values)
+            if array.dtype.kind in 'biuf' and array.ndim == 1:
+                arrays[name] = array
+        if 'frame' not in arrays:
+            raise ValueError("Columns need a 'frame' column")
+        store = cls.__new__(cls)
+        store.dtypes = {name: array.dtype for name, array in arrays.items()}
+        store.columns = arrays
+        store.size = len(arrays['frame'])
+        store._lock = threading.Lock()
+        return store
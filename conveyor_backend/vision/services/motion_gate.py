@@ -0,0 +1,124 @@
+# vision/services/motion_gate.py
+import time
+
+import cv2
+import numpy as np
+
+
+class MotionGate:
+    """
+    Cheap change detector against the last fully processed frame.
+
+    Frames are reduced to a small grayscale thumbnail; a frame counts as unchanged when
+    fewer than `changed_fraction` of the thumbnail pixels differ from the reference by more
+    than `pixel_threshold`. A full frame is still let through every `refresh_interval`
+    seconds so tracking and metrics do not go stale on a static scene.
+
+    A belt usually covers only part of the frame and its texture moves by a pixel or two,
+    which the whole-frame thumbnail averages away. With a belt `roi` given to accept(), that
+    region is also compared on its own, finer thumbnail (`roi_width`) with the lower
+    `roi_pixel_threshold`, and its changed fraction is measured against the region only.
+    """
+
+    def __init__(self, width=160, pixel_threshold=6, changed_fraction=0.01, refresh_interval=5.0,
+                 roi_width=320, roi_pixel_threshold=3):
+        self.width = width
+        self.pixel_threshold = pixel_threshold
+        self.changed_fraction = changed_fraction
+        self.refresh_interval = refresh_interval
+        self.roi_width = roi_width
+        self.roi_pixel_threshold = roi_pixel_threshold
+        self.skipped_frames = 0
+        self._reference = None
+        self._reference_time = 0.0
+        self._thumb = None
+        self._small = None
+        self._diff = None
+        self._frame = None  # frame last passed to changed(), for accept()
+        self._roi = None  # (x1, y1, x2, y2) of _roi_reference
+        self._roi_reference = None
+        self._roi_small = None
+        self._roi_thumb = None
+        self._roi_diff = None
+
+    def _thumbnail(self, frame):
+        height, width = frame.shape[:2]
+        size = (self.width, max(1, int(round(height * self.width / float(width)))))
+        if self._small is None or self._small.shape[:2] != (size[1], size[0]):
+            self._small = np.empty((size[1], size[0]) + frame.shape[2:], np.uint8)
+            self._thumb = np.empty((size[1], size[0]), np.uint8)
+            self._diff = np.empty((size[1], size[0]), np.uint8)
+            self._reference = None
+        small = cv2.resize(frame, size, dst=self._small, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._thumb)
+        np.copyto(self._thumb, small)
+        return self._thumb
+
+    def _roi_thumbnail(self, frame, roi):
+        x1, y1, x2, y2 = roi
+        region = frame[y1:y2, x1:x2]
+        width = min(self.roi_width, x2 - x1)
+        size = (width, max(1, int(round((y2 - y1) * width / float(x2 - x1)))))
+        if self._roi_small is None or self._roi_small.shape[:2] != (size[1], size[0]):
+            self._roi_small = np.empty((size[1], size[0]) + frame.shape[2:], np.uint8)
+            self._roi_thumb = np.empty((size[1], size[0]), np.uint8)
+            self._roi_diff = np.empty((size[1], size[0]), np.uint8)
+        small = cv2.resize(region, size, dst=self._roi_small, interpolation=cv2.INTER_AREA)
+        if small.ndim == 3:
+            return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY, dst=self._roi_thumb)
+        np.copyto(self._roi_thumb, small)
+        return self._roi_thumb
+
+    def _changed_share(self, thumb, reference, threshold, diff):
+        diff = cv2.absdiff(thumb, reference, dst=diff)
+        changed = cv2.countNonZero(cv2.threshold(diff, threshold, 255, cv2.THRESH_BINARY, dst=diff)[1])
+        return changed > self.changed_fraction * diff.size
+
+    def changed(self, frame, now=None):
+        """True when the frame differs from the reference and should be fully processed"""
+        now = time.time() if now is None else now
+        self._frame = frame
+        thumb = self._thumbnail(frame)
+        if self._reference is None or now - self._reference_time >= self.refresh_interval:
+            return True
+        if self._changed_share(thumb, self._reference, self.pixel_threshold, self._diff):
+            return True
+        if self._roi is not None and self._changed_share(self._roi_thumbnail(frame, self._roi), self._roi_reference,
+                                                         self.roi_pixel_threshold, self._roi_diff):
+            return True
+        self.skipped_frames += 1
+        return False
+
+    def _clip_roi(self, roi):
+        if roi is None or self._frame is None:
+            return None
+        height, width = self._frame.shape[:2]
+        x1, y1, x2, y2 = (int(v) for v in roi)
+        x1, y1, x2, y2 = max(0, x1), max(0, y1), min(width, x2), min(height, y2)
+        return (x1, y1, x2, y2) if x2 - x1 >= 8 and y2 - y1 >= 8 else None
+
+    def accept(self, now=None, roi=None):
+        """
+        Make the frame last passed to changed() the reference (it is being fully processed).
+        `roi` is the belt's (x1, y1, x2, y2) box, checked on its own until the next accept().
+        """
+        if self._thumb is None:
+            return  # changed() has not seen a frame yet
+        if self._reference is None or self._reference.shape != self._thumb.shape:
+            self._reference = np.empty_like(self._thumb)
+        np.copyto(self._reference, self._thumb)
+        self._reference_time = time.time() if now is None else now
+        self._roi = self._clip_roi(roi)
+        if self._roi is not None:
+            roi_thumb = self._roi_thumbnail(self._frame, self._roi)
+            if self._roi_reference is None or self._roi_reference.shape != roi_thumb.shape:
+                self._roi_reference = np.empty_like(roi_thumb)
+            np.copyto(self._roi_reference, roi_thumb)
+        self._frame = None
+
+    def reset(self):
+        self._reference = None
+        self._roi = None
+        self._frame = None
+        self.skipped_frames = 0
@@ -0,0 +1,217 @@
+# vision/services/offline_analysis.py
+"""
+Chunked multi-process analysis of recorded videos.
+
+The video is split into frame ranges that are analysed in a process pool. Each range starts
+`overlap` frames early so belt tracking and the speed estimator are warmed up before the
+first recorded frame; those warm-up frames are discarded. Per-frame results come back as
+columns and are merged in frame order, after which the alert state machine is replayed
+over the whole timeline, so alerts spanning chunk borders are handled exactly.
+"""
+import os
+import logging
+import queue
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Per-frame columns produced by analyze_chunk()
+TIMELINE_COLUMNS = (
+    'frame', 'timestamp', 'speed', 'alignment_deviation', 'belt_area_pixels', 'belt_found',
+    'damage_points', 'edge_tear_points', 'spillage_points',
+    'damage_confidence', 'edge_tear_confidence', 'spillage_confidence',
+    'fresh', 'should_trigger',
+)
+
+PROGRESS_EVERY = 25  # frames between progress reports from a worker
+
+
+def plan_chunks(total_frames, chunk_count, overlap=30, min_chunk_frames=150):
+    """
+    Split [0, total_frames) into at most chunk_count ranges.
+    Returns [(warmup_start, start, end)], frame indices 0-based and end exclusive.
+    """
+    if total_frames <= 0:
+        return []
+    chunk_count = max(1, min(chunk_count, total_frames // max(1, min_chunk_frames)))
+    bounds = np.linspace(0, total_frames, chunk_count + 1).astype(int)
+    return [(max(0, int(start) - overlap), int(start), int(end))
+            for start, end in zip(bounds[:-1], bounds[1:]) if end > start]
+
+
+def init_worker():
+    """Process pool initializer: workers are spawned, so Django has to be set up again"""
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'conveyor_backend.settings')
+    import django
+    django.setup()
+    # One OpenCV thread per worker; the pool provides the parallelism
+    cv2.setNumThreads(1)
+
+
+def analyze_chunk(video_path, chunk_index, warmup_start, start, end, detection_params=None,
+                  speed_estimator=None, detector_rates=None, progress_queue=None, stop_event=None):
+    """Analyse frames [start, end) of a video, warming up from warmup_start; returns timeline columns"""
+    from vision.services.belt_processor import BeltDetector, BeltProcessor, BeltTrackState, BeltUtils
+    from vision.services.detector_scheduler import DetectorScheduler
+    from vision.services.frame_context import FrameContext, FrameWorkspace
+    from vision.services.speed_estimators import create_speed_estimator
+
+    columns = {name: [] for name in TIMELINE_COLUMNS}
+    cap = cv2.VideoCapture(video_path)
+    if not cap.isOpened():
+        raise RuntimeError(f"Cannot open video: {video_path}")
+    try:
+        fps = float(cap.get(cv2.CAP_PROP_FPS)) or 30.0
+        if warmup_start > 0:
+            cap.set(cv2.CAP_PROP_POS_FRAMES, warmup_start)
+
+        detector = BeltDetector()
+        if detection_params:
+            detector.set_detection_parameters(detection_params)
+        utils = BeltUtils()
+        estimator = create_speed_estimator(speed_estimator)
+        scheduler = DetectorScheduler(detector_rates)
+        # Same detector phase as a single pass from frame 0, whatever the chunking
+        scheduler.seek(warmup_start, fps)
+        track_state = BeltTrackState()
+        workspace = FrameWorkspace()
+
+        frame = None
+        prev_gray, prev_belt_data = None, None
+        last_speed_kmh = 0.0
+        index = warmup_start
+        reported = 0
+        while index < end:
+            if stop_event is not None and stop_event.is_set():
+                break
+            ret, frame = cap.read(frame)
+            if not ret:
+                break
+            timestamp = index / fps  # video time drives the detector cadence
+
+            ctx = FrameContext(frame, workspace=workspace)
+            due = scheduler.due(timestamp)
+            conditions = due & DetectorScheduler.CONDITION_DETECTORS
+            if 'alignment' in due or conditions or prev_belt_data is None:
+                belt_data = detector.detect_belt_with_details(frame, track_state, ctx, detectors=conditions)
+                scheduler.carry_forward(belt_data, conditions)
+            else:
+                belt_data = prev_belt_data
+            gray = ctx.gray
+
+            if prev_gray is None:
+                speed_kmh = 0.0
+            elif 'speed' in due:
+                speed_kmh = utils.calculate_speed_kmh(prev_gray, gray, prev_belt_data, belt_data, fps, workspace,
+                                                      estimator, (index - 1, index))
+            else:
+                speed_kmh = last_speed_kmh  # not due: reuse the last measurement
+            last_speed_kmh = speed_kmh
+
+            if index >= start:
+                should_trigger, total_damage, total_spillage = BeltProcessor._alert_trigger(belt_data)
+                columns['frame'].append(index + 1)  # 1-based like the live pipeline
+                columns['timestamp'].append(float(timestamp))
+                columns['speed'].append(float(speed_kmh))
+                columns['alignment_deviation'].append(int(belt_data.get('alignment_deviation', 0)))
+                columns['belt_area_pixels'].append(float(belt_data.get('belt_area_pixels', 0)))
+                columns['belt_found'].append(bool(belt_data.get('belt_found', False)))
+                columns['damage_points'].append(len(belt_data.get('damaged_points', [])))
+                columns['edge_tear_points'].append(len(belt_data.get('edge_tear_points', [])))
+                columns['spillage_points'].append(len(belt_data.get('spillage_points', [])))
+                columns['damage_confidence'].append(float(belt_data.get('damage_confidence', 0.0)))
+                columns['edge_tear_confidence'].append(float(belt_data.get('edge_tear_confidence', 0.0)))
+                columns['spillage_confidence'].append(float(belt_data.get('spillage_confidence', 0.0)))
+                columns['fresh'].append(bool(conditions))
+                columns['should_trigger'].append(bool(should_trigger))
+
+                done = index + 1 - start
+                if progress_queue is not None and done - reported >= PROGRESS_EVERY:
+                    progress_queue.put((chunk_index, done))
+                    reported = done
+
+            prev_gray, prev_belt_data = gray, belt_data
+            index += 1
+    finally:
+        cap.release()
+
+    if progress_queue is not None:
+        progress_queue.put((chunk_index, len(columns['frame'])))
+    return columns
+
+
+def merge_timelines(chunk_results):
+    """Concatenate chunk columns in chunk order"""
+    merged = {name: [] for name in TIMELINE_COLUMNS}
+    for columns in chunk_results:
+        for name in TIMELINE_COLUMNS:
+            merged[name].extend(columns[name])
+    return merged
+
+
+def replay_alerts(timeline, step_alert_state, job_id=None):
+    """
+    Run the alert state machine over a merged timeline (video time).
+    Adds an 'alert_active' column and returns the list of alert periods.
+    """
+    alert_state = {'active': False, 'start_time': None, 'trigger_count': 0, 'last_trigger_time': None,
+                   'cooldown_until': 0}
+    alerts = []
+    active_column = []
+    current = None
+    for i, timestamp in enumerate(timeline['timestamp']):
+        trigger = None
+        if timeline['fresh'][i]:
+            trigger = (timeline['should_trigger'][i],
+                       timeline['damage_points'][i] + timeline['edge_tear_points'][i],
+                       timeline['spillage_points'][i])
+        step_alert_state(alert_state, trigger, timestamp, job_id)
+        active_column.append(alert_state['active'])
+
+        if alert_state['active'] and current is None:
+            current = {'start_frame': timeline['frame'][i], 'start_time': timestamp,
+                       'max_damage_points': 0, 'max_spillage_points': 0}
+            alerts.append(current)
+        if current is not None:
+            current['max_damage_points'] = max(current['max_damage_points'],
+                                               timeline['damage_points'][i] + timeline['edge_tear_points'][i])
+            current['max_spillage_points'] = max(current['max_spillage_points'], timeline['spillage_points'][i])
+            if not alert_state['active']:
+                current['end_frame'] = timeline['frame'][i]
+                current['end_time'] = timestamp
+                current = None
+    if current is not None and timeline['frame']:
+        current['end_frame'] = timeline['frame'][-1]
+        current['end_time'] = timeline['timestamp'][-1]
+    timeline['alert_active'] = active_column
+    return alerts
+
+
+def summarize(timeline, alerts):
+    found = np.array(timeline['belt_found'], bool)
+    speeds = np.array(timeline['speed'], float)[found]
+    alignment = np.abs(np.array(timeline['alignment_deviation'], float))[found]
+    return {
+        'frames': len(timeline['frame']),
+        'duration': float(timeline['timestamp'][-1] - timeline['timestamp'][0]) if timeline['timestamp'] else 0.0,
+        'belt_found_ratio': float(found.mean()) if found.size else 0.0,
+        'avg_speed': float(speeds.mean()) if speeds.size else 0.0,
+        'max_speed': float(speeds.max()) if speeds.size else 0.0,
+        'avg_alignment': float(alignment.mean()) if alignment.size else 0.0,
+        'alert_count': len(alerts),
+    }
+
+
+def drain_progress(progress_queue, chunk_progress, timeout=0.5):
+    """Apply queued (chunk_index, frames_done) reports to chunk_progress; returns True if any arrived"""
+    updated = False
+    try:
+        while True:
+            chunk_index, done = progress_queue.get(timeout=timeout if not updated else 0)
+            chunk_progress[chunk_index] = max(chunk_progress.get(chunk_index, 0), done)
+            updated = True
+    except queue.Empty:
+        pass
+    return updated
@@ -0,0 +1,161 @@
+# vision/services/progress_groups.py
+"""
+Channel-layer groups for processing progress.
+
+Every progress/unchanged/error event is sent to the group of its job and of its camera, and
+to the global FIREHOSE_GROUP, all in one hop to the event loop. WebSocket clients
+subscribe only to what they watch; the firehose (every job) is opt-in. The latest event of
+each job is kept, so a client that subscribes after the job started (job ids are only known
+once the start request returns) gets the current state right away instead of waiting for
+the next event, or never seeing a final one.
+"""
+import re
+import threading
+from collections import OrderedDict, deque
+
+from asgiref.sync import async_to_sync
+
+FIREHOSE_GROUP = "frame_progress"
+LATEST_EVENT_JOBS = 64  # jobs whose latest event is kept for late subscribers
+
+_latest_events = OrderedDict()
+_latest_lock = threading.Lock()
+
+_INVALID_CHARS = re.compile(r'[^A-Za-z0-9\-_.]')
+
+
+def _group_name(prefix, value):
+    # Channel-layer group names: ASCII letters, digits, '-', '_', '.' and fewer than 100 chars
+    return f"{prefix}.{_INVALID_CHARS.sub('_', str(value))}"[:90]
+
+
+def job_group(job_id):
+    return _group_name('progress.job', job_id)
+
+
+def camera_group(camera_id):
+    return _group_name('progress.camera', camera_id)
+
+
+def progress_groups(job_id=None, camera_id=None):
+    groups = [FIREHOSE_GROUP]
+    if job_id is not None:
+        groups.append(job_group(job_id))
+    if camera_id is not None:
+        groups.append(camera_group(camera_id))
+    return groups
+
+
+async def _group_send(channel_layer, groups, message):
+    for group in groups:
+        await channel_layer.group_send(group, message)
+
+
+def send_progress(channel_layer, message, job_id=None, camera_id=None):
+    """
+    group_send a progress event to the firehose and the job's and camera's groups, in one hop to
+    the event loop (sync code). Keeps it as the job's latest event.
+    """
+    if job_id is not None:
+        with _latest_lock:
+            _latest_events[str(job_id)] = message
+            _latest_events.move_to_end(str(job_id))
+            while len(_latest_events) > LATEST_EVENT_JOBS:
+                _latest_events.popitem(last=False)
+    async_to_sync(_group_send)(channel_layer, progress_groups(job_id, camera_id), message)
+
+
+def latest_event(job_id):
+    """The last event sent for a job, or None"""
+    with _latest_lock:
+        return _latest_events.get(str(job_id))
+
+
+class ProgressSubscriptions:
+    """
+    Groups a WebSocket connection is subscribed to. An event sent to several of them (e.g.
+    its job and its camera) reaches the connection once per group; duplicate() filters
+    the extra copies.
+    """
+
+    def __init__(self, channel_layer, channel_name):
+        self.channel_layer = channel_layer
+        self.channel_name = channel_name
+        self.job_ids = set()
+        self.camera_ids = set()
+        self.firehose = False
+        self._recent = deque(maxlen=64)
+
+    def _groups(self, job_ids=(), camera_ids=(), firehose=False):
+        groups = [job_group(job_id) for job_id in job_ids]
+        groups += [camera_group(camera_id) for camera_id in camera_ids]
+        if firehose:
+            groups.append(FIREHOSE_GROUP)
+        return groups
+
+    @property
+    def group_count(self):
+        return len(self.job_ids) + len(self.camera_ids) + int(self.firehose)
+
+    async def subscribe(self, job_ids=(), camera_ids=(), firehose=False):
+        """Join the groups; returns the latest event of each newly subscribed job that has one"""
+        job_ids = set(map(str, job_ids)) - self.job_ids
+        camera_ids = set(map(str, camera_ids)) - self.camera_ids
+        firehose = bool(firehose) and not self.firehose
+        for group in self._groups(job_ids, camera_ids, firehose):
+            await self.channel_layer.group_add(group, self.channel_name)
+        self.job_ids |= job_ids
+        self.camera_ids |= camera_ids
+        self.firehose = self.firehose or firehose
+        return [event for event in map(latest_event, sorted(job_ids)) if event is not None]
+
+    async def unsubscribe(self, job_ids=(), camera_ids=(), firehose=False):
+        job_ids = set(map(str, job_ids)) & self.job_ids
+        camera_ids = set(map(str, camera_ids)) & self.camera_ids
+        firehose = bool(firehose) and self.firehose
+        for group in self._groups(job_ids, camera_ids, firehose):
+            await self.channel_layer.group_discard(group, self.channel_name)
+        self.job_ids -= job_ids
+        self.camera_ids -= camera_ids
+        self.firehose = self.firehose and not firehose
+
+    async def clear(self):
+        await self.unsubscribe(self.job_ids, self.camera_ids, self.firehose)
+
+    def duplicate(self, event):
+        """True for a second copy of an event that arrived through another subscribed group"""
+        if self.group_count < 2:
+            return False
+        key = (event.get('type'), event.get('job_id'), event.get('frame'), event.get('is_final'),
+               event.get('error'))
+        if key in self._recent:
+            return True
+        self._recent.append(key)
+        return False
+
+    def describe(self):
+        return {
+            'type': 'subscriptions',
+            'job_ids': sorted(self.job_ids),
+            'camera_ids': sorted(self.camera_ids),
+            'firehose': self.firehose
+        }
+
+
+def parse_subscription(data):
+    """(job_ids, camera_ids, firehose) from a subscribe/unsubscribe message or parsed query string"""
+    def values(*keys):
+        found = []
+        for key in keys:
+            value = data.get(key)
+            if value is None or value == '':
+                continue
+            found.extend(value if isinstance(value, (list, tuple)) else [value])
+        return [str(v) for v in found if v != '']
+
+    firehose = data.get('firehose', False)
+    if isinstance(firehose, (list, tuple)):
+        firehose = firehose[-1] if firehose else False
+    if isinstance(firehose, str):
+        firehose = firehose.lower() in ('1', 'true', 'yes')
+    return values('job_id', 'job_ids', 'job'), values('camera_id', 'camera_ids', 'camera'), bool(firehose)
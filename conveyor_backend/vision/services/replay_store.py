@@ -0,0 +1,192 @@
+# vision/services/replay_store.py
+"""
+Disk-backed replay recordings of live jobs.
+
+Each job gets a directory of append-only segments. A segment is a pair of files:
+
+    segment_00000.dat   raw JPEG bytes, back to back
+    segment_00000.idx   one INDEX_DTYPE record per frame (fixed width, little-endian)
+
+A new segment starts once the data file reaches `segment_bytes`. Readers map both files
+with mmap: the index is viewed as a NumPy record array and frame ranges are found with a
+binary search, and JPEGs are returned as memoryviews into the mapped data, so nothing is
+copied until the caller encodes the response. Records are written after their JPEG is
+flushed, so a reader (or a restart after a crash) never sees an index entry without data.
+"""
+import os
+import re
+import mmap
+import logging
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+INDEX_DTYPE = np.dtype([
+    ('frame', '<u4'),
+    ('timestamp', '<f8'),
+    ('offset', '<u8'),
+    ('length', '<u4'),
+    ('speed', '<f4'),
+    ('alignment', '<i4'),
+    ('alert', 'u1'),
+    ('_pad', 'u1', (3,)),
+])
+
+SEGMENT_BYTES = 256 * 1024 * 1024
+_SEGMENT_NAME = re.compile(r'^segment_(\d{5})\.idx$')
+
+
+def _segment_paths(directory, number):
+    base = os.path.join(directory, f"segment_{number:05d}")
+    return base + '.dat', base + '.idx'
+
+
+def _segment_numbers(directory):
+    if not os.path.isdir(directory):
+        return []
+    return sorted(int(match.group(1)) for match in map(_SEGMENT_NAME.match, os.listdir(directory)) if match)
+
+
+class ReplayWriter:
+    """Appends frames of one job; used from a single thread"""
+
+    def __init__(self, directory, segment_bytes=SEGMENT_BYTES):
+        self.directory = directory
+        self.segment_bytes = segment_bytes
+        self.frames_written = 0
+        os.makedirs(directory, exist_ok=True)
+        numbers = _segment_numbers(directory)
+        self._segment = numbers[-1] + 1 if numbers else 0  # never append to a segment of an earlier run
+        self._data = None
+        self._index = None
+        self._offset = 0
+        self._record = np.zeros(1, INDEX_DTYPE)
+
+    def _open_segment(self):
+        data_path, index_path = _segment_paths(self.directory, self._segment)
+        self._data = open(data_path, 'ab')
+        self._index = open(index_path, 'ab')
+        self._offset = 0
+
+    def _close_segment(self):
+        for f in (self._data, self._index):
+            if f is not None:
+                f.close()
+        self._data = self._index = None
+
+    def append(self, frame_no, timestamp, jpeg, speed=0.0, alignment=0, alert=False):
+        if self._data is not None and self._offset + len(jpeg) > self.segment_bytes and self._offset > 0:
+            self._close_segment()
+            self._segment += 1
+        if self._data is None:
+            self._open_segment()
+
+        self._data.write(jpeg)
+        self._data.flush()
+
+        record = self._record[0]
+        record['frame'] = frame_no
+        record['timestamp'] = timestamp
+        record['offset'] = self._offset
+        record['length'] = len(jpeg)
+        record['speed'] = speed
+        record['alignment'] = alignment
+        record['alert'] = bool(alert)
+        self._index.write(self._record.tobytes())
+        self._index.flush()
+
+        self._offset += len(jpeg)
+        self.frames_written += 1
+
+    def close(self):
+        self._close_segment()
+
+
+class _Segment:
+    def __init__(self, data_path, index_path):
+        self._data_file = open(data_path, 'rb')
+        self._index_file = open(index_path, 'rb')
+        data_size = os.fstat(self._data_file.fileno()).st_size
+        index_size = os.fstat(self._index_file.fileno()).st_size
+        count = index_size // INDEX_DTYPE.itemsize  # ignore a partially written last record
+        self._data_map = mmap.mmap(self._data_file.fileno(), 0, access=mmap.ACCESS_READ) if data_size else None
+        self._index_map = mmap.mmap(self._index_file.fileno(), 0, access=mmap.ACCESS_READ) if count else None
+        self.index = (np.frombuffer(self._index_map, INDEX_DTYPE, count) if count
+                      else np.zeros(0, INDEX_DTYPE))
+        # Only records whose JPEG is completely on disk (records are in file order)
+        while count and int(self.index['offset'][count - 1]) + int(self.index['length'][count - 1]) > data_size:
+            count -= 1
+        self.index = self.index[:count]
+        self.data = memoryview(self._data_map) if self._data_map is not None else memoryview(b'')
+
+    def close(self):
+        self.index = None
+        self.data.release()
+        for m in (self._data_map, self._index_map):
+            if m is not None:
+                try:
+                    m.close()
+                except BufferError:
+                    pass  # a caller still holds a view; the map is unmapped when that is released
+        self._data_file.close()
+        self._index_file.close()
+
+
+class ReplayReader:
+    """Read-only, memory-mapped view of a job's replay recording; use as a context manager"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self.segments = []
+        for number in _segment_numbers(directory):
+            data_path, index_path = _segment_paths(directory, number)
+            if os.path.exists(data_path):
+                self.segments.append(_Segment(data_path, index_path))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        for segment in self.segments:
+            segment.close()
+        self.segments = []
+
+    @property
+    def frame_count(self):
+        return sum(len(segment.index) for segment in self.segments)
+
+    def frame_range(self):
+        """(first, last) recorded frame numbers, or (None, None)"""
+        indexes = [segment.index for segment in self.segments if len(segment.index)]
+        if not indexes:
+            return None, None
+        return int(indexes[0]['frame'][0]), int(indexes[-1]['frame'][-1])
+
+    def read(self, start_frame=0, end_frame=None, limit=None):
+        """
+        Records and JPEG memoryviews of frames start_frame..end_frame (inclusive), in order.
+        Returns (records, jpegs); jpegs are only valid until the reader is closed.
+        """
+        records, jpegs = [], []
+        remaining = limit
+        for segment in self.segments:
+            frames = segment.index['frame']
+            lo = np.searchsorted(frames, start_frame, side='left')
+            hi = len(frames) if end_frame is None else np.searchsorted(frames, end_frame, side='right')
+            if remaining is not None:
+                hi = min(hi, lo + remaining)
+            if hi <= lo:
+                continue
+            chunk = segment.index[lo:hi]
+            records.append(chunk)
+            jpegs.extend(segment.data[offset:offset + length]
+                         for offset, length in zip(chunk['offset'].tolist(), chunk['length'].tolist()))
+            if remaining is not None:
+                remaining -= hi - lo
+                if remaining <= 0:
+                    break
+        return (np.concatenate(records) if records else np.zeros(0, INDEX_DTYPE)), jpegs
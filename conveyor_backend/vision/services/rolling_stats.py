@@ -0,0 +1,124 @@
+# vision/services/rolling_stats.py
+"""
+O(1) rolling statistics for per-frame metric histories.
+
+RollingWindow keeps the last `maxlen` values in a fixed ring and updates a running sum and
+sum of squares as values enter and leave, so mean/variance/std cost nothing to read.
+Windowed min/max come from monotonic deques (amortized O(1) per value), and an optional
+EWMA is updated alongside. The sums are taken around a shift (the running mean at the
+last resync) and recomputed from the ring every `RESYNC_EVERY` values, which keeps the
+variance accurate for large values such as belt areas in pixels.
+"""
+import math
+from collections import deque
+
+RESYNC_EVERY = 1024
+
+
+class RollingWindow:
+    """Mean, variance, min, max (and EWMA if alpha is given) of the last `maxlen` values"""
+
+    def __init__(self, maxlen, alpha=None):
+        if maxlen < 1:
+            raise ValueError("maxlen must be at least 1")
+        self.maxlen = maxlen
+        self.alpha = alpha
+        self.ewma = None
+        self._ring = [0.0] * maxlen
+        self._count = 0  # values pushed so far; the ring holds the last min(count, maxlen)
+        self._shift = 0.0
+        self._sum = 0.0  # of (value - shift)
+        self._sum_sq = 0.0  # of (value - shift) ** 2
+        self._min = deque()  # (index, value), values increasing
+        self._max = deque()  # (index, value), values decreasing
+
+    def __len__(self):
+        return min(self._count, self.maxlen)
+
+    def __bool__(self):
+        return self._count > 0
+
+    def append(self, value):
+        value = float(value)
+        index = self._count
+        slot = index % self.maxlen
+        if index == 0:
+            self._shift = value
+        if index >= self.maxlen:
+            old = self._ring[slot] - self._shift
+            self._sum -= old
+            self._sum_sq -= old * old
+        self._ring[slot] = value
+        self._count = index + 1
+        if self._count % RESYNC_EVERY == 0:
+            self._resync()
+        else:
+            new = value - self._shift
+            self._sum += new
+            self._sum_sq += new * new
+
+        oldest = index - self.maxlen + 1
+        while self._min and self._min[-1][1] >= value:
+            self._min.pop()
+        self._min.append((index, value))
+        if self._min[0][0] < oldest:
+            self._min.popleft()
+        while self._max and self._max[-1][1] <= value:
+            self._max.pop()
+        self._max.append((index, value))
+        if self._max[0][0] < oldest:
+            self._max.popleft()
+
+        if self.alpha is not None:
+            self.ewma = value if self.ewma is None else self.ewma + self.alpha * (value - self.ewma)
+
+    def _resync(self):
+        """Recompute the sums exactly, around the current mean"""
+        values = self.values()
+        self._shift = math.fsum(values) / len(values)
+        deviations = [v - self._shift for v in values]
+        self._sum = math.fsum(deviations)
+        self._sum_sq = math.fsum(d * d for d in deviations)
+
+    def clear(self):
+        self.__init__(self.maxlen, self.alpha)
+
+    def values(self):
+        """Window contents, oldest first"""
+        n = len(self)
+        if self._count <= self.maxlen:
+            return self._ring[:n]
+        start = self._count % self.maxlen
+        return self._ring[start:] + self._ring[:start]
+
+    @property
+    def mean(self):
+        n = len(self)
+        return self._shift + self._sum / n if n else 0.0
+
+    @property
+    def variance(self):
+        """Population variance (like np.var)"""
+        n = len(self)
+        if not n or self.min == self.max:
+            return 0.0  # a constant window is exactly 0, without rounding left over from earlier values
+        mean_shifted = self._sum / n
+        return max(0.0, self._sum_sq / n - mean_shifted * mean_shifted)
+
+    @property
+    def std(self):
+        return math.sqrt(self.variance)
+
+    @property
+    def min(self):
+        return self._min[0][1] if self._min else 0.0
+
+    @property
+    def max(self):
+        return self._max[0][1] if self._max else 0.0
+
+    def stats(self):
+        stats = {'count': len(self), 'mean': self.mean, 'std': self.std, 'min': self.min, 'max': self.max}
+        if self.alpha is not None:
+            stats['ewma'] = self.ewma if self.ewma is not None else 0.0
+        return stats
@@ -0,0 +1,346 @@
+# vision/services/speed_estimators.py
+import logging
+
+import cv2
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+
+class SpeedEstimator:
+    """
+    Belt speed from a pair of consecutive grayscale frames and their belt detections.
+
+    Backends implement estimate_px_per_frame(); speed_mps() handles the checks and the
+    pixel-to-metre conversion shared by all of them. One instance is used per job, so
+    backends may keep state between frames. That state is carried into the next call only
+    when its `frame_numbers` show it continues from the frame the state belongs to: gray
+    buffers are reused, so the identity of the arrays says nothing. Backends that can rate
+    their own estimate set `confidence` (0..1) for the last frame pair.
+    """
+
+    name = None
+    confidence = None
+
+    def estimate_px_per_frame(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data,
+                              workspace=None, frame_numbers=None):
+        """
+        Mean belt displacement along x in pixels per frame, or None when it cannot be measured.
+        frame_numbers is the (previous, current) frame number pair, if known.
+        """
+        raise NotImplementedError
+
+    @staticmethod
+    def continues(frame_number, frame_numbers):
+        """True if the pair `frame_numbers` starts at the frame `frame_number` state was kept for"""
+        return frame_number is not None and frame_numbers is not None and frame_numbers[0] == frame_number
+
+    def reset(self):
+        """Forget any state carried between frames"""
+
+    @staticmethod
+    def pixel_to_meter(belt_data):
+        pixel_to_meter = 0.001  # default 1 mm per px
+        try:
+            if belt_data.get('belt_physical_width_mm') and belt_data.get('belt_width'):
+                physical_mm = float(belt_data['belt_physical_width_mm'])
+                pixel_width = float(belt_data['belt_width'])
+                pixel_to_meter = (physical_mm / 1000.0) / pixel_width if pixel_width > 0 else 0.001
+        except (TypeError, ValueError):
+            pass
+        return pixel_to_meter
+
+    @staticmethod
+    def binary_mask(mask, shape, workspace=None, name=None):
+        """Belt mask as 0/255 uint8 at frame size (detector masks are returned as-is)"""
+        if mask is None:
+            return None
+        height, width = shape
+        if mask.dtype == np.uint8 and mask.shape == (height, width):
+            return mask
+        m = mask.astype(np.uint8)
+        if m.shape != (height, width):
+            m = cv2.resize(m, (width, height), interpolation=cv2.INTER_NEAREST)
+        dst = workspace.buffer(name, (height, width)) if workspace is not None else None
+        return cv2.threshold(m, 0, 255, cv2.THRESH_BINARY, dst=dst)[1]
+
+    def speed_mps(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data, fps, workspace=None,
+                  frame_numbers=None):
+        self.confidence = None
+        try:
+            if not prev_belt_data or not curr_belt_data or not prev_belt_data.get(
+                    'belt_found') or not curr_belt_data.get('belt_found'):
+                return 0.0
+            px_per_frame = self.estimate_px_per_frame(prev_frame_gray, curr_frame_gray, prev_belt_data,
+                                                      curr_belt_data, workspace, frame_numbers)
+            if px_per_frame is None:
+                return 0.0
+            return float(abs(px_per_frame) * fps * self.pixel_to_meter(curr_belt_data))
+        except Exception as e:
+            logger.error(f"Error calculating speed ({self.name}): {e}")
+            return 0.0
+
+
+class FarnebackSpeedEstimator(SpeedEstimator):
+    """Dense Farneback optical flow over the masked belt, averaging the x-flow"""
+
+    name = 'farneback'
+
+    def estimate_px_per_frame(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data,
+                              workspace=None, frame_numbers=None):
+        height, width = prev_frame_gray.shape[:2]
+
+        def buffer(name, shape=(height, width), dtype=np.uint8):
+            return workspace.buffer(name, shape, dtype) if workspace is not None else None
+
+        prev_mask = self.binary_mask(prev_belt_data.get('belt_mask'), (height, width), workspace, 'speed_prev_mask')
+        curr_mask = self.binary_mask(curr_belt_data.get('belt_mask'), (height, width), workspace, 'speed_curr_mask')
+        if prev_mask is None or curr_mask is None or cv2.countNonZero(prev_mask) < 50:
+            return None
+
+        # Masks are 0/255, so a plain AND zeroes everything outside the belt
+        prev_masked = cv2.bitwise_and(prev_frame_gray, prev_mask, dst=buffer('speed_prev_masked'))
+        curr_masked = cv2.bitwise_and(curr_frame_gray, curr_mask, dst=buffer('speed_curr_masked'))
+
+        flow = cv2.calcOpticalFlowFarneback(prev_masked, curr_masked, buffer('speed_flow', (height, width, 2),
+                                                                             np.float32),
+                                            0.5, 3, 15, 3, 5, 1.2, 0)
+        if flow is None:
+            return None
+
+        flow_x = flow[..., 0]
+        movements = flow_x[prev_mask > 0]
+        valid = movements[np.abs(movements) > 0.05]
+        if valid.size == 0:
+            return None
+        return float(np.mean(valid))
+
+
+class LucasKanadeSpeedEstimator(SpeedEstimator):
+    """
+    Sparse pyramidal Lucas-Kanade tracking of good features on the belt surface.
+
+    The tracked point set is kept between frames; points that are lost or leave the belt are
+    dropped and the set is topped up from the current frame when it runs low. Each point is
+    tracked back to the previous frame and dropped unless it returns within `fb_threshold`
+    pixels of where it started; displacements further than `mad_threshold` scaled MADs from the
+    median are rejected as outliers. With fewer than `min_inliers` points left the previous
+    estimate is carried forward instead.
+    """
+
+    name = 'lk'
+
+    def __init__(self, max_features=200, min_features=80, quality_level=0.01, min_distance=7,
+                 win_size=21, max_level=3, mad_threshold=3.0, fb_threshold=1.0, min_inliers=8):
+        self.max_features = max_features
+        self.min_features = min_features
+        self.quality_level = quality_level
+        self.min_distance = min_distance
+        self.win_size = (win_size, win_size)
+        self.max_level = max_level
+        self.mad_threshold = mad_threshold
+        self.fb_threshold = fb_threshold
+        self.min_inliers = min_inliers
+        self.criteria = (cv2.TERM_CRITERIA_EPS | cv2.TERM_CRITERIA_COUNT, 20, 0.03)
+        self.reset()
+
+    def reset(self):
+        self._points = None  # float32 (N, 1, 2) positions in frame self._frame_number
+        self._frame_number = None
+        self._px_per_frame = None  # last accepted estimate, for the pair ending at self._frame_number
+
+    def _seed(self, gray, belt_data, mask, points=None, workspace=None):
+        """Top up `points` with good features inside the belt bounding box, away from existing points"""
+        bbox = belt_data.get('belt_bbox')
+        height, width = gray.shape[:2]
+        x1, y1, x2, y2 = (0, 0, width, height) if not bbox else (
+            max(0, bbox[0]), max(0, bbox[1]), min(width, bbox[2]), min(height, bbox[3]))
+        if x2 - x1 < self.win_size[0] or y2 - y1 < self.win_size[1]:
+            return points
+
+        seed_mask = mask[y1:y2, x1:x2]
+        count = 0 if points is None else len(points)
+        if count:
+            # Keep new features min_distance away from the ones already tracked
+            if workspace is not None:
+                buf = workspace.buffer('lk_seed_mask', (y2 - y1, x2 - x1))
+                np.copyto(buf, seed_mask)
+                seed_mask = buf
+            else:
+                seed_mask = seed_mask.copy()
+            for x, y in points.reshape(-1, 2):
+                cv2.circle(seed_mask, (int(x) - x1, int(y) - y1), self.min_distance, 0, -1)
+
+        new_points = cv2.goodFeaturesToTrack(gray[y1:y2, x1:x2], self.max_features - count, self.quality_level,
+                                             self.min_distance, mask=seed_mask)
+        if new_points is None:
+            return points
+        new_points = new_points.astype(np.float32) + np.array([x1, y1], np.float32)
+        return new_points if not count else np.concatenate([points, new_points])
+
+    def _reject_outliers(self, dx):
+        median = np.median(dx)
+        mad = np.median(np.abs(dx - median)) * 1.4826  # scaled to a standard deviation
+        if mad < 1e-3:
+            return np.abs(dx - median) < 0.5
+        return np.abs(dx - median) <= self.mad_threshold * mad
+
+    def estimate_px_per_frame(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data,
+                              workspace=None, frame_numbers=None):
+        shape = prev_frame_gray.shape[:2]
+        prev_mask = self.binary_mask(prev_belt_data.get('belt_mask'), shape, workspace, 'lk_prev_mask')
+        curr_mask = self.binary_mask(curr_belt_data.get('belt_mask'), shape, workspace, 'lk_curr_mask')
+        if prev_mask is None or curr_mask is None:
+            self.reset()
+            return None
+
+        # Continue from the previous call's points and estimate only if they belong to this frame
+        continues = self.continues(self._frame_number, frame_numbers)
+        points = self._points if continues else None
+        previous = self._px_per_frame if continues else None
+        if points is None or len(points) < self.min_features:
+            points = self._seed(prev_frame_gray, prev_belt_data, prev_mask, points, workspace)
+        self._points = None
+        self._px_per_frame = None
+        self._frame_number = frame_numbers[1] if frame_numbers is not None else None
+        if points is None or len(points) == 0:
+            return None
+
+        lk_params = dict(winSize=self.win_size, maxLevel=self.max_level, criteria=self.criteria)
+        next_points, status, _ = cv2.calcOpticalFlowPyrLK(prev_frame_gray, curr_frame_gray, points, None,
+                                                          **lk_params)
+        if next_points is None:
+            return None
+
+        # Forward-backward check: a point tracked back from the current frame must land where it started
+        back_points, back_status, _ = cv2.calcOpticalFlowPyrLK(curr_frame_gray, prev_frame_gray, next_points, None,
+                                                               **lk_params)
+        fb_error = np.linalg.norm((back_points - points).reshape(-1, 2), axis=1)
+        tracked = (status.reshape(-1) == 1) & (back_status.reshape(-1) == 1) & (fb_error <= self.fb_threshold)
+        if np.count_nonzero(tracked) < self.min_inliers:
+            return self._carry_forward(previous, tracked, len(points))
+        dx = (next_points[tracked] - points[tracked]).reshape(-1, 2)[:, 0]
+        inliers = self._reject_outliers(dx)
+        if np.count_nonzero(inliers) < self.min_inliers:
+            return self._carry_forward(previous, tracked, len(points))
+
+        # Keep inlier points that are still on the belt for the next frame
+        height, width = shape
+        kept = next_points[tracked][inliers].reshape(-1, 2)
+        xs, ys = np.rint(kept[:, 0]).astype(int), np.rint(kept[:, 1]).astype(int)
+        inside = (xs >= 0) & (xs < width) & (ys >= 0) & (ys < height)
+        inside[inside] = curr_mask[ys[inside], xs[inside]] > 0
+        self._points = kept[inside].reshape(-1, 1, 2)
+
+        self.confidence = float(np.count_nonzero(inliers) / len(points))
+        self._px_per_frame = float(np.mean(dx[inliers]))
+        return self._px_per_frame
+
+    def _carry_forward(self, previous, tracked, count):
+        """Too few reliable tracks for this pair: reseed next frame and keep the previous estimate, if any"""
+        logger.debug(f"LK: {np.count_nonzero(tracked)}/{count} consistent tracks, carrying {previous}")
+        self.confidence = 0.0
+        self._px_per_frame = previous
+        return previous
+
+
+class PhaseCorrelationSpeedEstimator(SpeedEstimator):
+    """
+    FFT phase correlation of a rectified strip along the middle of the belt.
+
+    The strip is cut from both frames with the previous frame's minimum-area rectangle, so
+    frame-to-frame jitter of the belt mask does not enter the estimate. A Hanning window
+    suppresses the strip borders; the correlation peak gives a sub-pixel shift and its
+    response is reported as the confidence.
+    """
+
+    name = 'phase'
+
+    def __init__(self, strip_fraction=0.5, strip_scale=1.0, min_response=0.05):
+        self.strip_fraction = strip_fraction  # share of the belt width used, centred on the belt axis
+        self.strip_scale = strip_scale  # < 1 correlates a downsampled strip
+        self.min_response = min_response
+        self._window = None
+        self.reset()
+
+    def reset(self):
+        self._strip = None  # strip of frame self._frame_number cut with self._geometry
+        self._frame_number = None
+        self._geometry = None
+
+    def _strip_transform(self, geometry):
+        """Affine transform mapping the belt strip to an axis-aligned image, and its size"""
+        (cx, cy), (w, h), angle = geometry.min_area_rect
+        if w < h:
+            # Make the long side of the rectangle the belt direction
+            w, h = h, w
+            angle -= 90
+        strip_w = max(1, int(w * self.strip_scale))
+        strip_h = max(1, int(h * self.strip_fraction * self.strip_scale))
+        strip_w = cv2.getOptimalDFTSize(strip_w) if strip_w > 8 else strip_w
+        matrix = cv2.getRotationMatrix2D((cx, cy), angle, self.strip_scale)
+        matrix[0, 2] += strip_w / 2.0 - cx
+        matrix[1, 2] += strip_h / 2.0 - cy
+        return matrix, (strip_w, strip_h)
+
+    def _cut_strip(self, gray, matrix, size, workspace=None):
+        width, height = size
+        if workspace is not None:
+            rectified = workspace.buffer('phase_rectified', (height, width))
+            strip = workspace.next_buffer('phase_strip', (height, width), np.float32)
+        else:
+            rectified = strip = None
+        rectified = cv2.warpAffine(gray, matrix, size, dst=rectified, flags=cv2.INTER_LINEAR,
+                                   borderMode=cv2.BORDER_REPLICATE)
+        if strip is None:
+            return rectified.astype(np.float32)
+        np.copyto(strip, rectified, casting='unsafe')
+        return strip
+
+    def estimate_px_per_frame(self, prev_frame_gray, curr_frame_gray, prev_belt_data, curr_belt_data,
+                              workspace=None, frame_numbers=None):
+        geometry = prev_belt_data.get('geometry')
+        if geometry is None:
+            self.reset()
+            return None
+
+        matrix, size = self._strip_transform(geometry)
+        if size[0] < 16 or size[1] < 4:
+            return None
+
+        # The previous call's strip is reused when it was cut from this frame with the same outline
+        # (tracked belts keep their geometry object)
+        if self._strip is not None and self.continues(self._frame_number, frame_numbers) \
+                and self._geometry is geometry and self._strip.shape == (size[1], size[0]):
+            prev_strip = self._strip
+        else:
+            prev_strip = self._cut_strip(prev_frame_gray, matrix, size, workspace)
+        curr_strip = self._cut_strip(curr_frame_gray, matrix, size, workspace)
+        self._strip, self._geometry = curr_strip, geometry
+        self._frame_number = frame_numbers[1] if frame_numbers is not None else None
+
+        if self._window is None or self._window.shape != curr_strip.shape:
+            self._window = cv2.createHanningWindow(size, cv2.CV_32F)
+
+        (dx, dy), response = cv2.phaseCorrelate(prev_strip, curr_strip, self._window)
+        self.confidence = float(min(1.0, max(0.0, response)))
+        if response < self.min_response:
+            return None
+        return float(dx / self.strip_scale)
+
+
+SPEED_ESTIMATORS = {
+    FarnebackSpeedEstimator.name: FarnebackSpeedEstimator,
+    LucasKanadeSpeedEstimator.name: LucasKanadeSpeedEstimator,
+    PhaseCorrelationSpeedEstimator.name: PhaseCorrelationSpeedEstimator,
+}
+
+DEFAULT_SPEED_ESTIMATOR = FarnebackSpeedEstimator.name
+
+
+def create_speed_estimator(name=None, **kwargs):
+    """Speed estimator backend by name ('farneback', 'lk' or 'phase')"""
+    name = name or DEFAULT_SPEED_ESTIMATOR
+    if name not in SPEED_ESTIMATORS:
+        raise ValueError(f"Unknown speed estimator '{name}', expected one of {sorted(SPEED_ESTIMATORS)}")
+    return SPEED_ESTIMATORS[name](**kwargs)
@@ -0,0 +1,164 @@
+# vision/services/subscriber_mailbox.py
+import asyncio
+import logging
+import time
+from collections import deque
+
+logger = logging.getLogger(__name__)
+
+
+class SubscriberMailbox:
+    """
+    Per-connection outbox that decouples channel-layer handlers from a slow WebSocket.
+
+    Handlers only deposit events and return, so the connection's channel-layer queue never
+    backs up. Frame images go into a one-slot mailbox per stream (e.g. per job) where a newer
+    frame replaces an unsent one (latest frame wins); metrics, alerts and errors go on a small queue. Everything is
+    sent in arrival order. A replaced frame is dropped unless `on_superseded(old, new)`
+    returns an event to keep in its place, e.g. an alert change the newer frame doesn't show.
+    When the queue is full the oldest non-critical message is dropped. Critical messages are
+    never dropped for a non-critical one, but at most `max_critical` of them wait: past that the
+    client is too far behind to catch up, so the mailbox discards its backlog, stops accepting
+    events and awaits `on_overflow()` (e.g. closing the socket so the client reconnects and
+    resyncs). Without `on_overflow` the oldest critical message is dropped instead. Drops are
+    counted in `counters`.
+
+    `send` is the coroutine that writes one event to the socket.
+    """
+
+    def __init__(self, send, on_superseded=None, max_messages=64, report_interval=5.0, name='subscriber',
+                 max_critical=256, on_overflow=None):
+        self.send = send
+        self.on_superseded = on_superseded
+        self.max_messages = max_messages
+        self.max_critical = max_critical
+        self.on_overflow = on_overflow
+        self.report_interval = report_interval
+        self.name = name
+        self.counters = {'frames_sent': 0, 'frames_dropped': 0, 'messages_sent': 0, 'messages_dropped': 0}
+        self._seq = 0
+        self._frames = {}  # slot -> (seq, event)
+        self._messages = deque()  # (seq, event, critical), ordered by seq
+        self._critical = 0  # critical messages in self._messages
+        self.overflowed = False
+        self._wakeup = asyncio.Event()
+        self._task = None
+        self._reported_drops = 0
+        self._last_report = time.monotonic()
+
+    def start(self):
+        if self._task is None:
+            self._task = asyncio.ensure_future(self._run())
+        return self
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+            self._task = None
+        if self.dropped:
+            logger.info(f"{self.name}: delivery stats {self.counters}")
+
+    @property
+    def dropped(self):
+        return self.counters['frames_dropped'] + self.counters['messages_dropped']
+
+    def _next_seq(self):
+        self._seq += 1
+        return self._seq
+
+    def put_frame(self, event, slot=None):
+        """Offer a frame event; replaces a frame of the same slot that has not been sent yet"""
+        if self.overflowed:
+            return
+        superseded = self._frames.get(slot)
+        self._frames[slot] = (self._next_seq(), event)
+        if superseded is not None:
+            self.counters['frames_dropped'] += 1
+            if self.on_superseded is not None:
+                keep = self.on_superseded(superseded[1], event)
+                if keep is not None:
+                    self._enqueue(superseded[0], keep, True)
+        self._wakeup.set()
+
+    def put_message(self, event, critical=False):
+        """Queue a metrics/alert/control event; critical events are only dropped on overflow"""
+        self._enqueue(self._next_seq(), event, critical)
+        self._wakeup.set()
+
+    def _enqueue(self, seq, event, critical):
+        if self.overflowed:
+            return
+        if critical and self._critical >= self.max_critical:
+            self.counters['messages_dropped'] += 1
+            if self.on_overflow is not None:
+                self._overflow()
+                return
+            for i, (_, _, queued_critical) in enumerate(self._messages):
+                if queued_critical:
+                    del self._messages[i]
+                    self._critical -= 1
+                    break
+        if len(self._messages) >= self.max_messages:
+            for i, (_, _, queued_critical) in enumerate(self._messages):
+                if not queued_critical:
+                    del self._messages[i]
+                    self.counters['messages_dropped'] += 1
+                    break
+            else:
+                if not critical:
+                    self.counters['messages_dropped'] += 1
+                    return
+        # Usually the newest; an event kept from a superseded frame goes back to the frame's place
+        index = len(self._messages)
+        while index > 0 and self._messages[index - 1][0] > seq:
+            index -= 1
+        self._messages.insert(index, (seq, event, critical))
+        self._critical += int(critical)
+
+    def _overflow(self):
+        if self.overflowed:
+            return
+        logger.warning(f"{self.name}: {self._critical} critical messages pending, giving up on the subscriber "
+                       f"({self.counters})")
+        self.overflowed = True
+        self.counters['messages_dropped'] += len(self._messages)
+        self.counters['frames_dropped'] += len(self._frames)
+        self._messages.clear()
+        self._frames.clear()
+        self._critical = 0
+        asyncio.ensure_future(self.on_overflow())
+
+    def stats(self):
+        return dict(self.counters, pending_messages=len(self._messages), pending_frames=len(self._frames))
+
+    async def _run(self):
+        while True:
+            await self._wakeup.wait()
+            self._wakeup.clear()
+            while self._messages or self._frames:
+                slot = min(self._frames, key=lambda s: self._frames[s][0]) if self._frames else None
+                if self._messages and (not self._frames or self._messages[0][0] < self._frames[slot][0]):
+                    _, event, critical = self._messages.popleft()
+                    self._critical -= int(critical)
+                    counter = 'messages_sent'
+                else:
+                    _, event = self._frames.pop(slot)
+                    counter = 'frames_sent'
+                try:
+                    await self.send(event)
+                    self.counters[counter] += 1
+                except Exception as e:
+                    logger.error(f"{self.name}: send error: {e}")
+                self._maybe_report()
+
+    def _maybe_report(self):
+        """Tell the client about drops at most every report_interval seconds"""
+        now = time.monotonic()
+        if self.dropped != self._reported_drops and now - self._last_report >= self.report_interval:
+            self._reported_drops = self.dropped
+            self._last_report = now
+            self._enqueue(self._next_seq(), {'type': 'delivery_stats', **self.counters}, True)
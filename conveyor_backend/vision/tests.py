@@ -1,3 +1,151 @@
-from django.test import TestCase
+import asyncio
 
-# Create your tests here.
+import cv2
+import numpy as np
+from django.test import SimpleTestCase
+
+from vision.services.belt_processor import BeltDetector, BeltTrackState
+from vision.services.detector_scheduler import DetectorScheduler
+from vision.services.frame_context import FrameContext, FrameWorkspace
+from vision.services.job_state import JobRegistry
+from vision.services.motion_gate import MotionGate
+from vision.services.speed_estimators import create_speed_estimator
+from vision.services.subscriber_mailbox import SubscriberMailbox
+
+FPS = 30.0
+
+
+def belt_frames(count, px_per_frame, width=1280, height=720):
+    """Frames of a smooth-textured belt band (as (x1, y1, x2, y2)) translating by px_per_frame"""
+    rng = np.random.default_rng(0)
+    x1, y1, x2, y2 = int(width * 0.05), int(height * 0.35), int(width * 0.95), int(height * 0.70)
+    texture = cv2.GaussianBlur(rng.integers(0, 255, (y2 - y1, 2 * width), dtype=np.uint8), (9, 9), 0)
+    frames = []
+    for i in range(count):
+        frame = np.full((height, width, 3), 60, np.uint8)
+        shift = int(i * px_per_frame) % width
+        frame[y1:y2, x1:x2] = texture[:, shift:shift + x2 - x1, None]
+        frames.append(frame)
+    return frames, (x1, y1, x2, y2)
+
+
+class MotionGateTests(SimpleTestCase):
+    def run_gate(self, frames, roi):
+        """Frames the gate lets through, driving it like the live loop does"""
+        gate = MotionGate()
+        passed = []
+        for i, frame in enumerate(frames):
+            now = i / FPS
+            if i == 0 or gate.changed(frame, now):
+                gate.accept(now, roi=roi)
+                passed.append(i)
+        return passed
+
+    def test_translating_belt_is_never_gated_out(self):
+        for px_per_frame in (1, 2, 5):
+            frames, roi = belt_frames(40, px_per_frame)
+            self.assertEqual(self.run_gate(frames, roi), list(range(40)), f"{px_per_frame} px/frame")
+
+    def test_static_belt_is_gated_out(self):
+        frames, roi = belt_frames(40, 0)
+        # Frame 0 is processed before the gate has a reference, frame 1 sets it
+        self.assertEqual(self.run_gate(frames, roi), [0, 1])
+
+
+class BeltEdgeBandTests(SimpleTestCase):
+    def test_edge_band_follows_each_full_search(self):
+        # Tracking never locks and damage runs every other frame, so each damage frame gets a new
+        # belt mask in the same pooled buffer as two frames before
+        detector = BeltDetector()
+        detector.set_detection_parameters({'tracking_lock_iou': 1.01, 'damage_detection_enabled': True})
+        track_state = BeltTrackState()
+        workspace = FrameWorkspace()
+        for i, top in enumerate((300, 200, 250, 300, 200, 250)):
+            frame = np.full((720, 1280, 3), 200, np.uint8)
+            cv2.rectangle(frame, (100, top), (1180, top + 220), (40, 40, 40), -1)
+            detector.detect_belt_with_details(frame, track_state, FrameContext(frame, workspace=workspace),
+                                              detectors=None if i % 2 == 0 else set())
+            if i % 2 == 0:
+                rows = np.flatnonzero(track_state.edge_band.any(axis=1))
+                self.assertEqual((rows[0], rows[-1]), (top - 1, top + 220), f"frame {i}")
+
+
+class LucasKanadeSpeedEstimatorTests(SimpleTestCase):
+    def test_content_jump_carries_previous_estimate(self):
+        # Boxes on a plain belt move 5 px per frame, then the clip loops back 150 px like a replayed recording
+        rng = np.random.default_rng(0)
+        xs, ys = rng.integers(0, 2560, 40), rng.integers(130, 220, 40)
+        mask = np.zeros((360, 640), np.uint8)
+        mask[120:240] = 255
+        belt_data = {'belt_found': True, 'belt_mask': mask, 'belt_bbox': [0, 120, 640, 240]}
+        frames = []
+        for offset in [5 * i for i in range(6)] + [5 * i - 150 for i in range(6, 10)]:
+            frame = np.full((360, 640), 90, np.uint8)
+            frame[120:240] = 40
+            for x, y in zip((xs + offset) % 2560 - 640, ys):
+                cv2.rectangle(frame, (int(x), int(y)), (int(x) + 12, int(y) + 10), 220, -1)
+            frames.append(frame)
+
+        estimator = create_speed_estimator('lk')
+        estimates = [estimator.estimate_px_per_frame(frames[i - 1], frames[i], belt_data, belt_data,
+                                                     frame_numbers=(i - 1, i)) for i in range(1, len(frames))]
+        np.testing.assert_allclose(estimates, 5.0, atol=0.1)
+
+
+class JobRegistryTests(SimpleTestCase):
+    def test_remove_keeps_a_job_that_replaced_the_state(self):
+        registry = JobRegistry()
+        finished = registry.create('belt_1_cam')
+        restarted = registry.create('belt_1_cam')
+        self.assertIsNone(registry.remove('belt_1_cam', finished))
+        self.assertIs(registry.get('belt_1_cam'), restarted)
+        self.assertIs(registry.remove('belt_1_cam', restarted), restarted)
+        self.assertNotIn('belt_1_cam', registry)
+
+
+class SubscriberMailboxTests(SimpleTestCase):
+    def run_stalled(self, count, **kwargs):
+        """Queue `count` critical messages for a client whose socket never drains; (mailbox, overflow calls)"""
+        async def scenario():
+            stalled = asyncio.Event()
+            closes = []
+
+            async def close():
+                closes.append(True)
+
+            async def send(event):
+                await stalled.wait()
+
+            if kwargs.pop('close', False):
+                kwargs['on_overflow'] = close
+            mailbox = SubscriberMailbox(send, **kwargs).start()
+            for i in range(count):
+                mailbox.put_message({'type': 'error_message', 'n': i}, critical=True)
+                await asyncio.sleep(0)
+            await mailbox.stop()
+            return mailbox, closes
+
+        return asyncio.run(scenario())
+
+    def test_overflowing_critical_queue_closes_subscriber_once(self):
+        mailbox, closes = self.run_stalled(50, max_critical=8, close=True)
+        self.assertEqual(closes, [True])
+        self.assertTrue(mailbox.overflowed)
+        self.assertEqual(mailbox.stats()['pending_messages'], 0)
+
+    def test_critical_queue_is_bounded_without_overflow_handler(self):
+        mailbox, _ = self.run_stalled(50, max_critical=8)
+        self.assertFalse(mailbox.overflowed)
+        self.assertEqual(mailbox.stats()['pending_messages'], 8)
+        self.assertEqual(mailbox.counters['messages_dropped'], 50 - 8 - 1)  # one is stuck in send()
+
+
+class DetectorSchedulerTests(SimpleTestCase):
+    def test_seek_keeps_the_phase_of_a_full_pass(self):
+        full = DetectorScheduler()
+        expected = [full.due(i / FPS) for i in range(300)]
+        for start in (1, 31, 37, 150, 299):
+            scheduler = DetectorScheduler()
+            scheduler.seek(start, FPS)
+            self.assertEqual([scheduler.due(i / FPS) for i in range(start, 300)], expected[start:], f"frame {start}")
+            self.assertEqual(scheduler.run_counts['speed'], 300 - start)
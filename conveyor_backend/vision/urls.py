@@ -3,7 +3,7 @@ from django.urls import path
 from .views import (
     AvailableVideos, StartProcessing, JobStatus,
     StopProcessing, ListJobs, ActiveJobs,
-    GetReplayFrames, SystemInfo
+    GetReplayFrames, JobMetrics, SystemInfo
 )
 
 urlpatterns = [
@@ -20,6 +20,9 @@ urlpatterns = [
     # Replay
     path("replay/", GetReplayFrames.as_view(), name="get-replay-frames"),
 
+    # Metric history
+    path("metrics/<str:job_id>/", JobMetrics.as_view(), name="job-metrics"),
+
     # System
     path("system/info/", SystemInfo.as_view(), name="system-info"),
 ]
\ No newline at end of file
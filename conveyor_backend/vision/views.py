@@ -8,7 +8,9 @@ import glob
 import time
 import json
 import logging
-from .services.belt_processor import processor
+from .services.belt_processor import processor, MODE_LIVE, PROCESSING_MODES, PACING_REALTIME, PACING_MODES
+from .services.speed_estimators import SPEED_ESTIMATORS, DEFAULT_SPEED_ESTIMATOR
+from .services.metrics_store import DEFAULT_POINTS
 from .models import ProcessingJob
 
 logger = logging.getLogger(__name__)
@@ -62,6 +64,10 @@ class StartProcessing(APIView):
         try:
             video_path = request.data.get("video_path")
             camera_id = request.data.get("camera_id", "default")
+            speed_estimator = request.data.get("speed_estimator", DEFAULT_SPEED_ESTIMATOR)
+            mode = request.data.get("mode", MODE_LIVE)
+            workers = request.data.get("workers")
+            pacing = request.data.get("pacing", PACING_REALTIME)
 
             if not video_path:
                 return Response({
@@ -69,6 +75,38 @@ class StartProcessing(APIView):
                     "error": "video_path is required"
                 }, status=status.HTTP_400_BAD_REQUEST)
 
+            if speed_estimator not in SPEED_ESTIMATORS:
+                return Response({
+                    "status": "error",
+                    "error": f"Unknown speed_estimator: {speed_estimator}",
+                    "available_speed_estimators": sorted(SPEED_ESTIMATORS)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if mode not in PROCESSING_MODES:
+                return Response({
+                    "status": "error",
+                    "error": f"Unknown mode: {mode}",
+                    "available_modes": list(PROCESSING_MODES)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            if pacing not in PACING_MODES:
+                return Response({
+                    "status": "error",
+                    "error": f"Unknown pacing: {pacing}",
+                    "available_pacing": list(PACING_MODES)
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            max_workers = os.cpu_count() or 1
+            try:
+                workers = int(workers) if workers not in (None, '') else None
+                if workers is not None and not 1 <= workers <= max_workers:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return Response({
+                    "status": "error",
+                    "error": f"workers must be an integer between 1 and {max_workers}"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
             # Check if video exists
             if not os.path.isabs(video_path):
                 # Try relative path from media directory
@@ -104,7 +142,8 @@ class StartProcessing(APIView):
             logger.info(f"Starting processing job {job_id} for video: {actual_path}")
 
             # Start the processing job
-            job = processor.start_job(job_id, actual_path, camera_id)
+            job = processor.start_job(job_id, actual_path, camera_id, speed_estimator=speed_estimator, mode=mode,
+                                      workers=workers, pacing=pacing)
 
             return Response({
                 "status": "success",
@@ -112,6 +151,9 @@ class StartProcessing(APIView):
                 "job_id": job_id,
                 "video_path": actual_path,
                 "camera_id": camera_id,
+                "speed_estimator": speed_estimator,
+                "mode": mode,
+                "pacing": pacing,
                 "start_time": time.strftime("%Y-%m-%d %H:%M:%S"),
                 "details": {
                     "video_file": os.path.basename(actual_path),
@@ -262,6 +304,18 @@ class GetReplayFrames(APIView):
                 **replay_data
             })
 
+        except FileNotFoundError as e:
+            return Response({
+                "status": "error",
+                "error": str(e)
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        except ValueError as e:
+            return Response({
+                "status": "error",
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
         except Exception as e:
             logger.error(f"Error getting replay frames: {e}")
             return Response({
@@ -270,6 +324,54 @@ class GetReplayFrames(APIView):
             }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
 
 
+class JobMetrics(APIView):
+    def get(self, request, job_id):
+        """Per-frame history of one metric, downsampled to min/max/mean buckets"""
+        try:
+            metric = request.query_params.get("metric", "speed")
+            start_frame = request.query_params.get("start_frame")
+            end_frame = request.query_params.get("end_frame")
+            points = request.query_params.get("points", DEFAULT_POINTS)
+            try:
+                start_frame = int(start_frame) if start_frame not in (None, '') else None
+                end_frame = int(end_frame) if end_frame not in (None, '') else None
+                points = int(points)
+                if points < 1:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return Response({
+                    "status": "error",
+                    "error": "start_frame and end_frame must be integers and points a positive integer"
+                }, status=status.HTTP_400_BAD_REQUEST)
+
+            series = processor.get_metric_series(job_id, metric, start_frame, end_frame, points)
+
+            return Response({
+                "status": "success",
+                "job_id": job_id,
+                **series
+            })
+
+        except FileNotFoundError as e:
+            return Response({
+                "status": "error",
+                "error": str(e)
+            }, status=status.HTTP_404_NOT_FOUND)
+
+        except ValueError as e:
+            return Response({
+                "status": "error",
+                "error": str(e)
+            }, status=status.HTTP_400_BAD_REQUEST)
+
+        except Exception as e:
+            logger.error(f"Error getting job metrics: {e}")
+            return Response({
+                "status": "error",
+                "error": str(e)
+            }, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+
+
 class SystemInfo(APIView):
     def get(self, request):
         """Get system information and status"""
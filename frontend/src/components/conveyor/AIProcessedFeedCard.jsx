@@ -59,6 +59,7 @@ const AIProcessedFeedCard = ({
 
   // Refs
   const wsRef = useRef(null);
+  const subscribedJobRef = useRef(null);
   const videoContainerRef = useRef(null);
   const frameTimesRef = useRef([]);
 
@@ -121,6 +122,11 @@ const AIProcessedFeedCard = ({
         command: 'ping',
         timestamp: Date.now()
       }));
+
+      // Updates are per job: (re)subscribe to the job being watched
+      if (subscribedJobRef.current) {
+        wsRef.current.send(JSON.stringify({ action: 'subscribe', job_id: subscribedJobRef.current }));
+      }
     };
 
     wsRef.current.onclose = () => {
@@ -288,9 +294,17 @@ const AIProcessedFeedCard = ({
       setJobId(response.data.job_id);
       console.log("✅ Processing started with job ID:", response.data.job_id);
 
+      // Watch only this job's updates
+      if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN && subscribedJobRef.current) {
+        wsRef.current.send(JSON.stringify({ action: 'unsubscribe', job_id: subscribedJobRef.current }));
+      }
+      subscribedJobRef.current = response.data.job_id;
+
       // Ensure WebSocket is connected
       if (connectionStatus !== "connected") {
         connectWebSocket();
+      } else if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+        wsRef.current.send(JSON.stringify({ action: 'subscribe', job_id: response.data.job_id }));
       }
 
       // Optionally call parent's processVideoFile function if needed
@@ -40,6 +40,7 @@ export default function ConveyorBeltMonitoring() {
 
   // Refs
   const wsRef = useRef(null);
+  const subscribedJobRef = useRef(null);
   const canvasRef = useRef(null);
   const videoContainerRef = useRef(null);
   const frameTimesRef = useRef([]);
@@ -127,6 +128,11 @@ export default function ConveyorBeltMonitoring() {
         command: 'ping',
         timestamp: Date.now()
       }));
+
+      // Updates are per job: (re)subscribe to the job being watched
+      if (subscribedJobRef.current) {
+        wsRef.current.send(JSON.stringify({ action: 'subscribe', job_id: subscribedJobRef.current }));
+      }
     };
 
     wsRef.current.onclose = () => {
@@ -348,9 +354,17 @@ export default function ConveyorBeltMonitoring() {
       setJobId(response.data.job_id);
       console.log("✅ Processing started with job ID:", response.data.job_id);
 
+      // Watch only this job's updates
+      if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN && subscribedJobRef.current) {
+        wsRef.current.send(JSON.stringify({ action: 'unsubscribe', job_id: subscribedJobRef.current }));
+      }
+      subscribedJobRef.current = response.data.job_id;
+
       // Ensure WebSocket is connected
       if (connectionStatus !== "connected") {
         connectWebSocket();
+      } else if (wsRef.current && wsRef.current.readyState === WebSocket.OPEN) {
+        wsRef.current.send(JSON.stringify({ action: 'subscribe', job_id: response.data.job_id }));
       }
 
     } catch (error) {
@@ -101,7 +101,8 @@ class WebSocketService {
   }
 
   connectProgress() {
-    this.connect(`${WS_BASE_URL}/progress/`, 'progress');
+    // Progress of every job (global progress bar, completion notices): opt in to the firehose
+    this.connect(`${WS_BASE_URL}/progress/?firehose=1`, 'progress');
   }
 
   connectRealTime(cameraId = 'default') {